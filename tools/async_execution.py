@@ -0,0 +1,230 @@
+# Asyncio execution of block diagrams.
+# Some behaviors wait on I/O (a local model server, a database). Processors on the same
+# level of the execution plan do not depend on each other within a step, so their
+# behaviors are awaited concurrently. Behaviors may be plain functions or `async def`
+# coroutine functions; the wiring semantics are the same as step_model in execution.py.
+
+import asyncio
+import inspect
+
+from tools.execution import execution_plan, resolve_behaviors, gather_port_values
+
+
+async def _call_behavior(proc_id, fn, args, semaphore, timeout):
+    """
+    Runs one behavior under the concurrency limit and its timeout.
+
+    Raises:
+        asyncio.TimeoutError: If the behavior takes longer than its timeout.
+    """
+    async with semaphore:
+        result = fn(*args)
+        if not inspect.isawaitable(result):
+            # Plain functions run inline on the event loop.
+            return result
+        try:
+            return await asyncio.wait_for(result, timeout)
+        except asyncio.TimeoutError:
+            raise asyncio.TimeoutError(f"Processor '{proc_id}' timed out after {timeout}s.")
+
+
+async def step_model_async(model, behaviors, state=None, inputs=None, plan=None,
+                           max_concurrency=None, timeout=None, timeouts=None):
+    """
+    Runs every processor of a model once, awaiting the processors of each level concurrently.
+
+    Args:
+        model (dict): The block diagram model.
+        behaviors (dict): processor ID (or Parent block ID) -> callable or coroutine function.
+        state (dict): Feedback wire ID -> value from the previous step.
+        inputs (dict): (processor_id, port_index) -> value for open ports.
+        plan (dict): A precomputed execution_plan(model).
+        max_concurrency (int): Maximum number of behaviors running at once. None means no limit.
+        timeout (float): Default timeout in seconds for each behavior. None means no timeout.
+        timeouts (dict): processor ID -> timeout, overriding the default.
+
+    Returns:
+        tuple: (wire_values, new_state), as in step_model.
+
+    Raises:
+        asyncio.TimeoutError: If a behavior exceeds its timeout.
+    """
+    if plan is None:
+        plan = execution_plan(model)
+    state = state or {}
+    inputs = inputs or {}
+    timeouts = timeouts or {}
+    behaviors = resolve_behaviors(model, behaviors)
+    processors = {p["ID"]: p for p in model.get("processors", [])}
+    semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else _NoLimit()
+
+    terminal_values = {}
+    for level in plan["levels"]:
+        calls = [
+            _call_behavior(proc_id, behaviors[proc_id],
+                           gather_port_values(processors[proc_id], plan, terminal_values, state, inputs),
+                           semaphore, timeouts.get(proc_id, timeout))
+            for proc_id in level
+        ]
+        results = await asyncio.gather(*calls)
+        for proc_id, outputs in zip(level, results):
+            for i, value in enumerate(outputs or ()):
+                terminal_values[(proc_id, i)] = value
+
+    wire_values = {wire["ID"]: terminal_values.get(tuple(wire["Source"])) for wire in model.get("wires", [])}
+    new_state = {wire_id: wire_values[wire_id] for wire_id in plan["feedback"]}
+    return wire_values, new_state
+
+
+async def run_model_async(model, behaviors, steps=1, state=None, inputs=None,
+                          max_concurrency=None, timeout=None, timeouts=None):
+    """
+    Runs a model for several steps with step_model_async, carrying the feedback state.
+
+    Returns:
+        list: The wire values of every step.
+    """
+    plan = execution_plan(model)
+    history = []
+    for _ in range(steps):
+        wire_values, state = await step_model_async(model, behaviors, state=state, inputs=inputs, plan=plan,
+                                                    max_concurrency=max_concurrency, timeout=timeout,
+                                                    timeouts=timeouts)
+        history.append(wire_values)
+    return history
+
+
+class _NoLimit:
+    """
+    Stand-in for a semaphore when concurrency is unlimited.
+    """
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+# ----------------- TESTS -----------------
+
+import json
+import time
+
+from tools.execution import step_model
+
+
+def _game_model():
+    """
+    Loads the two-player game from the models directory.
+    """
+    with open("models/game_model.json", "r") as file:
+        return json.load(file)
+
+
+async def _start_stub_server(delay):
+    """
+    Starts a local TCP server that answers each line "<number>" with "<number + 1>"
+    after `delay` seconds, standing in for a model server.
+    """
+    async def handle(reader, writer):
+        line = await reader.readline()
+        await asyncio.sleep(delay)
+        writer.write(f"{float(line) + 1}\n".encode())
+        await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    return server, server.sockets[0].getsockname()[1]
+
+
+def _remote_policy(port):
+    """
+    A policy that asks the stub server for its action.
+    """
+    async def policy(payoff):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(f"{payoff or 0.0}\n".encode())
+        await writer.drain()
+        action = float(await reader.readline())
+        writer.close()
+        return (action,)
+    return policy
+
+
+def _game(u_alice, u_bob):
+    """
+    A zero-sum game: each player is paid the difference between the two actions
+    (no action yet counts as 0).
+    """
+    u_alice, u_bob = u_alice or 0.0, u_bob or 0.0
+    return (u_alice - u_bob, u_bob - u_alice)
+
+
+def test_policies_run_concurrently():
+    """
+    Alice's and Bob's policies sit on the same level, so two 0.2s server calls take ~0.2s.
+    """
+    async def scenario():
+        server, port = await _start_stub_server(delay=0.2)
+        async with server:
+            behaviors = {"game": _game, "G": _remote_policy(port)}
+            start = time.perf_counter()
+            history = await run_model_async(_game_model(), behaviors, steps=2)
+            return history, time.perf_counter() - start
+
+    history, elapsed = asyncio.run(scenario())
+    # Per step: the game, then both policies in parallel.
+    assert elapsed < 0.75, f"Policies were not awaited concurrently ({elapsed:.2f}s)"
+    assert history[1]["w_alice_action"] == 1.0 and history[1]["w_bob_action"] == 1.0
+
+
+def test_matches_step_model():
+    """
+    Synchronous and asynchronous execution agree.
+    """
+    model = _game_model()
+
+    async def policy(payoff):
+        await asyncio.sleep(0)
+        return (0.5 * (payoff or 0.0) + 1.0,)
+
+    async_history = asyncio.run(run_model_async(model, {"game": _game, "alice_policy": policy,
+                                                        "bob_policy": lambda y: (2.0 - (y or 0.0),)}, steps=4))
+    state = {}
+    for expected_step in async_history:
+        wire_values, state = step_model(model, {"game": _game, "alice_policy": lambda y: (0.5 * (y or 0.0) + 1.0,),
+                                                "bob_policy": lambda y: (2.0 - (y or 0.0),)}, state=state)
+        assert wire_values == expected_step
+
+
+def test_concurrency_limit_and_timeout():
+    """
+    A limit of one serializes the policies, and a slow processor hits its timeout.
+    """
+    async def scenario():
+        server, port = await _start_stub_server(delay=0.2)
+        async with server:
+            behaviors = {"game": _game, "G": _remote_policy(port)}
+            start = time.perf_counter()
+            await step_model_async(_game_model(), behaviors, state={"w_alice_payoff": 0.0, "w_bob_payoff": 0.0},
+                                   max_concurrency=1)
+            serialized = time.perf_counter() - start
+            try:
+                await step_model_async(_game_model(), behaviors, timeout=5.0, timeouts={"bob_policy": 0.05})
+            except asyncio.TimeoutError as error:
+                timed_out = str(error)
+            else:
+                timed_out = None
+            return serialized, timed_out
+
+    serialized, timed_out = asyncio.run(scenario())
+    assert serialized >= 0.4, f"max_concurrency=1 did not serialize the calls ({serialized:.2f}s)"
+    assert timed_out is not None and "bob_policy" in timed_out
+
+
+if __name__ == "__main__":
+    test_policies_run_concurrently()
+    test_matches_step_model()
+    test_concurrency_limit_and_timeout()
+    print("✅ All async execution tests passed!")
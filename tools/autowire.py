@@ -0,0 +1,407 @@
+# Automatic wiring completion.
+# Generated models often leave ports open and terminals unused. For each space we
+# pair the open ports of that space with its unused terminals, preferring terminals
+# from related processors (same name prefix), nearby processors, and other processors
+# over self-loops. Every new wire takes the space of the port and terminal it joins,
+# and each open port receives at most one wire.
+#
+# Each tier starts from a greedy pass that gives every port its nearest remaining
+# terminal, then grows it into a maximum matching by augmenting paths, so a port is only
+# left open (or closed by a self-loop) when no re-assignment of the other ports frees a
+# terminal for it.
+
+from bisect import bisect_left
+from collections import deque
+
+
+def name_prefix(proc_id):
+    """
+    Default affinity key: the part of a processor ID before the first underscore
+    (e.g. "alice" for "alice_decision").
+    """
+    return proc_id.split("_", 1)[0]
+
+
+def _open_endpoints(model):
+    """
+    Collects open ports and unused terminals, grouped by space.
+
+    Returns:
+        tuple: (ports, terminals, all_terminals), each a dict space -> list of
+               (position, processor_id, index) in model processor order.
+    """
+    wired_ports = set()
+    used_terminals = set()
+    for wire in model.get("wires", []):
+        wired_ports.add(tuple(wire["Destination"]))
+        used_terminals.add(tuple(wire["Source"]))
+
+    ports = {}
+    terminals = {}
+    all_terminals = {}
+    for position, proc in enumerate(model.get("processors", [])):
+        proc_id = proc["ID"]
+        for i, port in enumerate(proc.get("Ports", [])):
+            if (proc_id, i) not in wired_ports:
+                ports.setdefault(port, []).append((position, proc_id, i))
+        for i, term in enumerate(proc.get("Terminals", [])):
+            all_terminals.setdefault(term, []).append((position, proc_id, i))
+            if (proc_id, i) not in used_terminals:
+                terminals.setdefault(term, []).append((position, proc_id, i))
+    return ports, terminals, all_terminals
+
+
+def _find(parent, i):
+    """
+    Follows parent links to the representative of i, compressing the path.
+    """
+    root = i
+    while parent[root] != root:
+        root = parent[root]
+    while parent[i] != root:
+        parent[i], i = root, parent[i]
+    return root
+
+
+def _pair_in_order(ports, terminals, allow_same_processor):
+    """
+    Pairs each port, in processor order, with the nearest remaining terminal by processor
+    position (the earlier one on a tie). Terminals on the port's own processor are skipped
+    (and kept for later ports) unless allow_same_processor is True.
+
+    Both lists must be sorted by position. The nearest remaining terminal on each side is
+    found through union-find links that skip the terminals already taken.
+
+    Returns:
+        tuple: (pairs, unmatched_ports, unmatched_terminals)
+    """
+    count = len(terminals)
+    positions = [term[0] for term in terminals]
+    after = list(range(count + 1))  # after[i]: first remaining terminal at or after i (count if none)
+    before = list(range(count + 1))  # before[i + 1] - 1: last remaining terminal at or before i (-1 if none)
+    taken = [False] * count
+    pairs = []
+    unmatched_ports = []
+    for port in ports:
+        start = bisect_left(positions, port[0])
+        right = _find(after, start)
+        while right < count and not allow_same_processor and terminals[right][1] == port[1]:
+            right = _find(after, right + 1)
+        left = _find(before, start) - 1
+        while left >= 0 and not allow_same_processor and terminals[left][1] == port[1]:
+            left = _find(before, left) - 1
+        if left < 0 and right == count:
+            unmatched_ports.append(port)
+            continue
+        if right == count or (left >= 0 and port[0] - positions[left] <= positions[right] - port[0]):
+            choice = left
+        else:
+            choice = right
+        pairs.append((port, terminals[choice]))
+        taken[choice] = True
+        after[choice] = choice + 1
+        before[choice + 1] = choice
+    return pairs, unmatched_ports, [term for term, used in zip(terminals, taken) if not used]
+
+
+def _augment(pairs, ports, terminals):
+    """
+    Grows (port, terminal) pairs between different processors into a maximum matching.
+
+    Breadth-first search from the unmatched ports finds a shortest augmenting path: each
+    matched port on it moves to another terminal, until one takes an unmatched terminal.
+    Pairs that are not on a path are kept, so the greedy preferences hold wherever they
+    do not leave a port open. Any terminal on another processor is a neighbour; the
+    terminals not reached yet are found through union-find links, so one search visits
+    every terminal once.
+
+    Returns:
+        tuple: (pairs, unmatched_ports, unmatched_terminals)
+    """
+    if not ports or not terminals:
+        return pairs, ports, terminals
+    all_ports = [port for port, _ in pairs] + list(ports)
+    all_terms = sorted([term for _, term in pairs] + list(terminals))
+    term_index = {term: j for j, term in enumerate(all_terms)}
+    count = len(all_terms)
+    port_match = [None] * len(all_ports)
+    term_match = [None] * count
+    for k, (_, term) in enumerate(pairs):
+        port_match[k] = term_index[term]
+        term_match[term_index[term]] = k
+
+    while True:
+        roots = [k for k, j in enumerate(port_match) if j is None]
+        unseen = list(range(count + 1))  # unseen[j]: first terminal at or after j not reached yet
+        reached_by = {}  # terminal -> port that reached it
+        came_from = {k: None for k in roots}  # port -> its matched terminal on the path
+        queue = deque(roots)
+        found = None
+        while queue and found is None:
+            k = queue.popleft()
+            proc_id = all_ports[k][1]
+            j = _find(unseen, 0)
+            while j < count:
+                if all_terms[j][1] == proc_id:
+                    j = _find(unseen, j + 1)
+                    continue
+                unseen[j] = j + 1
+                reached_by[j] = k
+                owner = term_match[j]
+                if owner is None:
+                    found = j
+                    break
+                if owner not in came_from:
+                    came_from[owner] = j
+                    queue.append(owner)
+                j = _find(unseen, j + 1)
+        if found is None:
+            break
+        j = found
+        while j is not None:
+            k = reached_by[j]
+            port_match[k], term_match[j] = j, k
+            j = came_from[k]
+
+    pairs = [(port, all_terms[j]) for port, j in zip(all_ports, port_match) if j is not None]
+    unmatched_ports = [port for port, j in zip(all_ports, port_match) if j is None]
+    unmatched_terms = [term for term, k in zip(all_terms, term_match) if k is None]
+    return pairs, unmatched_ports, unmatched_terms
+
+
+def _match_space(ports, terminals, affinity, avoid_self_loops, allow_self_loops):
+    """
+    Matches the open ports and unused terminals of one space, tier by tier:
+    same affinity key on different processors, then any other processor, then self-loops.
+    Self-loops are only made when allow_self_loops is True, and only in the last tier
+    when avoid_self_loops is True. Without self-loops, each tier ends with a maximum
+    matching (see _augment), and the second tier may re-assign pairs of the first.
+    """
+    pairs = []
+    self_loops_first = allow_self_loops and not avoid_self_loops
+    if affinity is not None:
+        keys = {}
+        port_groups = {}
+        term_groups = {}
+        for port in ports:
+            key = keys.get(port[1])
+            if key is None:
+                key = keys[port[1]] = affinity(port[1])
+            port_groups.setdefault(key, []).append(port)
+        for term in terminals:
+            key = keys.get(term[1])
+            if key is None:
+                key = keys[term[1]] = affinity(term[1])
+            term_groups.setdefault(key, []).append(term)
+        ports, terminals = [], []
+        for key, group in port_groups.items():
+            matched, left_ports, left_terms = _pair_in_order(group, term_groups.pop(key, []),
+                                                             allow_same_processor=self_loops_first)
+            if not self_loops_first:
+                matched, left_ports, left_terms = _augment(matched, left_ports, left_terms)
+            pairs += matched
+            ports += left_ports
+            terminals += left_terms
+        for group in term_groups.values():
+            terminals += group
+        ports.sort()
+        terminals.sort()
+
+    matched, ports, terminals = _pair_in_order(ports, terminals, allow_same_processor=self_loops_first)
+    pairs += matched
+    if not self_loops_first:
+        pairs, ports, terminals = _augment(pairs, ports, terminals)
+    if avoid_self_loops and allow_self_loops:
+        matched, ports, terminals = _pair_in_order(ports, terminals, allow_same_processor=True)
+        pairs += matched
+    return pairs, ports
+
+
+def auto_wire(model, affinity=name_prefix, avoid_self_loops=True, allow_self_loops=True,
+              allow_fanout=False, id_prefix="auto", in_place=False):
+    """
+    Proposes wires that close the open ports of a model using its unused terminals.
+
+    Ports and terminals are only paired within the same space, so the new wires pass
+    are_wires_typed_correctly, and each open port gets at most one wire, so they pass
+    no_duplicate_wires_into_ports.
+
+    Args:
+        model (dict): The block diagram model.
+        affinity (callable): Maps a processor ID to a key; ports are matched first with
+                             terminals whose processor has the same key. None disables it.
+        avoid_self_loops (bool): Only wire a processor to itself once other terminals run out.
+        allow_self_loops (bool): If False, never wire a processor to itself.
+        allow_fanout (bool): If True, ports left over once the unused terminals run out are
+                             fed from terminals that already drive a wire.
+        id_prefix (str): Prefix for the IDs of the new wires.
+        in_place (bool): If True, append the new wires to model["wires"].
+
+    Returns:
+        list: The new wire records.
+    """
+    ports, terminals, all_terminals = _open_endpoints(model)
+    existing_ids = {wire["ID"] for wire in model.get("wires", [])}
+
+    new_wires = []
+    counter = 0
+    for space, space_ports in ports.items():
+        pairs, left_over = _match_space(space_ports, terminals.get(space, []), affinity,
+                                        avoid_self_loops, allow_self_loops)
+        if allow_fanout and left_over and all_terminals.get(space):
+            sources = all_terminals[space]
+            others = {}  # processor ID -> the sources on other processors
+            for k, port in enumerate(left_over):
+                if allow_self_loops:
+                    candidates = sources
+                else:
+                    candidates = others.get(port[1])
+                    if candidates is None:
+                        candidates = others[port[1]] = [t for t in sources if t[1] != port[1]]
+                if candidates:
+                    pairs.append((port, candidates[k % len(candidates)]))
+        for (_, dst_proc, dst_idx), (_, src_proc, src_idx) in pairs:
+            wire_id = f"{id_prefix}_{counter}"
+            while wire_id in existing_ids:
+                counter += 1
+                wire_id = f"{id_prefix}_{counter}"
+            counter += 1
+            new_wires.append({
+                "ID": wire_id,
+                "Parent": space,
+                "Name": f"Auto {space}",
+                "Source": [src_proc, src_idx],
+                "Destination": [dst_proc, dst_idx],
+            })
+
+    if in_place:
+        model.setdefault("wires", []).extend(new_wires)
+    return new_wires
+
+
+# ----------------- TESTS -----------------
+
+import io
+import time
+from contextlib import redirect_stdout
+
+from tools.validations import are_wires_typed_correctly, no_duplicate_wires_into_ports
+
+
+def test_auto_wire_control_loop():
+    """
+    Wiring the bare plant/controller/sensor closes the loop without self-loops except
+    where only the plant can provide its own state.
+    """
+    model = {
+        "processors": [
+            {"ID": "f", "Parent": "F", "Ports": ["X", "U"], "Terminals": ["X"]},
+            {"ID": "g", "Parent": "G", "Ports": ["Y"], "Terminals": ["U"]},
+            {"ID": "s", "Parent": "S", "Ports": ["X"], "Terminals": ["Y"]}
+        ],
+        "wires": []
+    }
+    new_wires = auto_wire(model, in_place=True)
+    assert len(new_wires) == 3
+    assert {(w["Source"][0], w["Destination"][0], w["Parent"]) for w in new_wires} == \
+        {("f", "s", "X"), ("g", "f", "U"), ("s", "g", "Y")}
+    # f's own state port is left open: its only X terminal is taken by the sensor.
+    assert auto_wire(model, allow_fanout=True)[0]["Source"] == ["f", 0]
+    with redirect_stdout(io.StringIO()):
+        assert are_wires_typed_correctly(model)
+        assert no_duplicate_wires_into_ports(model)
+
+
+def test_auto_wire_prefers_affinity():
+    """
+    Alice's ports are fed from Alice's terminals and Bob's from Bob's.
+    """
+    model = {
+        "processors": [
+            {"ID": "alice_policy", "Parent": "G", "Ports": ["Y"], "Terminals": ["U"]},
+            {"ID": "bob_policy", "Parent": "G", "Ports": ["Y"], "Terminals": ["U"]},
+            {"ID": "bob_game", "Parent": "Game", "Ports": ["U"], "Terminals": ["Y"]},
+            {"ID": "alice_game", "Parent": "Game", "Ports": ["U"], "Terminals": ["Y"]}
+        ],
+        "wires": []
+    }
+    for wire in auto_wire(model):
+        assert name_prefix(wire["Source"][0]) == name_prefix(wire["Destination"][0])
+    mixed = auto_wire(model, affinity=None)
+    assert any(name_prefix(w["Source"][0]) != name_prefix(w["Destination"][0]) for w in mixed)
+
+
+def test_auto_wire_forbid_self_loops():
+    """
+    A lone plant can only close its state port with a self-loop.
+    """
+    model = {"processors": [{"ID": "f", "Parent": "F", "Ports": ["X", "U"], "Terminals": ["X"]}], "wires": []}
+    assert auto_wire(model, allow_self_loops=False) == []
+    assert auto_wire(model, avoid_self_loops=False, allow_self_loops=False) == []
+    assert [w["Source"] for w in auto_wire(model)] == [["f", 0]]
+
+
+def test_auto_wire_nearest_terminal():
+    """
+    Without affinity, each port takes the nearest remaining terminal by processor position.
+    """
+    model = {
+        "processors": [
+            {"ID": "a", "Parent": "S", "Ports": [], "Terminals": ["Y"]},
+            {"ID": "b", "Parent": "S", "Ports": [], "Terminals": ["Y"]},
+            {"ID": "c", "Parent": "G", "Ports": ["Y"], "Terminals": []},
+            {"ID": "d", "Parent": "G", "Ports": ["Y"], "Terminals": []},
+            {"ID": "e", "Parent": "S", "Ports": [], "Terminals": ["Y"]}
+        ],
+        "wires": []
+    }
+    assert {w["Destination"][0]: w["Source"][0] for w in auto_wire(model, affinity=None)} == {"c": "b", "d": "e"}
+
+
+def test_auto_wire_is_a_maximum_matching():
+    """
+    The nearest terminal of p1 is the only one p2 may use; re-assigning it closes both
+    ports without a self-loop.
+    """
+    model = {
+        "processors": [
+            {"ID": "p1", "Parent": "G", "Ports": ["Y"], "Terminals": []},
+            {"ID": "p3", "Parent": "S", "Ports": [], "Terminals": ["Y"]},
+            {"ID": "p2", "Parent": "G", "Ports": ["Y"], "Terminals": ["Y"]}
+        ],
+        "wires": []
+    }
+    expected = {"p1": "p2", "p2": "p3"}
+    for options in ({"affinity": None, "allow_self_loops": False}, {}, {"affinity": None}):
+        new_wires = auto_wire(model, **options)
+        assert {w["Destination"][0]: w["Source"][0] for w in new_wires} == expected, options
+
+
+def test_auto_wire_large():
+    """
+    Tens of thousands of open ports are wired well under a second.
+    """
+    processors = []
+    for i in range(10000):
+        processors.append({"ID": f"agent{i}_policy", "Parent": "G", "Ports": ["Y"], "Terminals": ["U"]})
+        processors.append({"ID": f"agent{i}_plant", "Parent": "F", "Ports": ["X", "U"], "Terminals": ["X"]})
+        processors.append({"ID": f"agent{i}_sensor", "Parent": "S", "Ports": ["X"], "Terminals": ["Y"]})
+    model = {"processors": processors, "wires": []}
+    start = time.perf_counter()
+    new_wires = auto_wire(model, in_place=True)
+    elapsed = time.perf_counter() - start
+    assert len(new_wires) == 30000
+    assert elapsed < 1.0, f"auto_wire took {elapsed:.2f}s"
+    with redirect_stdout(io.StringIO()):
+        assert are_wires_typed_correctly(model)
+        assert no_duplicate_wires_into_ports(model)
+
+
+if __name__ == "__main__":
+    test_auto_wire_control_loop()
+    test_auto_wire_prefers_affinity()
+    test_auto_wire_forbid_self_loops()
+    test_auto_wire_nearest_terminal()
+    test_auto_wire_is_a_maximum_matching()
+    test_auto_wire_large()
+    print("✅ All auto-wire tests passed!")
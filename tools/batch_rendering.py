@@ -0,0 +1,253 @@
+# Rendering many models at once.
+# generate_block_diagram(..., output_filename=...) runs one graphviz subprocess at a time.
+# For a corpus, the DOT sources are built in a process pool, then `dot` runs on them with a
+# bounded number of subprocesses at once. A manifest in the output directory records the
+# hash of the DOT source behind every rendered file, so unchanged models are skipped on the
+# next run. Every `dot` run is timed, which is essentially the layout time of the diagram.
+
+import concurrent.futures
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import time
+
+from tools.visualizations import generate_block_diagram
+
+MANIFEST = ".render_manifest.json"
+
+
+def load_corpus(directory):
+    """
+    Loads every JSON model in a directory.
+
+    Returns:
+        dict: model name (file name without .json) -> model, sorted by name.
+    """
+    corpus = {}
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith(".json"):
+            with open(os.path.join(directory, filename), "r") as file:
+                corpus[filename[:-len(".json")]] = json.load(file)
+    return corpus
+
+
+def _dot_source(item):
+    """
+    Builds the DOT source of one model (runs in the process pool).
+    """
+    name, model = item
+    return name, generate_block_diagram(model).source
+
+
+def _run_dot(dot_command, source, fmt, path, timeout):
+    """
+    Runs one `dot` subprocess and times it.
+
+    Returns:
+        tuple: (seconds, error message or None)
+    """
+    command = [dot_command] if isinstance(dot_command, str) else list(dot_command)
+    start = time.perf_counter()
+    try:
+        result = subprocess.run(command + [f"-T{fmt}", "-o", path], input=source.encode(),
+                                capture_output=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return time.perf_counter() - start, f"dot timed out after {timeout}s"
+    seconds = time.perf_counter() - start
+    if result.returncode != 0:
+        return seconds, result.stderr.decode(errors="replace").strip() or f"dot exited with {result.returncode}"
+    return seconds, None
+
+
+def render_corpus(models, output_dir, formats=("png",), workers=None, max_dot_processes=None,
+                  dot_command="dot", timeout=None, force=False):
+    """
+    Renders a corpus of models to image files.
+
+    Args:
+        models (dict): model name -> model (e.g. from load_corpus).
+        output_dir (str): Directory for the images and the manifest (created if needed).
+        formats (tuple): Output formats, "png" and/or "svg".
+        workers (int): Processes building DOT sources. 1 builds them in this process.
+        max_dot_processes (int): Maximum number of `dot` subprocesses at once (default: CPU count).
+        dot_command (str or list): The graphviz `dot` executable (or command prefix).
+        timeout (float): Seconds allowed for each `dot` run. None means no limit.
+        force (bool): Render even the models whose output is up to date.
+
+    Returns:
+        list: One dict per (model, format), slowest layout first:
+              {"model", "format", "path", "status": "rendered" / "up to date" / "failed",
+               "seconds": layout time (None if skipped), "error": message or None}
+
+    Raises:
+        ValueError: If a format is not supported.
+        FileNotFoundError: If the dot executable cannot be found.
+    """
+    for fmt in formats:
+        if fmt not in ("png", "svg"):
+            raise ValueError(f"Unsupported format '{fmt}'. Use 'png' or 'svg'.")
+    executable = dot_command if isinstance(dot_command, str) else dot_command[0]
+    if shutil.which(executable) is None:
+        raise FileNotFoundError(f"Graphviz executable '{executable}' not found.")
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST)
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r") as file:
+            manifest = json.load(file)
+
+    items = list(models.items())
+    if workers == 1 or len(items) <= 1:
+        sources = dict(map(_dot_source, items))
+    else:
+        context = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() \
+            else multiprocessing.get_context()
+        chunksize = max(1, len(items) // (4 * (workers or os.cpu_count() or 1)))
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            sources = dict(pool.map(_dot_source, items, chunksize=chunksize))
+
+    report = []
+    jobs = []
+    for name, source in sources.items():
+        digest = hashlib.sha256(source.encode()).hexdigest()
+        for fmt in formats:
+            filename = f"{name}.{fmt}"
+            path = os.path.join(output_dir, filename)
+            entry = {"model": name, "format": fmt, "path": path, "status": "up to date", "seconds": None, "error": None}
+            report.append(entry)
+            if not force and manifest.get(filename) == digest and os.path.exists(path):
+                continue
+            jobs.append((entry, filename, digest, source))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_dot_processes or os.cpu_count() or 1) as pool:
+        futures = {}
+        for entry, filename, digest, source in jobs:
+            future = pool.submit(_run_dot, dot_command, source, entry["format"], entry["path"], timeout)
+            futures[future] = (entry, filename, digest)
+        for future in concurrent.futures.as_completed(futures):
+            entry, filename, digest = futures[future]
+            entry["seconds"], entry["error"] = future.result()
+            if entry["error"] is None:
+                entry["status"] = "rendered"
+                manifest[filename] = digest
+            else:
+                entry["status"] = "failed"
+                manifest.pop(filename, None)
+
+    with open(manifest_path, "w") as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+    report.sort(key=lambda entry: -(entry["seconds"] or 0.0))
+    return report
+
+
+# ----------------- TESTS -----------------
+
+import sys
+import tempfile
+
+# Stands in for graphviz: writes the DOT source it reads to the -o file after a short pause.
+_FAKE_DOT = """
+import sys, time
+args = sys.argv[1:]
+source = sys.stdin.read()
+time.sleep(float(__import__("os").environ.get("FAKE_DOT_DELAY", "0")))
+if "fail_me" in source:
+    sys.stderr.write("syntax error")
+    sys.exit(1)
+with open(args[args.index("-o") + 1], "w") as out:
+    out.write(args[0] + "\\n" + source)
+"""
+
+
+def _fake_dot(directory):
+    """
+    Writes the stand-in dot script and returns the command running it.
+    """
+    path = os.path.join(directory, "fake_dot.py")
+    with open(path, "w") as file:
+        file.write(_FAKE_DOT)
+    return [sys.executable, path]
+
+
+def test_renders_and_skips_up_to_date():
+    """
+    Every model is rendered once; the second run skips them all, and changing one model
+    re-renders only that one.
+    """
+    corpus = load_corpus("models")
+    with tempfile.TemporaryDirectory() as output_dir:
+        dot = _fake_dot(output_dir)
+        report = render_corpus(corpus, output_dir, formats=("png", "svg"), workers=2, dot_command=dot)
+        assert len(report) == 2 * len(corpus)
+        assert all(entry["status"] == "rendered" and entry["seconds"] is not None for entry in report)
+        with open(os.path.join(output_dir, "simple_model.svg"), "r") as file:
+            assert file.readline().strip() == "-Tsvg"
+
+        report = render_corpus(corpus, output_dir, formats=("png", "svg"), workers=2, dot_command=dot)
+        assert {entry["status"] for entry in report} == {"up to date"}
+
+        corpus["simple_model"]["processors"][0]["Name"] = "Renamed"
+        report = render_corpus(corpus, output_dir, formats=("png",), workers=1, dot_command=dot)
+        assert [entry["model"] for entry in report if entry["status"] == "rendered"] == ["simple_model"]
+
+
+def test_dot_processes_are_bounded():
+    """
+    Six 0.2s layouts take about 0.4s with three dot processes and over 1.2s with one.
+    """
+    corpus = {f"m{i}": {"processors": [{"ID": f"p{i}", "Parent": "F", "Ports": [], "Terminals": []}], "wires": []}
+              for i in range(6)}
+    os.environ["FAKE_DOT_DELAY"] = "0.2"
+    try:
+        timings = {}
+        for limit in (3, 1):
+            with tempfile.TemporaryDirectory() as output_dir:
+                start = time.perf_counter()
+                render_corpus(corpus, output_dir, workers=1, max_dot_processes=limit, dot_command=_fake_dot(output_dir))
+                timings[limit] = time.perf_counter() - start
+    finally:
+        del os.environ["FAKE_DOT_DELAY"]
+    assert timings[1] >= 1.2 and timings[3] < timings[1]
+
+
+def test_failures_are_reported():
+    """
+    A failing layout is reported and not recorded as up to date.
+    """
+    corpus = {"good": load_corpus("models")["simple_model"],
+              "bad": {"processors": [{"ID": "fail_me", "Parent": "F", "Ports": [], "Terminals": []}], "wires": []}}
+    with tempfile.TemporaryDirectory() as output_dir:
+        report = render_corpus(corpus, output_dir, workers=1, dot_command=_fake_dot(output_dir))
+        status = {entry["model"]: (entry["status"], entry["error"]) for entry in report}
+        assert status == {"good": ("rendered", None), "bad": ("failed", "syntax error")}
+        with open(os.path.join(output_dir, MANIFEST), "r") as file:
+            assert list(json.load(file)) == ["good.png"]
+        try:
+            render_corpus(corpus, output_dir, formats=("pdf",))
+        except ValueError as error:
+            assert "pdf" in str(error)
+        else:
+            assert False, "Expected a ValueError"
+
+
+def test_real_graphviz():
+    """
+    Renders a real PNG when graphviz is installed.
+    """
+    if shutil.which("dot") is None:
+        return
+    with tempfile.TemporaryDirectory() as output_dir:
+        report = render_corpus({"simple_model": load_corpus("models")["simple_model"]}, output_dir)
+        with open(report[0]["path"], "rb") as file:
+            assert file.read(8) == b"\x89PNG\r\n\x1a\n"
+
+
+if __name__ == "__main__":
+    test_renders_and_skips_up_to_date()
+    test_dot_processes_are_bounded()
+    test_failures_are_reported()
+    test_real_graphviz()
+    print("✅ All batch rendering tests passed!")
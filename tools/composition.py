@@ -0,0 +1,476 @@
+# Composition operators for block diagram models.
+# Big systems are built by composing smaller models in series, in parallel and with
+# feedback. A composite only keeps references to its parts and the wires it adds.
+# The open ports and unused terminals are kept per space in queues that each operator
+# hands on to its result, so series can pick the first matching terminals without
+# looking at the rest of the interface. When joining two queues, the smaller one is
+# moved into the larger, so every composition step does work proportional to the
+# smaller operand. The full interface lists and the flat model are only built by
+# get_component_ports_and_terminals and to_model, in one walk over the parts.
+
+from collections import deque
+
+from tools.indexing import build_model_index
+
+
+def _model_interface(model):
+    """
+    Lists the open ports and unused terminals of a plain model, in model order.
+
+    Returns:
+        tuple: ([(processor_id, port_index, space)], [(processor_id, terminal_index, space)])
+    """
+    index = build_model_index(model)
+    ports = []
+    terminals = []
+    for proc in model.get("processors", []):
+        proc_id = proc["ID"]
+        for i, port in enumerate(proc.get("Ports", [])):
+            if (proc_id, i) not in index["into_port"]:
+                ports.append((proc_id, i, port))
+        for i, term in enumerate(proc.get("Terminals", [])):
+            if (proc_id, i) not in index["from_terminal"]:
+                terminals.append((proc_id, i, term))
+    return ports, terminals
+
+
+def _queues(entries):
+    """
+    Groups interface entries by space, keeping their order.
+
+    Returns:
+        dict: {"by_space": {space: deque of entries}, "live": {(processor_id, index): space},
+               "count": {space: number of live entries}}. Entries removed by feedback stay in
+               the deques until they are skipped.
+    """
+    queues = {"by_space": {}, "live": {}, "count": {}}
+    for entry in entries:
+        queues["by_space"].setdefault(entry[2], deque()).append(entry)
+        queues["live"][entry[:2]] = entry[2]
+        queues["count"][entry[2]] = queues["count"].get(entry[2], 0) + 1
+    return queues
+
+
+def _join(first, second):
+    """
+    Concatenates two queue groups (first before second) by moving the smaller into the larger.
+    Both arguments are consumed.
+    """
+    if len(first["live"]) >= len(second["live"]):
+        for space, queue in second["by_space"].items():
+            first["by_space"].setdefault(space, deque()).extend(queue)
+        target, source = first, second
+    else:
+        for space, queue in first["by_space"].items():
+            second["by_space"].setdefault(space, deque()).extendleft(reversed(queue))
+        target, source = second, first
+    target["live"].update(source["live"])
+    for space, count in source["count"].items():
+        target["count"][space] = target["count"].get(space, 0) + count
+    return target
+
+
+def _take(queues, space, count):
+    """
+    Removes and returns the first count live entries of a space.
+    """
+    queue = queues["by_space"][space]
+    taken = []
+    while len(taken) < count:
+        entry = queue.popleft()
+        if queues["live"].pop(entry[:2], None) is not None:
+            taken.append(entry)
+    queues["count"][space] -= count
+    return taken
+
+
+def _remove(queues, ref):
+    """
+    Removes one entry, given as (processor_id, index), and returns its space.
+    """
+    space = queues["live"].pop(ref)
+    queues["count"][space] -= 1
+    return space
+
+
+def _interface(c):
+    """
+    Lists the open ports and unused terminals of a component in interface order, walking its parts once.
+
+    Returns:
+        tuple: ([(processor_id, port_index, space)], [(processor_id, terminal_index, space)])
+    """
+    if "parts" not in c:
+        return _model_interface(c)
+    ports, terminals = [], []
+    wired_ports, wired_terminals = set(), set()
+    models = {}
+    # Ports follow the parts in order; series lists the terminals of its second part first.
+    for kind, found in (("ports", ports), ("terminals", terminals)):
+        stack = [c]
+        while stack:
+            item = stack.pop()
+            if "parts" not in item:
+                if id(item) not in models:
+                    models[id(item)] = _model_interface(item)
+                found.extend(models[id(item)][0 if kind == "ports" else 1])
+                continue
+            parts = item["parts"]
+            if kind == "ports":
+                for wire in item["wires"]:
+                    wired_terminals.add(tuple(wire["Source"]))
+                    wired_ports.add(tuple(wire["Destination"]))
+            elif item.get("operator") == "series":
+                parts = parts[::-1]
+            stack.extend(reversed(parts))
+    return ([p for p in ports if p[:2] not in wired_ports],
+            [t for t in terminals if t[:2] not in wired_terminals])
+
+
+def _state(c):
+    """
+    Returns the interface queues of a component, rebuilding them if they were handed on.
+    """
+    if c["interface"] is None:
+        ports, terminals = _interface(c)
+        c["interface"] = {"ports": _queues(ports), "terminals": _queues(terminals)}
+    return c["interface"]
+
+
+def _claim(c):
+    """
+    Takes the interface queues of an operand for its composite. A component that is used
+    again later rebuilds its queues from its parts.
+    """
+    state = _state(c)
+    c["interface"] = None
+    return state
+
+
+def component(model, prefix=None):
+    """
+    Wraps a model as a component, computing its interface once.
+
+    Args:
+        model (dict): The block diagram model.
+        prefix (str): If given, the model is copied with every processor and wire ID
+                      prefixed (e.g. "alice_"), so the same model can be used several times.
+
+    Returns:
+        dict: A component with keys:
+            "parts": the models and components it is made of.
+            "wires": the wires added by this composition step.
+            "interface": the open ports and unused terminals grouped by space, or None once
+                         they were handed on to a composite (see get_component_ports_and_terminals).
+    """
+    if prefix is not None:
+        model = {
+            "processors": [dict(p, ID=prefix + p["ID"]) for p in model.get("processors", [])],
+            "wires": [dict(w, ID=prefix + w["ID"],
+                           Source=[prefix + w["Source"][0], w["Source"][1]],
+                           Destination=[prefix + w["Destination"][0], w["Destination"][1]])
+                      for w in model.get("wires", [])],
+        }
+    ports, terminals = _model_interface(model)
+    return {"parts": [model], "wires": [], "interface": {"ports": _queues(ports), "terminals": _queues(terminals)}}
+
+
+def _as_component(item):
+    """
+    Accepts either a component or a plain model.
+    """
+    return item if "parts" in item else component(item)
+
+
+def _new_wire(src, dst, space):
+    """
+    Builds the wire record joining terminal src to port dst.
+    """
+    return {
+        "ID": f"w_{src[0]}_{src[1]}_{dst[0]}_{dst[1]}",
+        "Parent": space,
+        "Name": f"{src[0]} to {dst[0]}",
+        "Source": [src[0], src[1]],
+        "Destination": [dst[0], dst[1]],
+    }
+
+
+def series(a, b):
+    """
+    Composes two components in series: each open port of b (in order) is fed by the
+    first unused terminal of a in the same space.
+
+    The composite exposes a's ports and b's unmatched ports, and b's terminals
+    followed by a's unmatched terminals. The wires are added space by space.
+
+    Raises:
+        ValueError: If no terminal of a matches a port of b.
+    """
+    a = _as_component(a)
+    b = _as_component(b)
+    available = _state(a)["terminals"]["count"]
+    matches = {}
+    for space, count in _state(b)["ports"]["count"].items():
+        count = min(count, available.get(space, 0))
+        if count:
+            matches[space] = count
+    if not matches:
+        raise ValueError("Cannot compose in series: no terminal of the first operand matches a port of the second.")
+
+    a_state, b_state = _claim(a), _claim(b)
+    wires = []
+    for space, count in matches.items():
+        for term, port in zip(_take(a_state["terminals"], space, count), _take(b_state["ports"], space, count)):
+            wires.append(_new_wire(term, port, space))
+    state = {"ports": _join(a_state["ports"], b_state["ports"]),
+             "terminals": _join(b_state["terminals"], a_state["terminals"])}
+    return {"parts": [a, b], "operator": "series", "wires": wires, "interface": state}
+
+
+def parallel(a, b):
+    """
+    Composes two components side by side, without any wires between them.
+    The processor IDs of a and b must not overlap (see the prefix argument of component).
+    """
+    a = _as_component(a)
+    b = _as_component(b)
+    a_state, b_state = _claim(a), _claim(b)
+    state = {"ports": _join(a_state["ports"], b_state["ports"]),
+             "terminals": _join(a_state["terminals"], b_state["terminals"])}
+    return {"parts": [a, b], "operator": "parallel", "wires": [], "interface": state}
+
+
+def feedback(a, mapping):
+    """
+    Closes loops inside a component.
+
+    Args:
+        a (dict): The component (or model).
+        mapping (dict): (processor_id, terminal_index) -> (processor_id, port_index).
+                        Each terminal must be an unused terminal of a, and each port an open port.
+                        As in series, both are used up: the ports are closed and the terminals
+                        are no longer available.
+
+    Raises:
+        ValueError: If a terminal or port is not part of the interface, or their spaces differ.
+    """
+    a = _as_component(a)
+    state = _state(a)
+    terminals, ports = state["terminals"]["live"], state["ports"]["live"]
+    closed = set()
+    for term_ref, port_ref in mapping.items():
+        term_ref, port_ref = tuple(term_ref), tuple(port_ref)
+        if term_ref not in terminals:
+            raise ValueError(f"Terminal {term_ref} is not an available terminal of the component.")
+        if port_ref not in ports or port_ref in closed:
+            raise ValueError(f"Port {port_ref} is not an open port of the component.")
+        if terminals[term_ref] != ports[port_ref]:
+            raise ValueError(f"Cannot feed terminal {term_ref} ({terminals[term_ref]}) back into port {port_ref} ({ports[port_ref]}).")
+        closed.add(port_ref)
+
+    state = _claim(a)
+    wires = []
+    for term_ref, port_ref in mapping.items():
+        _remove(state["terminals"], tuple(term_ref))
+        space = _remove(state["ports"], tuple(port_ref))
+        wires.append(_new_wire(term_ref, port_ref, space))
+    return {"parts": [a], "operator": "feedback", "wires": wires, "interface": state}
+
+
+def get_component_ports_and_terminals(c):
+    """
+    Returns the basic view of a component's interface, in the format of
+    get_ports_and_terminals(model, output_style="basic").
+
+    Ports and terminals are tracked by index: a terminal is available while no wire
+    leaves that terminal index, and every operator uses up the terminals it wires
+    (series and feedback alike). get_ports_and_terminals(to_model(c),
+    only_open_terminals=True) instead drops every terminal of a processor whose space has
+    an outgoing wire, so the two agree unless a processor has several terminals in the
+    same space and only some of them are wired.
+    """
+    ports, terminals = _interface(c)
+    return {
+        "open_ports": [(proc_id, space) for (proc_id, _, space) in ports],
+        "available_terminals": [(proc_id, space) for (proc_id, _, space) in terminals],
+    }
+
+
+def to_model(c):
+    """
+    Flattens a component into a plain model with "processors" and "wires".
+
+    Raises:
+        ValueError: If two processors or two wires share an ID.
+    """
+    processors = []
+    wires = []
+    stack = [c]
+    while stack:
+        item = stack.pop()
+        if "parts" not in item:
+            processors.extend(item.get("processors", []))
+            wires.extend(item.get("wires", []))
+            continue
+        wires.extend(item["wires"])
+        stack.extend(reversed(item["parts"]))
+    for kind, records in (("processor", processors), ("wire", wires)):
+        seen = set()
+        for record in records:
+            if record["ID"] in seen:
+                raise ValueError(f"Duplicate {kind} ID '{record['ID']}' in composed model.")
+            seen.add(record["ID"])
+    return {"processors": processors, "wires": wires}
+
+
+# ----------------- TESTS -----------------
+
+import io
+import time
+from contextlib import redirect_stdout
+
+from tools.validations import (
+    get_ports_and_terminals, is_closed_loop, are_wires_typed_correctly, no_duplicate_wires_into_ports
+)
+
+PLANT = {"processors": [{"ID": "f", "Parent": "F", "Name": "Plant", "Ports": ["X", "U"], "Terminals": ["X"]}], "wires": []}
+SENSOR = {"processors": [{"ID": "s", "Parent": "S", "Name": "Sensor", "Ports": ["X"], "Terminals": ["Y"]}], "wires": []}
+CONTROLLER = {"processors": [{"ID": "g", "Parent": "G", "Name": "Controller", "Ports": ["Y"], "Terminals": ["U"]}], "wires": []}
+
+
+def test_compose_control_loop():
+    """
+    Plant with state feedback, then sensor, then controller, with the action fed back,
+    gives the closed control loop. The plant reports its state twice, once for itself
+    and once for the sensor.
+    """
+    plant = {"processors": [dict(PLANT["processors"][0], Terminals=["X", "X"])], "wires": []}
+    plant = feedback(plant, {("f", 0): ("f", 0)})
+    assert get_component_ports_and_terminals(plant) == {"open_ports": [("f", "U")], "available_terminals": [("f", "X")]}
+    # The validator matches terminals by space, so it counts the second X terminal as used.
+    assert get_ports_and_terminals(to_model(plant), only_open_terminals=True)["available_terminals"] == []
+    loop = series(series(plant, SENSOR), CONTROLLER)
+    assert get_component_ports_and_terminals(loop) == {"open_ports": [("f", "U")], "available_terminals": [("g", "U")]}
+    closed = feedback(loop, {("g", 0): ("f", 1)})
+    model = to_model(closed)
+    assert {(w["Source"][0], w["Destination"][0], w["Parent"]) for w in model["wires"]} == \
+        {("f", "f", "X"), ("f", "s", "X"), ("s", "g", "Y"), ("g", "f", "U")}
+    with redirect_stdout(io.StringIO()):
+        assert is_closed_loop(model)
+        assert are_wires_typed_correctly(model)
+        assert no_duplicate_wires_into_ports(model)
+
+
+def test_interface_matches_flat_model():
+    """
+    The interface tracked through composition agrees with get_ports_and_terminals on the flat model.
+    """
+    alice = series(component(PLANT, prefix="alice_"), component(SENSOR, prefix="alice_"))
+    bob = series(component(PLANT, prefix="bob_"), component(SENSOR, prefix="bob_"))
+    both = parallel(alice, bob)
+    flat = get_ports_and_terminals(to_model(both), only_open_terminals=True)
+    tracked = get_component_ports_and_terminals(both)
+    assert sorted(tracked["open_ports"]) == sorted(flat["open_ports"])
+    assert sorted(tracked["available_terminals"]) == sorted(flat["available_terminals"])
+
+
+def test_feedback_matches_flat_model():
+    """
+    Feedback uses up its terminals, so the interface agrees with the flat model, and a
+    fed-back terminal cannot feed anything else.
+    """
+    loop = feedback(PLANT, {("f", 0): ("f", 0)})
+    both = parallel(component(SENSOR, prefix="a_"), component(CONTROLLER, prefix="a_"))
+    both = feedback(series(component(PLANT, prefix="b_"), both), {("a_g", 0): ("b_f", 1)})
+    for c in (loop, both, parallel(loop, both)):
+        flat = get_ports_and_terminals(to_model(c), only_open_terminals=True)
+        tracked = get_component_ports_and_terminals(c)
+        assert sorted(tracked["open_ports"]) == sorted(flat["open_ports"])
+        assert sorted(tracked["available_terminals"]) == sorted(flat["available_terminals"])
+    assert get_component_ports_and_terminals(loop) == {"open_ports": [("f", "U")], "available_terminals": []}
+    try:
+        series(loop, SENSOR)
+    except ValueError:
+        pass
+    else:
+        assert False, "A fed-back terminal was used again"
+
+
+def test_composition_errors():
+    """
+    Mismatched feedback spaces, unknown ports and duplicate processors are rejected.
+    """
+    for bad_mapping in ({("f", 0): ("f", 1)}, {("f", 0): ("f", 7)}, {("g", 0): ("f", 1)}):
+        try:
+            feedback(PLANT, bad_mapping)
+        except ValueError:
+            pass
+        else:
+            assert False, f"feedback accepted {bad_mapping}"
+    try:
+        series(SENSOR, SENSOR)
+    except ValueError:
+        pass
+    else:
+        assert False, "series without matching spaces did not raise a ValueError"
+    try:
+        to_model(parallel(PLANT, PLANT))
+    except ValueError:
+        pass
+    else:
+        assert False, "Duplicate processor IDs did not raise a ValueError"
+
+
+def test_long_chain_is_linear():
+    """
+    Long series and parallel chains, nested either way, only touch the interfaces at each step.
+    """
+    stage = {"processors": [{"ID": "p", "Parent": "A", "Ports": ["X"], "Terminals": ["X"]}], "wires": []}
+    n = 20000
+    start = time.perf_counter()
+    chain = component(stage, prefix="p0_")
+    for i in range(1, n):
+        chain = series(chain, component(stage, prefix=f"p{i}_"))
+    model = to_model(chain)
+    elapsed = time.perf_counter() - start
+    assert len(model["processors"]) == n and len(model["wires"]) == n - 1
+    assert get_component_ports_and_terminals(chain) == {"open_ports": [("p0_p", "X")],
+                                                       "available_terminals": [(f"p{n - 1}_p", "X")]}
+    assert elapsed < 5.0, f"Composing the chain took {elapsed:.2f}s"
+
+    for name, compose in (("parallel", lambda c, s: parallel(c, s)), ("nested parallel", lambda c, s: parallel(s, c)),
+                          ("nested series", lambda c, s: series(s, c))):
+        start = time.perf_counter()
+        chain = component(stage, prefix="p0_")
+        for i in range(1, n):
+            chain = compose(chain, component(stage, prefix=f"p{i}_"))
+        interface = get_component_ports_and_terminals(chain)
+        elapsed = time.perf_counter() - start
+        assert len(to_model(chain)["processors"]) == n
+        assert elapsed < 5.0, f"Composing the {name} chain took {elapsed:.2f}s"
+        flat = get_ports_and_terminals(to_model(chain), only_open_terminals=True)
+        assert sorted(interface["open_ports"]) == sorted(flat["open_ports"]), name
+        assert sorted(interface["available_terminals"]) == sorted(flat["available_terminals"]), name
+
+
+def test_operand_used_twice():
+    """
+    A component keeps its interface after being composed, and can be composed again.
+    """
+    plant = component(PLANT)
+    first = series(plant, SENSOR)
+    assert get_component_ports_and_terminals(plant) == {"open_ports": [("f", "X"), ("f", "U")],
+                                                       "available_terminals": [("f", "X")]}
+    second = series(plant, component(SENSOR, prefix="b_"))
+    assert get_component_ports_and_terminals(first)["available_terminals"] == [("s", "Y")]
+    assert get_component_ports_and_terminals(second)["available_terminals"] == [("b_s", "Y")]
+
+
+if __name__ == "__main__":
+    test_compose_control_loop()
+    test_interface_matches_flat_model()
+    test_feedback_matches_flat_model()
+    test_composition_errors()
+    test_long_chain_is_linear()
+    test_operand_used_twice()
+    print("✅ All composition tests passed!")
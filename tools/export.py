@@ -0,0 +1,349 @@
+# Exporting models to graph analytics libraries.
+# Centrality, partitioning and spectral clustering want a matrix or a graph object, and
+# converting a model by hand builds every node and edge twice. Here:
+#
+#   processor_adjacency: a scipy.sparse CSR matrix with one row and column per processor,
+#                        where entry (i, j) counts the wires from processor i to processor j.
+#   port_adjacency:      a CSR matrix with one row per terminal and one column per port,
+#                        where entry (t, p) counts the wires from terminal t into port p.
+#                        Terminals and ports are numbered processor by processor, so the
+#                        index of (processor ID, i) is its processor's offset plus i.
+#   graph_view:          a read-only networkx.MultiDiGraph over the model itself. Nodes are
+#                        processor IDs with the processor records as attributes, edges are
+#                        keyed by wire ID with the wire records as attributes. Nothing is
+#                        copied: the view only keeps the wires entering and leaving each
+#                        processor, and builds neighbor dicts on access.
+#
+# The matrices are built from arrays of row and column indices in one pass over the wires,
+# so conversion is linear in the size of the model (see benchmark_export).
+
+import time
+from collections.abc import Mapping
+
+import networkx as nx
+import numpy as np
+import scipy.sparse as sp
+
+
+def _processor_numbers(wires, index, end):
+    """
+    Returns the processor numbers and local indices of one end of every wire, as arrays.
+
+    Raises:
+        ValueError: If a wire refers to an unknown processor.
+    """
+    try:
+        procs = np.fromiter((index[w[end][0]] for w in wires), dtype=np.int64, count=len(wires))
+    except KeyError as error:
+        raise ValueError(f"A wire refers to an unknown processor {error}.")
+    local = np.fromiter((w[end][1] for w in wires), dtype=np.int64, count=len(wires))
+    return procs, local
+
+
+def processor_adjacency(model, dtype=np.float64):
+    """
+    Exports the processor-level wiring as a sparse adjacency matrix.
+
+    Args:
+        model (dict): The model.
+        dtype: Data type of the matrix entries.
+
+    Returns:
+        dict: {"matrix": n x n CSR matrix of wire counts (rows are sources),
+               "ids": processor IDs in index order,
+               "index": processor ID -> row/column index}
+
+    Raises:
+        ValueError: If a wire refers to an unknown processor.
+    """
+    ids = [p["ID"] for p in model.get("processors", [])]
+    index = {pid: i for i, pid in enumerate(ids)}
+    wires = model.get("wires", [])
+    rows, _ = _processor_numbers(wires, index, "Source")
+    cols, _ = _processor_numbers(wires, index, "Destination")
+    matrix = sp.csr_matrix((np.ones(len(wires), dtype=dtype), (rows, cols)), shape=(len(ids), len(ids)))
+    return {"matrix": matrix, "ids": ids, "index": index}
+
+
+def port_adjacency(model, dtype=np.float64):
+    """
+    Exports the port-level wiring as a sparse terminal x port matrix.
+
+    Args:
+        model (dict): The model.
+        dtype: Data type of the matrix entries.
+
+    Returns:
+        dict: {"matrix": CSR matrix of wire counts, one row per terminal and one column per port,
+               "ids": processor IDs in model order,
+               "terminal_offsets": processor ID -> row of its first terminal,
+               "port_offsets": processor ID -> column of its first port}
+              The row of terminal i of processor p is terminal_offsets[p] + i, and likewise
+              for ports.
+
+    Raises:
+        ValueError: If a wire refers to a missing port or terminal.
+    """
+    processors = model.get("processors", [])
+    ids = [p["ID"] for p in processors]
+    index = {pid: i for i, pid in enumerate(ids)}
+    counts = {}
+    offsets = {}
+    for end, field in (("Source", "Terminals"), ("Destination", "Ports")):
+        counts[end] = np.fromiter((len(p.get(field, [])) for p in processors), dtype=np.int64, count=len(processors))
+        offsets[end] = np.concatenate(([0], np.cumsum(counts[end])))
+
+    wires = model.get("wires", [])
+    endpoints = {}
+    for end, kind in (("Source", "terminal"), ("Destination", "port")):
+        procs, local = _processor_numbers(wires, index, end)
+        bad = np.flatnonzero((local < 0) | (local >= counts[end][procs]))
+        if len(bad):
+            wire = wires[bad[0]]
+            raise ValueError(f"Wire '{wire['ID']}' refers to a missing {kind} {tuple(wire[end])}.")
+        endpoints[end] = offsets[end][procs] + local
+
+    shape = (int(offsets["Source"][-1]), int(offsets["Destination"][-1]))
+    matrix = sp.csr_matrix((np.ones(len(wires), dtype=dtype), (endpoints["Source"], endpoints["Destination"])),
+                           shape=shape)
+    return {
+        "matrix": matrix,
+        "ids": ids,
+        "terminal_offsets": dict(zip(ids, offsets["Source"][:-1].tolist())),
+        "port_offsets": dict(zip(ids, offsets["Destination"][:-1].tolist())),
+    }
+
+
+class _Adjacency(Mapping):
+    """
+    processor ID -> {neighbor ID: {wire ID: wire}}, built on access.
+
+    Args:
+        ids (list): Processor IDs in model order.
+        index (dict): processor ID -> position in ids.
+        wires (list): The model's wires.
+        order (np.ndarray): Wire indices grouped by processor (successors: by source).
+        starts (np.ndarray): order[starts[i]:starts[i + 1]] are the wires of processor i.
+        end (str): The neighbor end of those wires, "Destination" or "Source".
+    """
+
+    def __init__(self, ids, index, wires, order, starts, end):
+        self._ids = ids
+        self._index = index
+        self._wires = wires
+        self._order = order
+        self._starts = starts
+        self._end = end
+
+    def __getitem__(self, proc_id):
+        i = self._index[proc_id]
+        neighbors = {}
+        for w in self._order[self._starts[i]:self._starts[i + 1]].tolist():
+            wire = self._wires[w]
+            neighbors.setdefault(wire[self._end][0], {})[wire["ID"]] = wire
+        return neighbors
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def __len__(self):
+        return len(self._ids)
+
+
+def _grouped(numbers, count):
+    """
+    Groups wire indices by processor number, with a stable sort.
+
+    Returns:
+        tuple: (order, starts) as used by _Adjacency.
+    """
+    order = np.argsort(numbers, kind="stable")
+    starts = np.concatenate(([0], np.cumsum(np.bincount(numbers, minlength=count))))
+    return order, starts
+
+
+class ModelGraphView(nx.MultiDiGraph):
+    """
+    A read-only MultiDiGraph over a model (see graph_view). It is frozen like nx.freeze:
+    every method that would modify it raises networkx.NetworkXError.
+    """
+
+    frozen = True
+
+    def __init__(self, model):
+        # The storage dicts of nx.MultiDiGraph are replaced by views of the model. The
+        # only new data are the wire indices sorted by source and by destination.
+        processors = {p["ID"]: p for p in model.get("processors", [])}
+        ids = list(processors)
+        index = {pid: i for i, pid in enumerate(ids)}
+        wires = model.get("wires", [])
+        sources = np.fromiter((index.get(w["Source"][0], -1) for w in wires), dtype=np.int64, count=len(wires))
+        destinations = np.fromiter((index.get(w["Destination"][0], -1) for w in wires), dtype=np.int64,
+                                   count=len(wires))
+        known = np.flatnonzero((sources >= 0) & (destinations >= 0))
+        order, starts = _grouped(sources[known], len(ids))
+        successors = _Adjacency(ids, index, wires, known[order], starts, "Destination")
+        order, starts = _grouped(destinations[known], len(ids))
+        predecessors = _Adjacency(ids, index, wires, known[order], starts, "Source")
+
+        self.__networkx_cache__ = {}
+        self.graph = {}
+        self._node = processors
+        self._succ = self._adj = successors
+        self._pred = predecessors
+        self.model = model
+
+    def _frozen(self, *args, **kwargs):
+        raise nx.NetworkXError("Frozen graph can't be modified")
+
+    add_node = add_nodes_from = remove_node = remove_nodes_from = _frozen
+    add_edge = add_edges_from = add_weighted_edges_from = remove_edge = remove_edges_from = _frozen
+    update = clear = clear_edges = _frozen
+
+
+def graph_view(model):
+    """
+    Presents a model as a read-only networkx.MultiDiGraph without copying it.
+
+    Nodes are processor IDs, with the processor records as node attributes. Each wire is an
+    edge from its source processor to its destination processor, keyed by wire ID, with the
+    wire record as edge attributes. Wires to or from unknown processors are left out.
+    The view reflects the model as it was when the view was made.
+
+    Returns:
+        ModelGraphView: A frozen nx.MultiDiGraph usable with NetworkX algorithms.
+    """
+    return ModelGraphView(model)
+
+
+def synthetic_model(processors, ports_per_processor=2):
+    """
+    Builds a ring lattice model for benchmarks: processor i has `ports_per_processor` ports
+    fed by the terminal of processor i + 1, i + 2, ... (wrapping around).
+    """
+    k = ports_per_processor
+    return {
+        "processors": [{"ID": f"p{i}", "Parent": "S", "Name": "", "Ports": ["X"] * k, "Terminals": ["X"]}
+                       for i in range(processors)],
+        "wires": [{"ID": f"w{i}_{j}", "Parent": "X", "Name": "", "Source": [f"p{(i + j + 1) % processors}", 0],
+                   "Destination": [f"p{i}", j]} for i in range(processors) for j in range(k)],
+    }
+
+
+def benchmark_export(wires=1_000_000, ports_per_processor=2, copy=False):
+    """
+    Times every export on a synthetic model with the given number of wires.
+
+    Args:
+        wires (int): Number of wires.
+        ports_per_processor (int): Wires into each processor.
+        copy (bool): Also time building a networkx.MultiDiGraph edge by edge, for comparison.
+
+    Returns:
+        dict: Seconds per export ("processor_adjacency", "port_adjacency", "graph_view",
+              and "networkx_copy" if copy), with "wires" and the wires per second of the
+              slowest matrix export ("wires_per_second").
+    """
+    model = synthetic_model(max(1, wires // ports_per_processor), ports_per_processor)
+    timings = {"wires": len(model["wires"])}
+    for name, export in (("processor_adjacency", processor_adjacency), ("port_adjacency", port_adjacency),
+                         ("graph_view", graph_view)):
+        start = time.perf_counter()
+        export(model)
+        timings[name] = time.perf_counter() - start
+    if copy:
+        start = time.perf_counter()
+        graph = nx.MultiDiGraph()
+        graph.add_nodes_from((p["ID"], p) for p in model["processors"])
+        graph.add_edges_from((w["Source"][0], w["Destination"][0], w["ID"], w) for w in model["wires"])
+        timings["networkx_copy"] = time.perf_counter() - start
+    timings["wires_per_second"] = timings["wires"] / max(timings["processor_adjacency"], timings["port_adjacency"])
+    return timings
+
+
+# ----------------- TESTS -----------------
+
+import json
+
+
+def _control_loop():
+    """
+    Loads the closed control loop from the models directory.
+    """
+    with open("models/control_loop_model.json", "r") as file:
+        return json.load(file)
+
+
+def test_processor_and_port_matrices():
+    """
+    The control loop's matrices match its wires, with the ID maps.
+    """
+    model = _control_loop()
+    exported = processor_adjacency(model)
+    assert exported["ids"] == ["f", "g", "s"]
+    dense = exported["matrix"].toarray()
+    index = exported["index"]
+    assert dense[index["f"], index["f"]] == 1 and dense[index["f"], index["s"]] == 1
+    assert dense[index["g"], index["f"]] == 1 and dense[index["s"], index["g"]] == 1
+    assert dense.sum() == len(model["wires"])
+
+    exported = port_adjacency(model)
+    assert exported["matrix"].shape == (3, 4)
+    assert exported["port_offsets"] == {"f": 0, "g": 2, "s": 3}
+    row = exported["terminal_offsets"]["g"]
+    col = exported["port_offsets"]["f"] + 1
+    assert exported["matrix"][row, col] == 1 and exported["matrix"].nnz == 4
+
+    model["wires"].append({"ID": "bad", "Parent": "X", "Name": "", "Source": ["f", 3], "Destination": ["g", 0]})
+    try:
+        port_adjacency(model)
+    except ValueError as error:
+        assert "bad" in str(error)
+    else:
+        assert False, "Expected a ValueError"
+
+
+def test_graph_view_works_with_networkx():
+    """
+    The view answers like a copied MultiDiGraph, and NetworkX algorithms run on it.
+    """
+    model = synthetic_model(50, 3)
+    view = graph_view(model)
+    copy = nx.MultiDiGraph()
+    copy.add_nodes_from((p["ID"], p) for p in model["processors"])
+    copy.add_edges_from((w["Source"][0], w["Destination"][0], w["ID"], w) for w in model["wires"])
+
+    assert set(view.nodes) == set(copy.nodes) and view.number_of_edges() == copy.number_of_edges() == 150
+    assert sorted(view.edges(keys=True)) == sorted(copy.edges(keys=True))
+    assert view.nodes["p3"] is model["processors"][3]
+    assert view["p4"]["p3"]["w3_0"] is model["wires"][9]
+    assert dict(view.in_degree()) == dict(copy.in_degree())
+    assert nx.pagerank(view) == nx.pagerank(copy)
+    assert nx.number_strongly_connected_components(view) == 1
+    assert (nx.to_scipy_sparse_array(view, nodelist=[f"p{i}" for i in range(50)]).toarray()
+            == processor_adjacency(model)["matrix"].toarray()).all()
+    try:
+        view.add_edge("p0", "p1")
+    except nx.NetworkXError:
+        pass
+    else:
+        assert False, "The view should be read-only"
+
+
+def test_conversion_is_linear():
+    """
+    Doubling the model roughly doubles the export time.
+    """
+    small = benchmark_export(100_000)
+    large = benchmark_export(200_000, copy=True)
+    for name in ("processor_adjacency", "port_adjacency", "graph_view"):
+        assert large[name] < 4 * small[name], f"{name}: {small[name]:.3f}s -> {large[name]:.3f}s"
+    assert large["graph_view"] < large["networkx_copy"]
+
+
+if __name__ == "__main__":
+    test_processor_and_port_matrices()
+    test_graph_view_works_with_networkx()
+    test_conversion_is_linear()
+    print("✅ All export tests passed!")
+    print(benchmark_export(copy=True))
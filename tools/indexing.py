@@ -0,0 +1,314 @@
+# Lookup tables over a block diagram model.
+# Most of the checks in validations.py scan model["processors"] and model["wires"]
+# from the top every time. For big models we build these tables once and reuse them.
+
+from collections import Counter
+
+def processor_signature(proc):
+    """
+    Returns the (Parent, port signature, terminal signature) key of a processor.
+    """
+    return (proc.get("Parent"), tuple(proc.get("Ports", [])), tuple(proc.get("Terminals", [])))
+
+
+def build_model_index(model):
+    """
+    Builds lookup tables for a block diagram model in a single pass over its
+    processors and wires.
+
+    Args:
+        model (dict): The block diagram model.
+
+    Returns:
+        dict: The index, with keys:
+            "model": the indexed model itself.
+            "processors": processor_id -> processor record.
+            "positions": processor_id -> position in model["processors"].
+            "by_parent": Parent -> list of processor IDs.
+            "by_signature": (Parent, Ports, Terminals) -> list of processor IDs.
+            "wires_by_space": space -> list of wires.
+            "outgoing": processor_id -> list of wires leaving it.
+            "incoming": processor_id -> list of wires entering it.
+            "from_terminal": (processor_id, terminal_index) -> list of wires.
+            "into_port": (processor_id, port_index) -> list of wires.
+    """
+    processors = {}
+    positions = {}
+    by_parent = {}
+    by_signature = {}
+    for proc in model.get("processors", []):
+        proc_id = proc["ID"]
+        processors[proc_id] = proc
+        positions[proc_id] = len(positions)
+        by_parent.setdefault(proc.get("Parent"), []).append(proc_id)
+        by_signature.setdefault(processor_signature(proc), []).append(proc_id)
+
+    wires_by_space = {}
+    outgoing = {}
+    incoming = {}
+    from_terminal = {}
+    into_port = {}
+    for wire in model.get("wires", []):
+        src_proc, src_idx = wire["Source"]
+        dst_proc, dst_idx = wire["Destination"]
+        wires_by_space.setdefault(wire.get("Parent"), []).append(wire)
+        outgoing.setdefault(src_proc, []).append(wire)
+        incoming.setdefault(dst_proc, []).append(wire)
+        from_terminal.setdefault((src_proc, src_idx), []).append(wire)
+        into_port.setdefault((dst_proc, dst_idx), []).append(wire)
+
+    return {
+        "model": model,
+        "processors": processors,
+        "positions": positions,
+        "by_parent": by_parent,
+        "by_signature": by_signature,
+        "wires_by_space": wires_by_space,
+        "outgoing": outgoing,
+        "incoming": incoming,
+        "from_terminal": from_terminal,
+        "into_port": into_port,
+    }
+
+
+def _subset_connections(index, subset):
+    """
+    Splits the wires touching a processor subset into internal and crossing wires.
+
+    Returns:
+        tuple: (internal_in, internal_out, crossing_in, crossing_out) where internal_in and
+               internal_out map processor IDs to the wires entering/leaving them from/to
+               inside the subset.
+    """
+    internal_in = {}
+    internal_out = {}
+    crossing_in = []
+    crossing_out = []
+    for proc_id in subset:
+        for wire in index["incoming"].get(proc_id, []):
+            if wire["Source"][0] in subset:
+                internal_in.setdefault(proc_id, []).append(wire)
+            else:
+                crossing_in.append(wire)
+        for wire in index["outgoing"].get(proc_id, []):
+            if wire["Destination"][0] in subset:
+                internal_out.setdefault(proc_id, []).append(wire)
+            else:
+                crossing_out.append(wire)
+    return internal_in, internal_out, crossing_in, crossing_out
+
+
+def get_cut_wires(index, subset):
+    """
+    Returns the wires crossing the boundary of a processor subset.
+
+    Args:
+        index (dict): A model index (see build_model_index).
+        subset (iterable): Processor IDs on the inside of the cut.
+
+    Returns:
+        dict: {"incoming": wires entering the subset, "outgoing": wires leaving it}
+    """
+    subset = set(subset)
+    _, _, crossing_in, crossing_out = _subset_connections(index, subset)
+    return {"incoming": crossing_in, "outgoing": crossing_out}
+
+
+def get_subset_ports_and_terminals(index, subset, only_open_terminals=False, output_style="basic"):
+    """
+    Same as get_ports_and_terminals, but for the sub-model made of a processor subset and
+    the wires between its processors. Wires crossing the cut are treated as absent, so cut
+    ports become open and cut terminals become available.
+
+    Only the subset and the wires touching it are visited, so the cost does not depend on
+    the size of the rest of the model.
+
+    Args:
+        index (dict): A model index (see build_model_index).
+        subset (iterable): Processor IDs making up the candidate subsystem.
+
+    Keyword Args:
+        only_open_terminals (bool): (For basic output) If True, only include terminals
+                                    that are not used as a source by a wire inside the subset.
+        output_style (str): Either "basic" or "effective", as in get_ports_and_terminals.
+
+    Raises:
+        ValueError: If an invalid output_style is provided.
+    """
+    if output_style not in ("basic", "effective"):
+        raise ValueError("Invalid output_style. Use 'basic' or 'effective'.")
+    # Keep the model's processor order so results line up with get_ports_and_terminals.
+    subset = set(subset)
+    procs = [index["processors"][proc_id] for proc_id in dict.fromkeys(subset)
+             if proc_id in index["processors"]]
+    procs.sort(key=lambda proc: index["positions"][proc["ID"]])
+    internal_in, internal_out, _, _ = _subset_connections(index, subset)
+
+    if output_style == "basic":
+        open_ports = []
+        available_terminals = []
+        for proc in procs:
+            proc_id = proc["ID"]
+            wired = {wire["Destination"][1] for wire in internal_in.get(proc_id, [])}
+            for i, port in enumerate(proc.get("Ports", [])):
+                if i not in wired:
+                    open_ports.append((proc_id, port))
+            used_spaces = {wire["Parent"] for wire in internal_out.get(proc_id, [])}
+            for term in proc.get("Terminals", []):
+                if not only_open_terminals or term not in used_spaces:
+                    available_terminals.append((proc_id, term))
+        return {"open_ports": open_ports, "available_terminals": available_terminals}
+
+    # --- EFFECTIVE VIEW (same heuristic as get_ports_and_terminals) ---
+    internally_generated = {term for proc in procs for term in proc.get("Terminals", [])}
+    effective_inputs = []
+    effective_outputs = []
+    for proc in procs:
+        proc_id = proc["ID"]
+        out_conns = internal_out.get(proc_id, [])
+        if not out_conns:
+            wired = {wire["Destination"][1] for wire in internal_in.get(proc_id, [])}
+            for i, port in enumerate(proc.get("Ports", [])):
+                if i not in wired and port not in internally_generated:
+                    effective_inputs.append(port)
+        driven = {wire["Parent"] for wire in out_conns if wire["Destination"][0] != proc_id}
+        for term in proc.get("Terminals", []):
+            if term not in driven:
+                effective_outputs.append(term)
+    return (list(dict.fromkeys(effective_inputs)), list(dict.fromkeys(effective_outputs)))
+
+
+def subset_satisfies_block(index, subset, block, output_style="effective", require_open_terminals=False):
+    """
+    Checks whether a processor subset, cut out of the indexed model, satisfies a Block.
+    Mirrors validate_model_satisfies_block ("effective") and model_satisfies_block ("basic"),
+    without the debugging output, so it can be called for thousands of candidate subsets.
+
+    Args:
+        index (dict): A model index (see build_model_index).
+        subset (iterable): Processor IDs making up the candidate subsystem.
+        block (dict): The Block definition (with keys "ID", "Domain", "Codomain").
+        output_style (str): "effective" or "basic".
+        require_open_terminals (bool): (Basic style) Only count terminals unused inside the subset.
+
+    Returns:
+        bool: True if the subset satisfies the Block requirements, False otherwise.
+    """
+    subset = set(subset)
+    if len(subset) == 1:
+        proc = index["processors"].get(next(iter(subset)))
+        if proc is not None and proc.get("Parent") == block.get("ID"):
+            return True
+
+    if output_style == "effective":
+        model_inputs, model_outputs = get_subset_ports_and_terminals(index, subset, output_style="effective")
+    else:
+        status = get_subset_ports_and_terminals(index, subset, only_open_terminals=require_open_terminals,
+                                                output_style=output_style)
+        model_inputs = [port for (_, port) in status["open_ports"]]
+        model_outputs = [terminal for (_, terminal) in status["available_terminals"]]
+
+    missing_inputs = Counter(block.get("Domain", [])) - Counter(model_inputs)
+    missing_outputs = Counter(block.get("Codomain", [])) - Counter(model_outputs)
+    return not missing_inputs and not missing_outputs
+
+
+# ----------------- TESTS -----------------
+
+import json
+
+from tools.validations import get_ports_and_terminals
+
+
+def test_build_model_index():
+    """
+    Tests the lookup tables built for the closed control loop.
+    """
+    model = {
+        "processors": [
+            {"ID": "f", "Parent": "F", "Name": "Plant", "Ports": ["X", "U"], "Terminals": ["X"]},
+            {"ID": "g", "Parent": "G", "Name": "Controller", "Ports": ["Y"], "Terminals": ["U"]},
+            {"ID": "s", "Parent": "S", "Name": "Sensor", "Ports": ["X"], "Terminals": ["Y"]}
+        ],
+        "wires": [
+            {"ID": "wrefX1", "Parent": "X", "Source": ["f", 0], "Destination": ["f", 0]},
+            {"ID": "wrefU1", "Parent": "U", "Source": ["g", 0], "Destination": ["f", 1]},
+            {"ID": "wrefY1", "Parent": "Y", "Source": ["s", 0], "Destination": ["g", 0]},
+            {"ID": "wrefXSense", "Parent": "X", "Source": ["f", 0], "Destination": ["s", 0]}
+        ]
+    }
+    index = build_model_index(model)
+    assert index["by_parent"] == {"F": ["f"], "G": ["g"], "S": ["s"]}
+    assert index["by_signature"][("S", ("X",), ("Y",))] == ["s"]
+    assert [w["ID"] for w in index["wires_by_space"]["X"]] == ["wrefX1", "wrefXSense"]
+    assert [w["ID"] for w in index["from_terminal"][("f", 0)]] == ["wrefX1", "wrefXSense"]
+    assert [w["ID"] for w in index["into_port"][("f", 1)]] == ["wrefU1"]
+    assert [w["ID"] for w in index["incoming"]["g"]] == ["wrefY1"]
+    assert [w["ID"] for w in index["outgoing"]["f"]] == ["wrefX1", "wrefXSense"]
+
+
+def _learning_game():
+    """
+    Loads the two-player learning game from the models directory.
+    """
+    with open("models/dynamic_game_with_learning.json", "r") as file:
+        return json.load(file)
+
+
+def test_subset_matches_submodel():
+    """
+    The subset interface should agree with get_ports_and_terminals run on the carved-out sub-model.
+    """
+    model = _learning_game()
+    index = build_model_index(model)
+    subsets = [
+        {"alice_learner", "alice_decision"},
+        {"alice_dynamics", "alice_sensor", "alice_learner", "alice_decision"},
+        {"alice_dynamics", "bob_dynamics", "state_aggregator"},
+        {p["ID"] for p in model["processors"]},
+    ]
+    for subset in subsets:
+        submodel = {
+            "processors": [p for p in model["processors"] if p["ID"] in subset],
+            "wires": [w for w in model["wires"] if w["Source"][0] in subset and w["Destination"][0] in subset],
+        }
+        for only_open in (False, True):
+            assert get_subset_ports_and_terminals(index, subset, only_open_terminals=only_open) == \
+                get_ports_and_terminals(submodel, only_open_terminals=only_open)
+        assert get_subset_ports_and_terminals(index, subset, output_style="effective") == \
+            get_ports_and_terminals(submodel, output_style="effective")
+
+
+def test_cut_wires():
+    """
+    The Theta wire stays inside a learner/decision pair; everything else crosses the cut.
+    """
+    index = build_model_index(_learning_game())
+    cut = get_cut_wires(index, ["alice_learner", "alice_decision"])
+    assert "w_alice_theta" not in [w["ID"] for w in cut["incoming"] + cut["outgoing"]]
+    assert all(w["Destination"][0] in ("alice_learner", "alice_decision") for w in cut["incoming"])
+    assert all(w["Source"][0] in ("alice_learner", "alice_decision") for w in cut["outgoing"])
+
+
+def test_subset_satisfies_block():
+    """
+    A single Learner processor directly implements the Learner block. A learner/decision
+    pair only needs the realized payoff from outside and exposes Theta, U and Y.
+    """
+    index = build_model_index(_learning_game())
+    learner = {"ID": "Learner", "Domain": ["U", "Y", "Y"], "Codomain": ["Theta"]}
+    decision = {"ID": "Decision", "Domain": ["Theta"], "Codomain": ["U", "Y"]}
+    assert subset_satisfies_block(index, ["alice_learner"], learner)
+    assert not subset_satisfies_block(index, ["alice_decision"], learner)
+    pair = ["alice_learner", "alice_decision"]
+    assert subset_satisfies_block(index, pair, {"ID": "pair", "Domain": ["Y"], "Codomain": ["U", "Y"]},
+                                  output_style="basic")
+    assert not subset_satisfies_block(index, pair, decision, output_style="basic")
+
+
+if __name__ == "__main__":
+    test_build_model_index()
+    test_subset_matches_submodel()
+    test_cut_wires()
+    test_subset_satisfies_block()
+    print("✅ All indexing tests passed!")
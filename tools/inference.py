@@ -0,0 +1,190 @@
+# Wire type inference.
+# A wire's space is fixed by the terminal it leaves and the port it enters, so we do not
+# need to trust the wire's own Parent. Every wire joins its source terminal and its
+# destination port into one group (union-find); wires sharing a terminal end up in the
+# same group. A group whose endpoints declare more than one space is a conflict, and
+# all conflicting groups are reported together instead of stopping at the first one.
+
+
+def _find(parent, i):
+    """
+    Returns the representative of i, halving the path on the way.
+    """
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def infer_wire_types(model, in_place=False):
+    """
+    Infers the space of every wire from its endpoints in a single sweep.
+
+    Args:
+        model (dict): The block diagram model.
+        in_place (bool): If True, set the Parent of every wire that was resolved without
+                         conflict to its inferred space.
+
+    Returns:
+        dict: A report with keys:
+            "assigned": wire_id -> inferred space, for every resolved wire.
+            "changed": IDs of resolved wires whose Parent differs from the inferred space.
+            "conflicts": one entry per conflicting group, each a dict with
+                "wires": IDs of the wires in the group, and
+                "spaces": space -> list of endpoints declaring it, where an endpoint is
+                          ("terminal" or "port", processor_id, index).
+            "unresolved": IDs of wires whose endpoints declare no space
+                          (e.g. unknown processors or out-of-range indices).
+    """
+    processors = {p["ID"]: p for p in model.get("processors", [])}
+    wires = model.get("wires", [])
+
+    # Number the endpoints: terminals and ports get distinct keys.
+    node_ids = {}
+    node_keys = []
+    parent = []
+    size = []
+    wire_nodes = []
+    for wire in wires:
+        src = ("terminal", wire["Source"][0], wire["Source"][1])
+        dst = ("port", wire["Destination"][0], wire["Destination"][1])
+        ends = []
+        for key in (src, dst):
+            node = node_ids.get(key)
+            if node is None:
+                node = node_ids[key] = len(node_keys)
+                node_keys.append(key)
+                parent.append(node)
+                size.append(1)
+            ends.append(node)
+        wire_nodes.append(ends[0])
+        # Union by size.
+        a, b = _find(parent, ends[0]), _find(parent, ends[1])
+        if a != b:
+            if size[a] < size[b]:
+                a, b = b, a
+            parent[b] = a
+            size[a] += size[b]
+
+    # Collect the spaces declared by the endpoints of each group.
+    declared = {}
+    for node, (kind, proc_id, idx) in enumerate(node_keys):
+        proc = processors.get(proc_id)
+        if proc is None:
+            continue
+        spaces = proc.get("Terminals" if kind == "terminal" else "Ports", [])
+        if isinstance(idx, int) and 0 <= idx < len(spaces):
+            group = declared.setdefault(_find(parent, node), {})
+            group.setdefault(spaces[idx], []).append((kind, proc_id, idx))
+
+    assigned = {}
+    changed = []
+    unresolved = []
+    conflict_wires = {}
+    for wire, node in zip(wires, wire_nodes):
+        root = _find(parent, node)
+        spaces = declared.get(root)
+        if not spaces:
+            unresolved.append(wire["ID"])
+        elif len(spaces) > 1:
+            conflict_wires.setdefault(root, []).append(wire["ID"])
+        else:
+            space = next(iter(spaces))
+            assigned[wire["ID"]] = space
+            if wire.get("Parent") != space:
+                changed.append(wire["ID"])
+                if in_place:
+                    wire["Parent"] = space
+
+    conflicts = [{"wires": ids, "spaces": declared[root]} for root, ids in conflict_wires.items()]
+    return {"assigned": assigned, "changed": changed, "conflicts": conflicts, "unresolved": unresolved}
+
+
+# ----------------- TESTS -----------------
+
+import io
+import time
+from contextlib import redirect_stdout
+
+from tools.validations import are_wires_typed_correctly
+
+
+def test_infer_wire_types_fills_parents():
+    """
+    Wires with missing or wrong Parents get the space of their endpoints.
+    """
+    model = {
+        "processors": [
+            {"ID": "f", "Parent": "F", "Ports": ["X", "U"], "Terminals": ["X"]},
+            {"ID": "g", "Parent": "G", "Ports": ["Y"], "Terminals": ["U"]},
+            {"ID": "s", "Parent": "S", "Ports": ["X"], "Terminals": ["Y"]}
+        ],
+        "wires": [
+            {"ID": "wrefX1", "Parent": "", "Source": ["f", 0], "Destination": ["f", 0]},
+            {"ID": "wrefU1", "Parent": "Y", "Source": ["g", 0], "Destination": ["f", 1]},
+            {"ID": "wrefY1", "Parent": "Y", "Source": ["s", 0], "Destination": ["g", 0]},
+            {"ID": "wrefXSense", "Source": ["f", 0], "Destination": ["s", 0]}
+        ]
+    }
+    report = infer_wire_types(model)
+    assert report["assigned"] == {"wrefX1": "X", "wrefU1": "U", "wrefY1": "Y", "wrefXSense": "X"}
+    assert report["changed"] == ["wrefX1", "wrefU1", "wrefXSense"]
+    assert report["conflicts"] == [] and report["unresolved"] == []
+    assert "Parent" not in model["wires"][3]
+
+    infer_wire_types(model, in_place=True)
+    with redirect_stdout(io.StringIO()):
+        assert are_wires_typed_correctly(model)
+
+
+def test_infer_wire_types_reports_all_conflicts():
+    """
+    Two independent mismatches are both reported, and a terminal fanning out to a bad
+    port drags its other wires into the same conflict.
+    """
+    model = {
+        "processors": [
+            {"ID": "f", "Parent": "F", "Ports": ["X", "U"], "Terminals": ["X"]},
+            {"ID": "s", "Parent": "S", "Ports": ["X"], "Terminals": ["Y"]},
+            {"ID": "g", "Parent": "G", "Ports": ["Y"], "Terminals": ["U"]}
+        ],
+        "wires": [
+            {"ID": "w1", "Parent": "X", "Source": ["f", 0], "Destination": ["s", 0]},
+            {"ID": "w2", "Parent": "X", "Source": ["f", 0], "Destination": ["f", 1]},
+            {"ID": "w3", "Parent": "Y", "Source": ["s", 0], "Destination": ["f", 0]},
+            {"ID": "w4", "Parent": "U", "Source": ["g", 0], "Destination": ["ghost", 0]},
+            {"ID": "w5", "Parent": "Y", "Source": ["ghost", 0], "Destination": ["nowhere", 2]}
+        ]
+    }
+    report = infer_wire_types(model, in_place=True)
+    conflicts = sorted(report["conflicts"], key=lambda c: c["wires"])
+    assert [c["wires"] for c in conflicts] == [["w1", "w2"], ["w3"]]
+    assert conflicts[0]["spaces"] == {"X": [("terminal", "f", 0), ("port", "s", 0)], "U": [("port", "f", 1)]}
+    assert report["assigned"] == {"w4": "U"}
+    assert report["unresolved"] == ["w5"]
+    # Conflicting wires are left untouched.
+    assert model["wires"][1]["Parent"] == "X"
+
+
+def test_infer_wire_types_large():
+    """
+    A large model is handled in one linear sweep.
+    """
+    processors = []
+    wires = []
+    for i in range(100000):
+        processors.append({"ID": f"f{i}", "Parent": "F", "Ports": ["X", "U"], "Terminals": ["X"]})
+        wires.append({"ID": f"w{i}", "Parent": "", "Source": [f"f{i}", 0], "Destination": [f"f{(i + 1) % 100000}", 0]})
+    model = {"processors": processors, "wires": wires}
+    start = time.perf_counter()
+    report = infer_wire_types(model)
+    elapsed = time.perf_counter() - start
+    assert len(report["assigned"]) == 100000 and not report["conflicts"]
+    assert elapsed < 5.0, f"Type inference took {elapsed:.2f}s"
+
+
+if __name__ == "__main__":
+    test_infer_wire_types_fills_parents()
+    test_infer_wire_types_reports_all_conflicts()
+    test_infer_wire_types_large()
+    print("✅ All wire type inference tests passed!")
@@ -0,0 +1,510 @@
+# Compiling the linear part of a model into one sparse state-space system.
+# A processor is linear when it carries a "Linear" annotation with its discrete-time
+# matrices (all optional, missing ones are zero):
+#     x[k+1] = A x[k] + B u[k]
+#     y[k]   = C x[k] + D u[k]
+# where u stacks the processor's ports and y its terminals, in order. Each port and terminal
+# has dimension 1 unless "PortDims" / "TerminalDims" say otherwise. As in algebraic.py,
+# wires that declare "Delay" carry the value of the previous step and become states of
+# the composite system; every other wire is instantaneous, and instantaneous loops are
+# resolved exactly by a sparse solve.
+#
+# The composite system has the state z = [x of every linear processor; delayed wires],
+# the inputs v = every port of a linear processor not fed by another linear processor,
+# and the outputs y = every terminal of a linear processor. It is kept in implicit form:
+#     (I - D W) y[k] = Cz z[k] + Dv v[k]
+#     z[k+1]        = Az z[k] + Ay y[k] + Bv v[k]
+# where every matrix is a sparse product of the processors' blocks and the wiring, and
+# I - D W (the instantaneous coupling) is factorized once with a sparse LU. Eliminating y
+# would give the explicit z[k+1] = A z[k] + B v[k], y[k] = C z[k] + D v[k], but C = (I - D W)^-1 Cz
+# is dense as soon as instantaneous wires chain processors together, so the explicit
+# matrices are only built on request.
+
+import warnings
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.linalg import spsolve, splu, MatrixRankWarning
+
+
+def _annotation(proc, annotations):
+    """
+    Looks up the linear annotation of a processor: on the processor itself, then in
+    `annotations` by processor ID, then by Parent block.
+    """
+    if "Linear" in proc:
+        return proc["Linear"]
+    return annotations.get(proc["ID"], annotations.get(proc.get("Parent")))
+
+
+def _dims(proc, linear):
+    """
+    Returns (state dimension, port dimensions, terminal dimensions) of a linear processor.
+
+    Raises:
+        ValueError: If a matrix does not match the dimensions.
+    """
+    port_dims = list(linear.get("PortDims", [1] * len(proc.get("Ports", []))))
+    terminal_dims = list(linear.get("TerminalDims", [1] * len(proc.get("Terminals", []))))
+    if len(port_dims) != len(proc.get("Ports", [])) or len(terminal_dims) != len(proc.get("Terminals", [])):
+        raise ValueError(f"Processor '{proc['ID']}' has PortDims/TerminalDims of the wrong length.")
+    if linear.get("A") is not None:
+        n = len(linear["A"])
+    elif linear.get("B") is not None:
+        n = len(linear["B"])
+    elif linear.get("C") is not None and len(linear["C"]):
+        n = len(linear["C"][0])
+    else:
+        n = 0
+    m, p = sum(port_dims), sum(terminal_dims)
+    for key, shape in (("A", (n, n)), ("B", (n, m)), ("C", (p, n)), ("D", (p, m))):
+        matrix = linear.get(key)
+        if matrix is not None and (len(matrix) != shape[0] or any(len(row) != shape[1] for row in matrix)):
+            raise ValueError(f"Matrix {key} of processor '{proc['ID']}' should be {shape[0]}x{shape[1]}.")
+    return n, port_dims, terminal_dims
+
+
+def _place(entries, matrix, row, col):
+    """
+    Adds the nonzeros of a dense matrix (list of lists) to COO entries at an offset.
+    """
+    for i, matrix_row in enumerate(matrix or []):
+        for j, value in enumerate(matrix_row):
+            if value:
+                entries[0].append(row + i)
+                entries[1].append(col + j)
+                entries[2].append(float(value))
+
+
+def _identity(entries, rows, cols):
+    """
+    Adds a block identity to COO entries, from the row slice to the column slice.
+    """
+    for i, j in zip(range(rows.start, rows.stop), range(cols.start, cols.stop)):
+        entries[0].append(i)
+        entries[1].append(j)
+        entries[2].append(1.0)
+
+
+def _coo(entries, shape):
+    """
+    Builds a CSR matrix from COO entries.
+    """
+    return sp.coo_matrix((entries[2], (entries[0], entries[1])), shape=shape).tocsr()
+
+
+def assemble_linear_system(model, annotations=None, explicit=False):
+    """
+    Assembles the composite sparse state-space system of the linear processors of a model.
+
+    Processors without a linear annotation are left out: their terminals feeding linear
+    processors become inputs of the composite system.
+
+    Args:
+        model (dict): The block diagram model.
+        annotations (dict): processor ID (or Parent block ID) -> linear annotation, for
+                            processors that do not carry a "Linear" key.
+        explicit (bool): Also build the explicit "A", "B", "C", "D". Their nonzeros can grow
+                         quadratically with chains of instantaneous wires.
+
+    Returns:
+        dict: {"Az", "Ay", "Bv", "Cz", "Dv": CSR matrices of the implicit form (see above),
+               "coupling": I - D W as a CSC matrix, or None when no instantaneous wire joins
+                           two linear processors (then y = Cz z + Dv v),
+               "factor": the splu factorization of "coupling" (or None),
+               "A", "B", "C", "D": CSR matrices of the explicit form, if explicit,
+               "layout": {"states": processor ID -> slice of z,
+                          "delays": delayed wire ID -> slice of z,
+                          "inputs": (processor_id, port_index) -> slice of v,
+                          "outputs": (processor_id, terminal_index) -> slice of y,
+                          "wires": wire ID -> slice of y (wires leaving a linear processor),
+                          "sizes": {"z", "v", "y"}}}
+
+    Raises:
+        ValueError: If dimensions do not match, or an instantaneous loop is singular.
+    """
+    annotations = annotations or {}
+    linear = {}
+    for proc in model.get("processors", []):
+        annotation = _annotation(proc, annotations)
+        if annotation is not None:
+            linear[proc["ID"]] = (proc, annotation)
+
+    # Offsets of every processor's states, ports and terminals.
+    states, ports, outputs = {}, {}, {}
+    nx = nu = ny = 0
+    a_entries, b_entries, c_entries, d_entries = ([], [], []), ([], [], []), ([], [], []), ([], [], [])
+    for proc_id, (proc, annotation) in linear.items():
+        n, port_dims, terminal_dims = _dims(proc, annotation)
+        states[proc_id] = slice(nx, nx + n)
+        u0, y0 = nu, ny
+        for i, dim in enumerate(port_dims):
+            ports[(proc_id, i)] = slice(nu, nu + dim)
+            nu += dim
+        for i, dim in enumerate(terminal_dims):
+            outputs[(proc_id, i)] = slice(ny, ny + dim)
+            ny += dim
+        _place(a_entries, annotation.get("A"), nx, nx)
+        _place(b_entries, annotation.get("B"), nx, u0)
+        _place(c_entries, annotation.get("C"), y0, nx)
+        _place(d_entries, annotation.get("D"), y0, u0)
+        nx += n
+
+    # Port connections: instantaneous wires (W), delayed wires (Wd) and inputs (E).
+    port_wires = {}
+    for wire in model.get("wires", []):
+        port_wires.setdefault(tuple(wire["Destination"]), wire)
+    delays, inputs, wires = {}, {}, {}
+    nd = nv = 0
+    w_entries, wd_entries, e_entries, s_entries = ([], [], []), ([], [], []), ([], [], []), ([], [], [])
+    for wire in model.get("wires", []):
+        src = tuple(wire["Source"])
+        if src in outputs:
+            wires[wire["ID"]] = outputs[src]
+    for port_key, port in ports.items():
+        wire = port_wires.get(port_key)
+        src = tuple(wire["Source"]) if wire is not None else None
+        if src not in outputs:
+            inputs[port_key] = slice(nv, nv + port.stop - port.start)
+            _identity(e_entries, port, inputs[port_key])
+            nv += port.stop - port.start
+            continue
+        if outputs[src].stop - outputs[src].start != port.stop - port.start:
+            raise ValueError(f"Wire '{wire['ID']}' connects a terminal and a port of different dimensions.")
+        if wire.get("Delay"):
+            if wire["ID"] not in delays:
+                delays[wire["ID"]] = slice(nx + nd, nx + nd + port.stop - port.start)
+                _identity(s_entries, delays[wire["ID"]], outputs[src])
+                nd += port.stop - port.start
+            _identity(wd_entries, port, delays[wire["ID"]])
+        else:
+            _identity(w_entries, port, outputs[src])
+
+    nz = nx + nd
+    a_blk = _coo(a_entries, (nz, nz))
+    b_blk = _coo(b_entries, (nz, nu))       # rows of the delayed wires stay empty
+    c_blk = _coo(c_entries, (ny, nz))
+    d_blk = _coo(d_entries, (ny, nu))
+    w = _coo(w_entries, (nu, ny))
+    wd = _coo(wd_entries, (nu, nz))
+    e = _coo(e_entries, (nu, nv))
+    s = _coo(s_entries, (nz, ny))
+
+    # y = C z + D (W y + Wd z + E v)  ->  (I - D W) y = (C + D Wd) z + D E v
+    # z+ = A z + B (W y + Wd z + E v) + S y
+    system = {
+        "Az": (a_blk + b_blk @ wd).tocsr(),
+        "Ay": (b_blk @ w + s).tocsr(),
+        "Bv": (b_blk @ e).tocsr(),
+        "Cz": (c_blk + d_blk @ wd).tocsr(),
+        "Dv": (d_blk @ e).tocsr(),
+        "coupling": None,
+        "factor": None,
+    }
+    for matrix in system.values():
+        if matrix is not None:
+            matrix.eliminate_zeros()
+    dw = (d_blk @ w).tocsr()
+    dw.eliminate_zeros()
+    if dw.nnz:
+        system["coupling"] = (sp.identity(ny, format="csc") - dw).tocsc()
+        try:
+            system["factor"] = splu(system["coupling"])
+        except RuntimeError:
+            raise ValueError("The instantaneous loops of the linear processors have no unique solution.")
+
+    if explicit:
+        c_sys, d_sys = system["Cz"], system["Dv"]
+        if system["factor"] is not None:
+            c_sys = sp.csr_matrix(system["factor"].solve(c_sys.toarray()))
+            d_sys = sp.csr_matrix(system["factor"].solve(d_sys.toarray()))
+        system["A"] = (system["Az"] + system["Ay"] @ c_sys).tocsr()
+        system["B"] = (system["Bv"] + system["Ay"] @ d_sys).tocsr()
+        system["C"], system["D"] = c_sys, d_sys
+        for key in "ABCD":
+            system[key].eliminate_zeros()
+
+    layout = {"states": states, "delays": delays, "inputs": inputs, "outputs": outputs, "wires": wires,
+              "sizes": {"z": nz, "v": nv, "y": ny}}
+    system["layout"] = layout
+    return system
+
+
+def input_vector(system, inputs=None):
+    """
+    Converts an inputs dict ((processor_id, port_index) -> value or vector) into v.
+    Missing inputs are zero.
+    """
+    v = np.zeros(system["layout"]["sizes"]["v"])
+    for port_key, value in (inputs or {}).items():
+        if port_key in system["layout"]["inputs"]:
+            v[system["layout"]["inputs"][port_key]] = value
+    return v
+
+
+def state_vector(system, state=None):
+    """
+    Converts a state dict (delayed wire ID -> value or vector) into z. Processor states start at zero.
+    """
+    z = np.zeros(system["layout"]["sizes"]["z"])
+    for wire_id, value in (state or {}).items():
+        if wire_id in system["layout"]["delays"]:
+            z[system["layout"]["delays"][wire_id]] = value
+    return z
+
+
+def wire_values(system, y):
+    """
+    Reads the value of every wire leaving a linear processor from an output vector
+    (floats for wires of dimension 1, arrays otherwise).
+    """
+    values = {}
+    for wire_id, rows in system["layout"]["wires"].items():
+        values[wire_id] = float(y[rows.start]) if rows.stop - rows.start == 1 else y[rows]
+    return values
+
+
+def output_vector(system, z, v):
+    """
+    Computes the outputs y of one step from the state z and the inputs v, solving the
+    instantaneous coupling with its factorization.
+    """
+    rhs = system["Cz"] @ z + system["Dv"] @ v
+    return rhs if system["factor"] is None else system["factor"].solve(rhs)
+
+
+def steady_state(system, v=None):
+    """
+    Finds the equilibrium of the composite system for constant inputs: z = A z + B v.
+
+    Args:
+        system (dict): An assemble_linear_system result.
+        v (array): Input vector (zeros if None).
+
+    Returns:
+        tuple: (z, y) at equilibrium.
+
+    Raises:
+        ValueError: If the system has no unique equilibrium (an eigenvalue at 1, such as an integrator).
+    """
+    sizes = system["layout"]["sizes"]
+    v = np.zeros(sizes["v"]) if v is None else np.asarray(v, dtype=float)
+    nz, ny = sizes["z"], sizes["y"]
+    if nz == 0:
+        return np.zeros(0), output_vector(system, np.zeros(0), v)
+    # z = Az z + Ay y + Bv v and (I - D W) y = Cz z + Dv v, solved together.
+    coupling = system["coupling"] if system["coupling"] is not None else sp.identity(ny, format="csc")
+    if ny == 0:
+        matrix = sp.identity(nz, format="csc") - system["Az"]
+    else:
+        matrix = sp.bmat([[sp.identity(nz) - system["Az"], -system["Ay"]],
+                          [-system["Cz"], coupling]])
+    rhs = np.concatenate([system["Bv"] @ v, system["Dv"] @ v])
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", MatrixRankWarning)
+        try:
+            solution = np.atleast_1d(spsolve(matrix.tocsc(), rhs))
+        except (MatrixRankWarning, RuntimeError):
+            raise ValueError("The linear system has no unique steady state.")
+    return solution[:nz], solution[nz:]
+
+
+def propagate(system, steps, z0=None, inputs=None, record=True):
+    """
+    Runs the composite system for several steps with sparse matrix-vector products and
+    one solve with the factorized coupling per step.
+
+    Args:
+        system (dict): An assemble_linear_system result.
+        steps (int): Number of steps.
+        z0 (array): Initial state (zeros if None).
+        inputs: None (zero inputs), an input vector held constant, or an array with one row per step.
+        record (bool): Keep the outputs of every step.
+
+    Returns:
+        dict: {"state": z after the last step,
+               "outputs": array of shape (steps, size of y) if record, else the last y}
+    """
+    sizes = system["layout"]["sizes"]
+    a_z, a_y, b_v = system["Az"], system["Ay"], system["Bv"]
+    z = np.zeros(sizes["z"]) if z0 is None else np.array(z0, dtype=float)
+    v_all = np.zeros(sizes["v"]) if inputs is None else np.asarray(inputs, dtype=float)
+    per_step = v_all.ndim == 2
+    outputs = np.empty((steps, sizes["y"])) if record else None
+    y = np.zeros(sizes["y"])
+    for k in range(steps):
+        v = v_all[k] if per_step else v_all
+        y = output_vector(system, z, v)
+        if record:
+            outputs[k] = y
+        z = a_z @ z + a_y @ y + b_v @ v
+    return {"state": z, "outputs": outputs if record else y}
+
+
+# ----------------- TESTS -----------------
+
+import json
+
+from tools.algebraic import step_model_algebraic
+
+
+def _load(name):
+    """
+    Loads a model from the models directory.
+    """
+    with open(f"models/{name}", "r") as file:
+        return json.load(file)
+
+
+CONTROL_MATRICES = {
+    "F": {"D": [[0.9, 1.0]]},
+    "S": {"D": [[0.5]]},
+    "G": {"D": [[-0.4]]},
+}
+
+
+def test_matches_algebraic_execution():
+    """
+    The linear control loop (state feedback delayed, the rest instantaneous) follows
+    step_model_algebraic step for step.
+    """
+    model = _load("control_loop_model.json")
+    for wire in model["wires"]:
+        if wire["ID"] == "wrefX1":
+            wire["Delay"] = 1
+    system = assemble_linear_system(model, CONTROL_MATRICES, explicit=True)
+    assert system["layout"]["sizes"] == {"z": 1, "v": 0, "y": 3}
+    # x = 0.9 x_prev + u, u = -0.4 * 0.5 x  ->  x = 0.75 x_prev
+    assert abs(system["A"][0, 0] - 0.75) < 1e-12
+
+    behaviors = {"F": lambda x, u: (0.9 * x + u,), "S": lambda x: (0.5 * x,), "G": lambda y: (-0.4 * y,)}
+    state = {"wrefX1": 1.0}
+    result = propagate(system, 6, z0=state_vector(system, state))
+    for y in result["outputs"]:
+        expected, state, _ = step_model_algebraic(model, behaviors, state=state)
+        for wire_id, value in wire_values(system, y).items():
+            assert abs(value - expected[wire_id]) < 1e-9
+
+
+def test_steady_state_and_processor_states():
+    """
+    A first-order filter (its own state) feeding a gain: y = 3 * 2u at equilibrium.
+    """
+    model = {
+        "processors": [
+            {"ID": "filter", "Parent": "F", "Ports": ["U"], "Terminals": ["X"],
+             "Linear": {"A": [[0.5]], "B": [[1.0]], "C": [[1.0]]}},
+            {"ID": "gain", "Parent": "S", "Ports": ["X"], "Terminals": ["Y"], "Linear": {"D": [[3.0]]}}
+        ],
+        "wires": [
+            {"ID": "w_x", "Parent": "X", "Source": ["filter", 0], "Destination": ["gain", 0]}
+        ]
+    }
+    system = assemble_linear_system(model)
+    v = input_vector(system, {("filter", 0): 2.0})
+    z, y = steady_state(system, v)
+    assert np.allclose(z, [4.0]) and wire_values(system, y) == {"w_x": 4.0}
+    outputs = propagate(system, 40, inputs=v)["outputs"]
+    # x[0] = 0, x[1] = 2, x[2] = 3, ...
+    assert np.allclose(outputs[:3, 1], [0.0, 6.0, 9.0]) and abs(outputs[-1, 1] - 12.0) < 1e-9
+
+
+def test_simple_model_with_open_port():
+    """
+    The plant x = 0.9 x_prev + u settles at 10u; without the delay the loop is instantaneous
+    and solved exactly (x = 0.9 x + u).
+    """
+    model = _load("simple_model.json")
+    model["wires"][0]["Delay"] = 1
+    system = assemble_linear_system(model, CONTROL_MATRICES)
+    _, y = steady_state(system, input_vector(system, {("f", 1): 0.5}))
+    assert abs(y[0] - 5.0) < 1e-9
+
+    del model["wires"][0]["Delay"]
+    system = assemble_linear_system(model, CONTROL_MATRICES)
+    assert system["layout"]["sizes"]["z"] == 0
+    _, y = steady_state(system, input_vector(system, {("f", 1): 0.5}))
+    assert abs(y[0] - 5.0) < 1e-9
+
+
+def test_errors():
+    """
+    Dimension mismatches, singular instantaneous loops and integrators are reported.
+    """
+    model = _load("simple_model.json")
+    for matrices, message in (({"F": {"D": [[0.9, 1.0, 2.0]]}}, "should be"),
+                              ({"F": {"D": [[1.0, 1.0]]}}, "no unique solution")):
+        try:
+            assemble_linear_system(model, matrices)
+        except ValueError as error:
+            assert message in str(error)
+        else:
+            assert False, f"Expected a ValueError for {matrices}"
+    model["wires"][0]["Delay"] = 1
+    system = assemble_linear_system(model, {"F": {"D": [[1.0, 1.0]]}})
+    try:
+        steady_state(system, input_vector(system, {("f", 1): 1.0}))
+    except ValueError as error:
+        assert "steady state" in str(error)
+    else:
+        assert False, "An integrator has no steady state"
+
+
+def _chain(count, matrices, explicit=False):
+    """
+    Assembles a chain of count single-port, single-terminal linear processors.
+    """
+    processors = [{"ID": f"p{i}", "Parent": "F", "Ports": ["U"], "Terminals": ["X"]} for i in range(count)]
+    wires = [{"ID": f"w{i}", "Parent": "X", "Source": [f"p{i}", 0], "Destination": [f"p{i + 1}", 0]}
+             for i in range(count - 1)]
+    return assemble_linear_system({"processors": processors, "wires": wires}, {"F": matrices}, explicit=explicit)
+
+
+def test_large_chain_is_sparse():
+    """
+    A chain of 5000 filters assembles into matrices with nonzeros linear in its length.
+    """
+    count = 5000
+    system = _chain(count, {"A": [[0.5]], "B": [[0.5]], "C": [[1.0]]})
+    assert system["Az"].shape == (count, count) and system["coupling"] is None
+    assert system["Az"].nnz + system["Ay"].nnz <= 2 * count and system["Cz"].nnz == count
+    z, y = steady_state(system, input_vector(system, {("p0", 0): 1.0}))
+    assert np.allclose(y, 1.0)
+    result = propagate(system, 200, inputs=input_vector(system, {("p0", 0): 1.0}), record=False)
+    assert result["outputs"].shape == (count,)
+
+
+def test_instantaneous_chain_stays_sparse():
+    """
+    With a direct feedthrough on every link, the chain is coupled instantaneously: the
+    implicit form and its factorization stay linear in the length, and match the explicit form.
+    """
+    matrices = {"A": [[0.5]], "B": [[0.5]], "C": [[1.0]], "D": [[0.5]]}
+    for count in (1000, 4000):
+        system = _chain(count, matrices)
+        nnz = sum(system[key].nnz for key in ("Az", "Ay", "Bv", "Cz", "Dv", "coupling"))
+        nnz += system["factor"].L.nnz + system["factor"].U.nnz
+        assert nnz <= 10 * count, f"{nnz} nonzeros for a chain of {count}"
+        v = input_vector(system, {("p0", 0): 1.0})
+        z, y = steady_state(system, v)
+        # Equilibrium of each link: x = 0.5 x + 0.5 u, y = x + 0.5 u  ->  y = 1.5 u.
+        assert np.allclose(y[:5], [1.5, 2.25, 3.375, 5.0625, 7.59375])
+
+    explicit = _chain(30, matrices, explicit=True)
+    v = input_vector(explicit, {("p0", 0): 0.1})
+    implicit_run = propagate(explicit, 20, inputs=v)["outputs"]
+    z = np.zeros(30)
+    for k in range(20):
+        y = explicit["C"] @ z + explicit["D"] @ v
+        assert np.allclose(y, implicit_run[k])
+        z = explicit["A"] @ z + explicit["B"] @ v
+
+
+if __name__ == "__main__":
+    test_matches_algebraic_execution()
+    test_steady_state_and_processor_states()
+    test_simple_model_with_open_port()
+    test_errors()
+    test_large_chain_is_sparse()
+    test_instantaneous_chain_stays_sparse()
+    print("✅ All linear system tests passed!")
@@ -0,0 +1,373 @@
+# Optimization passes over the processors/wires graph.
+# Generated models can contain processors that feed nothing anyone observes, and identical
+# processors that compute the same thing twice. Two passes remove them:
+#
+#   "dead":  removes the processors with no path to a designated output processor, with
+#            every wire touching them. Their consumers are dead too, so no live port is
+#            left open.
+#   "merge": processors with the same signature (Parent, Ports, Terminals) whose ports are
+#            all fed by the same sources are merged. The first one (in model order) is kept,
+#            the wires leaving the others are re-sourced from it, and the wires into them
+#            are removed. Merging some processors can make their consumers identical, so
+#            the consumers of every merged processor go back on a worklist and are looked at
+#            again, until the worklist is empty.
+#
+# A processor is only merged when every one of its ports has exactly one wire: an open port
+# is an external input, and two of them may carry different values. Processors without ports
+# (sources) and designated outputs are never merged away.
+
+import contextlib
+import io
+from collections import deque
+
+from tools.indexing import build_model_index, processor_signature
+from tools.validations import is_closed_loop, are_wires_typed_correctly, no_duplicate_wires_into_ports
+
+PASSES = ("merge", "dead")
+VALIDATORS = {
+    "closed_loop": is_closed_loop,
+    "wires_typed": are_wires_typed_correctly,
+    "no_duplicate_wires": no_duplicate_wires_into_ports,
+}
+
+
+def _check_outputs(model, outputs):
+    """
+    Returns the designated outputs as a set of processor IDs.
+
+    Raises:
+        ValueError: If an output is not a processor of the model.
+    """
+    outputs = set(outputs)
+    unknown = outputs - {p["ID"] for p in model.get("processors", [])}
+    if unknown:
+        raise ValueError(f"Unknown output processors: {sorted(unknown)}")
+    return outputs
+
+
+def eliminate_dead_processors(model, outputs):
+    """
+    Removes the processors with no path to an output processor.
+
+    Args:
+        model (dict): The model.
+        outputs (iterable): IDs of the observed output processors.
+
+    Returns:
+        tuple: (optimized model, {"dead": removed processor IDs, "removed_wires": removed wire IDs})
+
+    Raises:
+        ValueError: If an output is not a processor of the model.
+    """
+    outputs = _check_outputs(model, outputs)
+    index = build_model_index(model)
+    live = set(outputs)
+    stack = list(outputs)
+    while stack:
+        for wire in index["incoming"].get(stack.pop(), []):
+            source = wire["Source"][0]
+            if source in index["processors"] and source not in live:
+                live.add(source)
+                stack.append(source)
+
+    processors = [p for p in model.get("processors", []) if p["ID"] in live]
+    wires = [w for w in model.get("wires", []) if w["Source"][0] in live and w["Destination"][0] in live]
+    report = {
+        "dead": [p["ID"] for p in model.get("processors", []) if p["ID"] not in live],
+        "removed_wires": [w["ID"] for w in model.get("wires", [])
+                          if not (w["Source"][0] in live and w["Destination"][0] in live)],
+    }
+    return {**model, "processors": processors, "wires": wires}, report
+
+
+def _merge_key(proc, index, representative):
+    """
+    Returns the (signature, sources of each port) key of a processor, or None if it cannot
+    be merged (no ports, or a port without exactly one wire). Sources are named by
+    representative(processor ID), the processor they are merged into.
+    """
+    ports = proc.get("Ports", [])
+    if not ports:
+        return None
+    sources = []
+    for port_idx in range(len(ports)):
+        wires = index["into_port"].get((proc["ID"], port_idx), [])
+        if len(wires) != 1:
+            return None
+        src_proc, src_idx = wires[0]["Source"]
+        sources.append((representative(src_proc), src_idx, wires[0]["Parent"]))
+    return processor_signature(proc), tuple(sources)
+
+
+def merge_duplicate_processors(model, outputs=()):
+    """
+    Merges processors with the same signature and the same input sources.
+
+    Args:
+        model (dict): The model.
+        outputs (iterable): IDs of processors that must not be merged away.
+
+    Returns:
+        tuple: (optimized model, {"merged": {removed processor ID: kept processor ID},
+                                  "removed_wires": IDs of wires into removed processors,
+                                  "rewired": IDs of wires now leaving the kept processor})
+
+    Raises:
+        ValueError: If an output is not a processor of the model.
+    """
+    outputs = _check_outputs(model, outputs)
+    index = build_model_index(model)
+    merged = {}  # removed processor ID -> the processor it was merged into
+
+    def representative(pid):
+        root = pid
+        while root in merged:
+            root = merged[root]
+        while pid != root:
+            merged[pid], pid = root, merged[pid]
+        return root
+
+    # kept[key] is the processor that others with this key merge into: the first in model
+    # order, unless a later one is a designated output.
+    kept = {}
+    worklist = deque(p["ID"] for p in model.get("processors", []))
+    while worklist:
+        pid = worklist.popleft()
+        if pid in merged:
+            continue
+        key = _merge_key(index["processors"][pid], index, representative)
+        if key is None:
+            continue
+        other = kept.get(key)
+        if other is not None:
+            other = representative(other)
+        if other is None or other == pid:
+            kept[key] = pid
+            continue
+        if pid in outputs:
+            if other in outputs:
+                continue
+            kept[key], pid, other = pid, other, pid
+        merged[pid] = other
+        # The consumers of the removed processor now read from the kept one.
+        worklist.extend(wire["Destination"][0] for wire in index["outgoing"].get(pid, [])
+                        if wire["Destination"][0] in index["processors"])
+
+    removed_wires = []
+    rewired = []
+    wires = []
+    for wire in model.get("wires", []):
+        src_proc, src_idx = wire["Source"]
+        if wire["Destination"][0] in merged:
+            removed_wires.append(wire["ID"])
+            continue
+        if src_proc in merged:
+            wire = {**wire, "Source": [representative(src_proc), src_idx]}
+            rewired.append(wire["ID"])
+        wires.append(wire)
+    processors = [p for p in model.get("processors", []) if p["ID"] not in merged]
+    report = {
+        "merged": {pid: representative(pid) for pid in merged},
+        "removed_wires": removed_wires,
+        "rewired": rewired,
+    }
+    return {**model, "processors": processors, "wires": wires}, report
+
+
+def validator_results(model):
+    """
+    Runs the validators of validations.py that do not depend on a block, without their output.
+
+    Returns:
+        dict: validator name (see VALIDATORS) -> bool
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        return {name: validator(model) for name, validator in VALIDATORS.items()}
+
+
+def optimize_model(model, outputs, passes=PASSES, verify=True):
+    """
+    Runs optimization passes over a model.
+
+    Args:
+        model (dict): The model (not modified).
+        outputs (iterable): IDs of the observed output processors.
+        passes (tuple): Pass names from PASSES, in the order to run them.
+        verify (bool): Check that the result still passes every validator the model passed.
+
+    Returns:
+        tuple: (optimized model, report) where the report has "dead", "merged",
+               "removed_wires" and "rewired", plus "validators": {name: (before, after)}
+               when verify is True.
+
+    Raises:
+        ValueError: If a pass is unknown, an output is not a processor of the model, or
+                    the result fails a validator the model passed.
+    """
+    unknown = [name for name in passes if name not in PASSES]
+    if unknown:
+        raise ValueError(f"Unknown passes: {unknown}. Use {list(PASSES)}.")
+    outputs = _check_outputs(model, outputs)
+    report = {"dead": [], "merged": {}, "removed_wires": [], "rewired": []}
+    optimized = model
+    for name in passes:
+        if name == "dead":
+            optimized, found = eliminate_dead_processors(optimized, outputs)
+            report["dead"].extend(found["dead"])
+        else:
+            optimized, found = merge_duplicate_processors(optimized, outputs)
+            report["merged"].update(found["merged"])
+            report["rewired"].extend(found["rewired"])
+        report["removed_wires"].extend(found["removed_wires"])
+    removed = set(report["removed_wires"])
+    report["rewired"] = [wire_id for wire_id in dict.fromkeys(report["rewired"]) if wire_id not in removed]
+
+    if verify:
+        before, after = validator_results(model), validator_results(optimized)
+        report["validators"] = {name: (before[name], after[name]) for name in VALIDATORS}
+        broken = [name for name in VALIDATORS if before[name] and not after[name]]
+        if broken:
+            raise ValueError(f"The optimized model fails {broken}.")
+    return optimized, report
+
+
+# ----------------- TESTS -----------------
+
+import json
+import os
+import time
+
+
+def _redundant_model():
+    """
+    A plant with two identical sensors feeding two identical controllers, of which one
+    output is observed, plus a monitoring chain that feeds nothing observed.
+    """
+    processors = [
+        {"ID": "f", "Parent": "F", "Name": "Plant", "Ports": ["X", "U"], "Terminals": ["X"]},
+        {"ID": "s1", "Parent": "S", "Name": "Sensor", "Ports": ["X"], "Terminals": ["Y"]},
+        {"ID": "s2", "Parent": "S", "Name": "Sensor copy", "Ports": ["X"], "Terminals": ["Y"]},
+        {"ID": "g1", "Parent": "G", "Name": "Controller", "Ports": ["Y"], "Terminals": ["U"]},
+        {"ID": "g2", "Parent": "G", "Name": "Controller copy", "Ports": ["Y"], "Terminals": ["U"]},
+        {"ID": "m1", "Parent": "S", "Name": "Monitor", "Ports": ["Y"], "Terminals": ["Y"]},
+        {"ID": "m2", "Parent": "S", "Name": "Monitor log", "Ports": ["Y"], "Terminals": ["Y"]},
+        {"ID": "out", "Parent": "S", "Name": "Observed", "Ports": ["U"], "Terminals": ["U"]},
+    ]
+    wire = lambda wid, space, src, dst: {"ID": wid, "Parent": space, "Name": wid, "Source": list(src),
+                                         "Destination": list(dst)}
+    wires = [
+        wire("x_self", "X", ("f", 0), ("f", 0)),
+        wire("x_s1", "X", ("f", 0), ("s1", 0)),
+        wire("x_s2", "X", ("f", 0), ("s2", 0)),
+        wire("y_g1", "Y", ("s1", 0), ("g1", 0)),
+        wire("y_g2", "Y", ("s2", 0), ("g2", 0)),
+        wire("u_f", "U", ("g1", 0), ("f", 1)),
+        wire("u_out", "U", ("g2", 0), ("out", 0)),
+        wire("y_m1", "Y", ("s2", 0), ("m1", 0)),
+        wire("y_m2", "Y", ("m1", 0), ("m2", 0)),
+    ]
+    return {"processors": processors, "wires": wires}
+
+
+def test_dead_processors():
+    """
+    The monitoring chain has no path to the observed output.
+    """
+    model = _redundant_model()
+    optimized, report = eliminate_dead_processors(model, ["out"])
+    assert report == {"dead": ["m1", "m2"], "removed_wires": ["y_m1", "y_m2"]}
+    assert [p["ID"] for p in optimized["processors"]] == ["f", "s1", "s2", "g1", "g2", "out"]
+    assert len(model["processors"]) == 8
+
+    optimized, report = eliminate_dead_processors(model, ["m2"])
+    assert report["dead"] == ["g2", "out"]
+
+
+def test_merging_cascades():
+    """
+    Merging the sensors makes the controllers identical, which are then merged too.
+    """
+    optimized, report = merge_duplicate_processors(_redundant_model(), outputs=["out"])
+    assert report["merged"] == {"s2": "s1", "g2": "g1"}
+    assert sorted(report["removed_wires"]) == ["x_s2", "y_g2"]
+    assert sorted(report["rewired"]) == ["u_out", "y_m1"]
+    sources = {w["ID"]: w["Source"] for w in optimized["wires"]}
+    assert sources["u_out"] == ["g1", 0] and sources["y_m1"] == ["s1", 0]
+    assert validator_results(optimized) == {"closed_loop": True, "wires_typed": True, "no_duplicate_wires": True}
+
+    # A designated output is the one kept.
+    optimized, report = merge_duplicate_processors(_redundant_model(), outputs=["out", "g2"])
+    assert report["merged"] == {"s2": "s1", "g1": "g2"}
+    assert {w["ID"]: w["Source"] for w in optimized["wires"]}["u_f"] == ["g2", 0]
+
+
+def test_merging_long_chains_is_linear():
+    """
+    Two identical chains fed by one source merge link by link; each merge only looks at
+    the consumers of the merged processor again.
+    """
+    def chains(length):
+        processors = [{"ID": "src", "Parent": "S", "Ports": [], "Terminals": ["X"]}]
+        wires = []
+        for copy in "ab":
+            for k in range(length):
+                processors.append({"ID": f"{copy}{k}", "Parent": "S", "Ports": ["X"], "Terminals": ["X"]})
+                source = "src" if k == 0 else f"{copy}{k - 1}"
+                wires.append({"ID": f"w{copy}{k}", "Parent": "X", "Source": [source, 0], "Destination": [f"{copy}{k}", 0]})
+        return {"processors": processors, "wires": wires}
+
+    timings = {}
+    for length in (2000, 8000):
+        start = time.perf_counter()
+        optimized, report = merge_duplicate_processors(chains(length))
+        timings[length] = time.perf_counter() - start
+        assert report["merged"] == {f"b{k}": f"a{k}" for k in range(length)}
+        assert len(optimized["processors"]) == length + 1 and len(report["removed_wires"]) == length
+        assert report["rewired"] == []
+    assert timings[8000] < 10 * timings[2000], timings
+
+
+def test_pipeline_and_errors():
+    """
+    The full pipeline keeps what is observed, and rejects unknown passes and outputs.
+    """
+    optimized, report = optimize_model(_redundant_model(), ["out"])
+    assert [p["ID"] for p in optimized["processors"]] == ["f", "s1", "g1", "out"]
+    assert report["merged"] == {"s2": "s1", "g2": "g1"} and report["dead"] == ["m1", "m2"]
+    assert "y_m1" in report["removed_wires"] and "y_m1" not in report["rewired"]
+    assert all(before == after for before, after in report["validators"].values())
+
+    for bad in ({"passes": ("inline",)}, {"outputs": ["nope"]}):
+        try:
+            optimize_model(_redundant_model(), **{"outputs": ["out"], **bad})
+        except ValueError:
+            pass
+        else:
+            assert False, f"Expected a ValueError for {bad}"
+
+
+def test_examples_still_pass_validators():
+    """
+    Every example model, with every processor observed or only the ones with open
+    terminals, still passes the validators it passed before optimization.
+    """
+    for filename in sorted(os.listdir("models")):
+        if not filename.endswith(".json"):
+            continue
+        with open(os.path.join("models", filename), "r") as file:
+            model = json.load(file)
+        index = build_model_index(model)
+        open_terminals = [p["ID"] for p in model["processors"]
+                          if any((p["ID"], i) not in index["from_terminal"] for i in range(len(p["Terminals"])))]
+        for outputs in ([p["ID"] for p in model["processors"]], open_terminals):
+            optimized, report = optimize_model(model, outputs)
+            assert all(after or not before for before, after in report["validators"].values()), filename
+
+
+if __name__ == "__main__":
+    test_dead_processors()
+    test_merging_cascades()
+    test_merging_long_chains_is_linear()
+    test_pipeline_and_errors()
+    test_examples_still_pass_validators()
+    print("✅ All optimization tests passed!")
@@ -0,0 +1,385 @@
+# Partitioned multi-process execution.
+# A large model is split into balanced parts with few wires between them. Each part is
+# stepped by its own worker process. Values on cut wires (wires between parts) are
+# exchanged through a shared-memory ring buffer of float64 slots, one row per step,
+# with a barrier after every level of the execution plan that produces a cut value
+# needed later in the same step, and one at the end of every step.
+#
+# Cut wire values pass through float64 slots, so they must be Python floats (or values
+# that survive float(), such as small ints) for the results to match step_model exactly.
+
+import math
+import multiprocessing
+import queue
+import threading
+from collections import Counter
+from multiprocessing import shared_memory
+
+from tools.execution import execution_plan, resolve_behaviors, port_keys
+
+RING_DEPTH = 2  # the current step and the previous one (read by feedback cut wires)
+RESULT_POLL = 0.2  # seconds between liveness checks while waiting for worker results
+
+
+def partition_model(model, parts, passes=4, imbalance=0.05):
+    """
+    Splits the processors of a model into balanced parts with few cut wires.
+
+    Parts are first grown breadth-first over the wiring in execution order, then
+    processors on the boundary are moved to the neighbouring part holding most of their
+    wires, as long as the part sizes stay within the allowed imbalance.
+
+    Args:
+        model (dict): The block diagram model.
+        parts (int): Number of parts.
+        passes (int): Number of refinement passes.
+        imbalance (float): Allowed relative deviation of a part's size from the average.
+
+    Returns:
+        dict: {"assignment": processor_id -> part index,
+               "cut_wires": IDs of wires whose endpoints are in different parts,
+               "sizes": number of processors in each part}
+    """
+    plan = execution_plan(model)
+    order = plan["order"]
+    parts = max(1, min(parts, len(order)))
+    neighbours = {proc_id: Counter() for proc_id in order}
+    for wire in model.get("wires", []):
+        src, dst = wire["Source"][0], wire["Destination"][0]
+        if src in neighbours and dst in neighbours and src != dst:
+            neighbours[src][dst] += 1
+            neighbours[dst][src] += 1
+
+    capacity = math.ceil(len(order) / parts) if order else 0
+    assignment = {}
+    sizes = [0] * parts
+    part = 0
+    for seed in order:
+        if seed in assignment:
+            continue
+        frontier = [seed]
+        while frontier:
+            next_frontier = []
+            for proc_id in frontier:
+                if proc_id in assignment:
+                    continue
+                if sizes[part] >= capacity and part < parts - 1:
+                    part += 1
+                assignment[proc_id] = part
+                sizes[part] += 1
+                next_frontier.extend(n for n in neighbours[proc_id] if n not in assignment)
+            frontier = next_frontier
+
+    max_size = math.floor(capacity * (1 + imbalance)) if parts > 1 else len(order)
+    min_size = math.ceil(len(order) / parts * (1 - imbalance)) if parts > 1 else 0
+    for _ in range(passes):
+        moved = 0
+        for proc_id in order:
+            current = assignment[proc_id]
+            links = Counter()
+            for other, count in neighbours[proc_id].items():
+                links[assignment[other]] += count
+            best, best_gain = current, 0
+            for candidate, count in links.items():
+                gain = count - links[current]
+                if candidate != current and gain > best_gain and sizes[candidate] < max_size:
+                    best, best_gain = candidate, gain
+            if best != current and sizes[current] > min_size:
+                assignment[proc_id] = best
+                sizes[current] -= 1
+                sizes[best] += 1
+                moved += 1
+        if not moved:
+            break
+
+    cut_wires = [w["ID"] for w in model.get("wires", [])
+                 if w["Source"][0] in assignment and w["Destination"][0] in assignment
+                 and assignment[w["Source"][0]] != assignment[w["Destination"][0]]]
+    return {"assignment": assignment, "cut_wires": cut_wires, "sizes": sizes}
+
+
+def _partition_worker(part, model, behaviors, assignment, plan, slots, sync_levels,
+                      shm_name, barrier, steps, state, inputs, results):
+    """
+    Steps the processors of one part, exchanging cut wire values through shared memory.
+    Sends back {wire_id: value} for every step, for the wires whose source is in this part.
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    ring = shm.buf.cast("d")
+    try:
+        processors = {p["ID"]: p for p in model.get("processors", [])}
+        n_slots = len(slots)
+        local_levels = [[p for p in level if assignment.get(p) == part] for level in plan["levels"]]
+        local_wires = [w for w in model.get("wires", []) if assignment.get(w["Source"][0]) == part]
+        previous = {}  # terminal values of this part from the previous step
+        history = []
+        for t in range(steps):
+            row = (t % RING_DEPTH) * n_slots
+            previous_row = ((t - 1) % RING_DEPTH) * n_slots
+            terminal_values = {}
+            for level_number, level in enumerate(local_levels):
+                for proc_id in level:
+                    args = []
+                    for port_key in port_keys(processors[proc_id]):
+                        wire = plan["port_wires"].get(port_key)
+                        if wire is None:
+                            args.append(inputs.get(port_key))
+                            continue
+                        src = tuple(wire["Source"])
+                        local = assignment.get(src[0]) == part
+                        if wire["ID"] in plan["feedback"]:
+                            if t == 0:
+                                args.append(state.get(wire["ID"]))
+                            elif local:
+                                args.append(previous.get(src))
+                            else:
+                                args.append(ring[previous_row + slots[src]])
+                        elif local:
+                            args.append(terminal_values.get(src))
+                        else:
+                            args.append(ring[row + slots[src]])
+                    outputs = behaviors[proc_id](*args)
+                    for i, value in enumerate(outputs or ()):
+                        terminal_values[(proc_id, i)] = value
+                        slot = slots.get((proc_id, i))
+                        if slot is not None:
+                            ring[row + slot] = float(value)
+                if level_number in sync_levels:
+                    barrier.wait()
+            barrier.wait()  # the previous row may be overwritten from the next step on
+            history.append({w["ID"]: terminal_values.get(tuple(w["Source"])) for w in local_wires})
+            previous = terminal_values
+        results.put((part, history))
+    except Exception as error:
+        # Release the other workers instead of leaving them waiting at the barrier.
+        barrier.abort()
+        results.put((part, error))
+    finally:
+        ring.release()
+        shm.close()
+
+
+def _collect_results(workers, results, barrier):
+    """
+    Waits for the (part, history) result of every worker, watching for workers that die
+    without reporting (segfault, OOM kill), which would otherwise block the run forever.
+
+    A worker flushes its result before exiting, so a worker found dead with no result on
+    two consecutive empty polls is lost; the barrier is aborted to release the others.
+
+    Args:
+        workers (list): The worker processes, indexed by part.
+        results (Queue): The queue the workers report to.
+        barrier (Barrier): The barrier shared by the workers.
+
+    Returns:
+        list: (part, history or exception) for every worker.
+
+    Raises:
+        RuntimeError: If a worker exited without reporting a result.
+    """
+    received = {}
+    suspected = []
+    while len(received) < len(workers):
+        try:
+            part, history = results.get(timeout=RESULT_POLL)
+            received[part] = history
+            continue
+        except queue.Empty:
+            pass
+        lost = [part for part, worker in enumerate(workers)
+                if part not in received and not worker.is_alive()]
+        if lost and lost == suspected:
+            barrier.abort()
+            part = lost[0]
+            raise RuntimeError(f"Worker for part {part} died with exit code {workers[part].exitcode}.")
+        suspected = lost
+    return list(received.items())
+
+
+def run_partitioned(model, behaviors, steps=1, parts=2, state=None, inputs=None, partition=None):
+    """
+    Runs a model for several steps with each part of a partition in its own process.
+
+    Args:
+        model (dict): The block diagram model.
+        behaviors (dict): processor ID (or Parent block ID) -> callable.
+        steps (int): Number of steps.
+        parts (int): Number of worker processes (ignored if partition is given).
+        state (dict): Initial feedback wire values, as in step_model.
+        inputs (dict): (processor_id, port_index) -> value for open ports.
+        partition (dict): A precomputed partition_model result.
+
+    Returns:
+        list: The wire values of every step, as step_model would produce them.
+    """
+    state = state or {}
+    inputs = inputs or {}
+    plan = execution_plan(model)
+    behaviors = resolve_behaviors(model, behaviors)
+    if partition is None:
+        partition = partition_model(model, parts)
+    assignment = partition["assignment"]
+    n_parts = len(partition["sizes"])
+
+    # One slot per source terminal of a cut wire.
+    cut_wires = set(partition["cut_wires"])
+    slots = {}
+    level_of = {proc_id: k for k, level in enumerate(plan["levels"]) for proc_id in level}
+    sync_levels = set()
+    for wire in model.get("wires", []):
+        src = tuple(wire["Source"])
+        if wire["ID"] in cut_wires:
+            slots.setdefault(src, len(slots))
+            if wire["ID"] not in plan["feedback"]:
+                sync_levels.add(level_of[src[0]])
+
+    context = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() \
+        else multiprocessing.get_context()
+    shm = shared_memory.SharedMemory(create=True, size=max(1, RING_DEPTH * len(slots)) * 8)
+    barrier = context.Barrier(n_parts)
+    results = context.Queue()
+    workers = [
+        context.Process(target=_partition_worker,
+                        args=(part, model, behaviors, assignment, plan, slots, sync_levels,
+                              shm.name, barrier, steps, state, inputs, results))
+        for part in range(n_parts)
+    ]
+    try:
+        for worker in workers:
+            worker.start()
+        histories = _collect_results(workers, results, barrier)
+        for worker in workers:
+            worker.join()
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+        shm.close()
+        shm.unlink()
+
+    failures = [(part, history) for part, history in histories if isinstance(history, Exception)]
+    if failures:
+        # A worker hit by another's barrier.abort() reports BrokenBarrierError; show the root cause.
+        failures.sort(key=lambda item: isinstance(item[1], threading.BrokenBarrierError))
+        part, error = failures[0]
+        raise RuntimeError(f"Worker for part {part} failed: {error!r}")
+
+    merged = [{} for _ in range(steps)]
+    for _, history in histories:
+        for t, wire_values in enumerate(history):
+            merged[t].update(wire_values)
+    order = [w["ID"] for w in model.get("wires", [])]
+    return [{wire_id: step_values.get(wire_id) for wire_id in order} for step_values in merged]
+
+
+# ----------------- TESTS -----------------
+
+import os
+from tools.execution import step_model
+
+
+def _coupled_plants(count):
+    """
+    Builds a ring of plants, each with its own state feedback and driven by the previous
+    plant through a gain processor.
+    """
+    processors = []
+    wires = []
+    for i in range(count):
+        processors.append({"ID": f"f{i}", "Parent": "F", "Ports": ["X", "U"], "Terminals": ["X"]})
+        processors.append({"ID": f"k{i}", "Parent": "G", "Ports": ["Y"], "Terminals": ["U"]})
+        wires.append({"ID": f"fb{i}", "Parent": "X", "Source": [f"f{i}", 0], "Destination": [f"f{i}", 0]})
+        wires.append({"ID": f"u{i}", "Parent": "U", "Source": [f"k{i}", 0], "Destination": [f"f{i}", 1]})
+        prev = (i - 1) % count
+        wires.append({"ID": f"y{i}", "Parent": "Y", "Source": [f"f{prev}", 0], "Destination": [f"k{i}", 0]})
+    return {"processors": processors, "wires": wires}
+
+
+PLANT_BEHAVIORS = {
+    "F": lambda x, u: (math.sin(x if x is not None else 0.3) * 0.95 + (u if u is not None else 0.0),),
+    "G": lambda y: (0.1 * math.cos(y if y is not None else 0.0) - 0.05,),
+}
+
+
+def test_partition_is_balanced_with_small_cut():
+    """
+    A ring of 40 plant/gain pairs split in four only cuts a handful of wires.
+    """
+    model = _coupled_plants(40)
+    partition = partition_model(model, 4)
+    assert sum(partition["sizes"]) == 80
+    assert max(partition["sizes"]) - min(partition["sizes"]) <= 4
+    assert 0 < len(partition["cut_wires"]) <= 8
+
+
+def test_partitioned_matches_single_process():
+    """
+    Running the ring in three processes gives bit-for-bit the same wire values.
+    """
+    model = _coupled_plants(30)
+    expected = []
+    state = {}
+    for _ in range(25):
+        wire_values, state = step_model(model, PLANT_BEHAVIORS, state=state)
+        expected.append(wire_values)
+    assert run_partitioned(model, PLANT_BEHAVIORS, steps=25, parts=3) == expected
+
+
+def test_partitioned_control_loop():
+    """
+    Splitting the control loop across processors puts every wire but the self-loop on the cut.
+    """
+    from tools.execution import CONTROL_BEHAVIORS
+    import json
+    with open("models/control_loop_model.json", "r") as file:
+        model = json.load(file)
+    partition = {"assignment": {"f": 0, "s": 1, "g": 2}, "cut_wires": ["wrefU1", "wrefY1", "wrefXSense"],
+                 "sizes": [1, 1, 1]}
+    expected = []
+    state = {}
+    for _ in range(10):
+        wire_values, state = step_model(model, CONTROL_BEHAVIORS, state=state)
+        expected.append(wire_values)
+    assert run_partitioned(model, CONTROL_BEHAVIORS, steps=10, partition=partition) == expected
+
+
+def test_worker_failure_is_reported():
+    """
+    An exception in one worker stops the run instead of hanging at a barrier.
+    """
+    def broken(y):
+        raise ZeroDivisionError("broken gain")
+    try:
+        run_partitioned(_coupled_plants(4), dict(PLANT_BEHAVIORS, G=broken), steps=3, parts=2)
+    except RuntimeError as error:
+        assert "broken gain" in str(error)
+    else:
+        assert False, "Worker failure was not reported"
+
+
+def test_worker_crash_is_reported():
+    """
+    A worker that dies without reporting (as on a segfault) stops the run instead of
+    leaving the parent waiting for its result.
+    """
+    def crashing(y):
+        os._exit(3)
+    model = _coupled_plants(4)
+    partition = partition_model(model, 2)
+    crashed = next(f"k{i}" for i in range(4) if partition["assignment"][f"k{i}"] == 1)
+    try:
+        run_partitioned(model, dict(PLANT_BEHAVIORS, **{crashed: crashing}), steps=3, partition=partition)
+    except RuntimeError as error:
+        assert "part 1 died with exit code 3" in str(error)
+    else:
+        assert False, "Worker crash was not reported"
+
+
+if __name__ == "__main__":
+    test_partition_is_balanced_with_small_cut()
+    test_partitioned_matches_single_process()
+    test_partitioned_control_loop()
+    test_worker_failure_is_reported()
+    test_worker_crash_is_reported()
+    print("✅ All partitioning tests passed!")
@@ -0,0 +1,327 @@
+# Motif search: find every occurrence of a small pattern model inside a bigger model.
+# A pattern is written like any other model. Its processors are matched on Parent
+# (and on Ports/Terminals when the pattern spells them out) and its wires are matched
+# on space and on the terminal/port indices they connect.
+
+from tools.indexing import build_model_index, processor_signature
+
+
+def _pattern_candidates(index, pattern_proc):
+    """
+    Returns the model processor IDs that a pattern processor could be mapped to,
+    using the signature index when the pattern gives Ports and Terminals. Without a
+    Parent, every signature with those Ports and Terminals is used, whatever its Parent.
+    """
+    parent = pattern_proc.get("Parent")
+    if "Ports" in pattern_proc and "Terminals" in pattern_proc:
+        if "Parent" in pattern_proc:
+            return index["by_signature"].get(processor_signature(pattern_proc), [])
+        _, ports, terminals = processor_signature(pattern_proc)
+        candidates = [proc_id for (_, sig_ports, sig_terminals), proc_ids in index["by_signature"].items()
+                      if sig_ports == ports and sig_terminals == terminals for proc_id in proc_ids]
+        return sorted(candidates, key=index["positions"].get)
+    if parent is not None:
+        candidates = index["by_parent"].get(parent, [])
+    else:
+        candidates = list(index["processors"])
+    return [proc_id for proc_id in candidates if _node_matches(index, pattern_proc, proc_id)]
+
+
+def _node_matches(index, pattern_proc, proc_id):
+    """
+    Checks whether a model processor agrees with every field the pattern processor specifies.
+    """
+    proc = index["processors"].get(proc_id)
+    if proc is None:
+        return False
+    if "Parent" in pattern_proc and proc.get("Parent") != pattern_proc["Parent"]:
+        return False
+    if "Ports" in pattern_proc and proc.get("Ports", []) != pattern_proc["Ports"]:
+        return False
+    if "Terminals" in pattern_proc and proc.get("Terminals", []) != pattern_proc["Terminals"]:
+        return False
+    return True
+
+
+def _wire_exists(index, src_proc, src_idx, dst_proc, dst_idx, space):
+    """
+    Checks for a model wire between the given terminal and port (of the given space, if any).
+    """
+    for wire in index["from_terminal"].get((src_proc, src_idx), []):
+        if wire["Destination"][0] == dst_proc and wire["Destination"][1] == dst_idx:
+            if space is None or wire.get("Parent") == space:
+                return True
+    return False
+
+
+def _plan_search(index, pattern):
+    """
+    Orders the pattern processors so that each one (after the first) is connected to an
+    earlier one whenever possible, starting from the most selective processor.
+
+    Returns:
+        list: One entry per pattern processor, (pattern_id, anchor_wire, wires_to_check),
+              where anchor_wire is a pattern wire to an earlier processor (or None) and
+              wires_to_check are the pattern wires that become fully mapped at this step.
+    """
+    pattern_procs = {p["ID"]: p for p in pattern.get("processors", [])}
+    pattern_wires = pattern.get("wires", [])
+    candidate_counts = {pid: len(_pattern_candidates(index, p)) for pid, p in pattern_procs.items()}
+
+    order = []
+    placed = set()
+    remaining = list(pattern_procs)
+    while remaining:
+        def score(pid):
+            links = sum(1 for w in pattern_wires
+                        if (w["Source"][0] == pid and w["Destination"][0] in placed)
+                        or (w["Destination"][0] == pid and w["Source"][0] in placed))
+            return (-links, candidate_counts[pid])
+        next_pid = min(remaining, key=score)
+        remaining.remove(next_pid)
+        placed.add(next_pid)
+        order.append(next_pid)
+
+    plan = []
+    placed = set()
+    for pid in order:
+        anchor = None
+        for wire in pattern_wires:
+            src, dst = wire["Source"][0], wire["Destination"][0]
+            if (src == pid and dst in placed) or (dst == pid and src in placed):
+                anchor = wire
+                break
+        placed.add(pid)
+        to_check = [w for w in pattern_wires
+                    if pid in (w["Source"][0], w["Destination"][0])
+                    and w["Source"][0] in placed and w["Destination"][0] in placed]
+        plan.append((pid, anchor, to_check))
+    return plan
+
+
+def find_pattern(model, pattern, index=None, limit=None):
+    """
+    Finds every occurrence of a pattern inside a model.
+
+    Candidates for each pattern processor come from the (Parent, Ports, Terminals) index,
+    or from the wires leaving/entering an already matched processor, so the search only
+    touches the neighbourhood of each partial match.
+
+    Args:
+        model (dict): The block diagram model to search.
+        pattern (dict): A small model whose processors and wires describe the motif.
+        index (dict): A prebuilt index of the model (see build_model_index). Built if None.
+        limit (int): Stop after this many matches. If None, return all of them.
+
+    Returns:
+        list: One dict per match, mapping pattern processor IDs to model processor IDs.
+    """
+    if index is None:
+        index = build_model_index(model)
+    pattern_procs = {p["ID"]: p for p in pattern.get("processors", [])}
+    if not pattern_procs:
+        return []
+    plan = _plan_search(index, pattern)
+    matches = []
+    mapping = {}
+    used = set()
+
+    def candidates_for(pid, anchor):
+        if anchor is None:
+            return _pattern_candidates(index, pattern_procs[pid])
+        src, src_idx = anchor["Source"]
+        dst, dst_idx = anchor["Destination"]
+        space = anchor.get("Parent")
+        if dst == pid:
+            # The anchor leaves an already matched processor and enters this one.
+            found = [w["Destination"][0] for w in index["from_terminal"].get((mapping[src], src_idx), [])
+                     if w["Destination"][1] == dst_idx and (space is None or w.get("Parent") == space)]
+        else:
+            # The anchor leaves this processor and enters an already matched one.
+            found = [w["Source"][0] for w in index["into_port"].get((mapping[dst], dst_idx), [])
+                     if w["Source"][1] == src_idx and (space is None or w.get("Parent") == space)]
+        return [proc_id for proc_id in dict.fromkeys(found)
+                if _node_matches(index, pattern_procs[pid], proc_id)]
+
+    def extend(depth):
+        if depth == len(plan):
+            matches.append(dict(mapping))
+            return limit is not None and len(matches) >= limit
+        pid, anchor, to_check = plan[depth]
+        for proc_id in candidates_for(pid, anchor):
+            if proc_id in used:
+                continue
+            mapping[pid] = proc_id
+            if all(_wire_exists(index, mapping[w["Source"][0]], w["Source"][1],
+                                mapping[w["Destination"][0]], w["Destination"][1], w.get("Parent"))
+                   for w in to_check):
+                used.add(proc_id)
+                done = extend(depth + 1)
+                used.discard(proc_id)
+                if done:
+                    del mapping[pid]
+                    return True
+            del mapping[pid]
+        return False
+
+    extend(0)
+    return matches
+
+
+def find_pattern_in_corpus(models, pattern, indexes=None, limit=None):
+    """
+    Finds every occurrence of a pattern across a collection of models.
+
+    Models that lack a processor with one of the pattern's Parents are skipped without searching.
+
+    Args:
+        models (dict): Model name -> block diagram model.
+        pattern (dict): The pattern model.
+        indexes (dict): Optional model name -> prebuilt index, reused across searches.
+        limit (int): Maximum number of matches per model.
+
+    Returns:
+        dict: Model name -> list of matches, for models with at least one match.
+    """
+    required_parents = {p["Parent"] for p in pattern.get("processors", []) if "Parent" in p}
+    results = {}
+    for name, model in models.items():
+        index = (indexes or {}).get(name) or build_model_index(model)
+        if any(parent not in index["by_parent"] for parent in required_parents):
+            continue
+        found = find_pattern(model, pattern, index=index, limit=limit)
+        if found:
+            results[name] = found
+    return results
+
+
+# ----------------- TESTS -----------------
+
+CONTROL_LOOP_PATTERN = {
+    "processors": [
+        {"ID": "s", "Parent": "S"},
+        {"ID": "g", "Parent": "G"},
+        {"ID": "f", "Parent": "F"}
+    ],
+    "wires": [
+        {"ID": "obs", "Parent": "Y", "Source": ["s", 0], "Destination": ["g", 0]},
+        {"ID": "act", "Parent": "U", "Source": ["g", 0], "Destination": ["f", 1]}
+    ]
+}
+
+
+def _control_loops(count):
+    """
+    Builds a model made of `count` independent plant/controller/sensor loops.
+    """
+    processors = []
+    wires = []
+    for i in range(count):
+        processors += [
+            {"ID": f"f{i}", "Parent": "F", "Ports": ["X", "U"], "Terminals": ["X"]},
+            {"ID": f"g{i}", "Parent": "G", "Ports": ["Y"], "Terminals": ["U"]},
+            {"ID": f"s{i}", "Parent": "S", "Ports": ["X"], "Terminals": ["Y"]}
+        ]
+        wires += [
+            {"ID": f"wx{i}", "Parent": "X", "Source": [f"f{i}", 0], "Destination": [f"f{i}", 0]},
+            {"ID": f"wu{i}", "Parent": "U", "Source": [f"g{i}", 0], "Destination": [f"f{i}", 1]},
+            {"ID": f"wy{i}", "Parent": "Y", "Source": [f"s{i}", 0], "Destination": [f"g{i}", 0]},
+            {"ID": f"ws{i}", "Parent": "X", "Source": [f"f{i}", 0], "Destination": [f"s{i}", 0]}
+        ]
+    return {"processors": processors, "wires": wires}
+
+
+def test_find_control_loop():
+    """
+    The sensor -> policy -> plant chain should be found once per loop.
+    """
+    model = _control_loops(1)
+    assert find_pattern(model, CONTROL_LOOP_PATTERN) == [{"s": "s0", "g": "g0", "f": "f0"}]
+
+    # Requiring the state feedback self-loop on the plant still matches.
+    with_feedback = {
+        "processors": CONTROL_LOOP_PATTERN["processors"],
+        "wires": CONTROL_LOOP_PATTERN["wires"] + [
+            {"ID": "fb", "Parent": "X", "Source": ["f", 0], "Destination": ["f", 0]}
+        ]
+    }
+    assert len(find_pattern(model, with_feedback)) == 1
+
+    # A wire of the wrong space never matches.
+    wrong_space = {
+        "processors": CONTROL_LOOP_PATTERN["processors"],
+        "wires": [{"ID": "obs", "Parent": "U", "Source": ["s", 0], "Destination": ["g", 0]}]
+    }
+    assert find_pattern(model, wrong_space) == []
+
+    # A processor given by its Ports and Terminals alone matches whatever its Parent.
+    any_parent = {
+        "processors": [
+            {"ID": "s", "Ports": ["X"], "Terminals": ["Y"]},
+            {"ID": "g", "Ports": ["Y"], "Terminals": ["U"]},
+            {"ID": "f", "Ports": ["X", "U"], "Terminals": ["X"]}
+        ],
+        "wires": CONTROL_LOOP_PATTERN["wires"]
+    }
+    assert find_pattern(model, any_parent) == [{"s": "s0", "g": "g0", "f": "f0"}]
+    any_parent["processors"][2]["Terminals"] = ["U"]
+    assert find_pattern(model, any_parent) == []
+
+
+def test_find_learner_decision_pairs():
+    """
+    Each player in the learning game has one Learner feeding one Decision.
+    """
+    model = {
+        "processors": [
+            {"ID": "alice_learner", "Parent": "Learner", "Ports": ["U", "Y", "Y"], "Terminals": ["Theta"]},
+            {"ID": "alice_decision", "Parent": "Decision", "Ports": ["Theta"], "Terminals": ["U", "Y"]},
+            {"ID": "bob_learner", "Parent": "Learner", "Ports": ["U", "Y", "Y"], "Terminals": ["Theta"]},
+            {"ID": "bob_decision", "Parent": "Decision", "Ports": ["Theta"], "Terminals": ["U", "Y"]}
+        ],
+        "wires": [
+            {"ID": "w_alice_theta", "Parent": "Theta", "Source": ["alice_learner", 0], "Destination": ["alice_decision", 0]},
+            {"ID": "w_bob_theta", "Parent": "Theta", "Source": ["bob_learner", 0], "Destination": ["bob_decision", 0]}
+        ]
+    }
+    pattern = {
+        "processors": [
+            {"ID": "l", "Parent": "Learner", "Ports": ["U", "Y", "Y"], "Terminals": ["Theta"]},
+            {"ID": "d", "Parent": "Decision"}
+        ],
+        "wires": [{"ID": "theta", "Parent": "Theta", "Source": ["l", 0], "Destination": ["d", 0]}]
+    }
+    matches = find_pattern(model, pattern)
+    assert sorted(m["l"] for m in matches) == ["alice_learner", "bob_learner"]
+    assert all(m["d"] == m["l"].replace("learner", "decision") for m in matches)
+    assert len(find_pattern(model, pattern, limit=1)) == 1
+
+
+def test_find_pattern_in_corpus():
+    """
+    Models without the pattern's Parents are skipped, the rest are searched.
+    """
+    corpus = {
+        "loops": _control_loops(3),
+        "plant_only": {"processors": [{"ID": "f", "Parent": "F", "Ports": ["X", "U"], "Terminals": ["X"]}],
+                       "wires": []}
+    }
+    results = find_pattern_in_corpus(corpus, CONTROL_LOOP_PATTERN)
+    assert list(results) == ["loops"]
+    assert len(results["loops"]) == 3
+
+
+def test_find_pattern_large_model():
+    """
+    Searching a large model only walks the neighbourhood of each candidate.
+    """
+    model = _control_loops(20000)
+    assert len(find_pattern(model, CONTROL_LOOP_PATTERN)) == 20000
+
+
+if __name__ == "__main__":
+    test_find_control_loop()
+    test_find_learner_decision_pairs()
+    test_find_pattern_in_corpus()
+    test_find_pattern_large_model()
+    print("✅ All pattern search tests passed!")
@@ -0,0 +1,465 @@
+# Queries over a block diagram model.
+# IndexedModel wraps a model and answers questions such as "all wires of space U" or
+# "all open ports of space Y" from secondary indexes instead of scanning the processor
+# and wire lists. Each index is built on first use and cached until the model changes.
+# Changes made through the mutation methods invalidate the cache themselves; after
+# editing the model dict directly, call touch().
+#
+# Queries take criteria as keyword arguments. A criterion is a single value or a
+# list/tuple/set of accepted values; all criteria must hold, and `where` adds any other
+# predicate on the record. The most selective indexed criterion picks the candidates and
+# the others are checked on each of them. Results are generators, so large answers
+# are streamed.
+
+
+class IndexedModel:
+    """
+    A block diagram model with lazily built, cached secondary indexes.
+
+    Attributes:
+        model (dict): The wrapped model (not copied).
+        version (int): Incremented on every change.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.model.setdefault("processors", [])
+        self.model.setdefault("wires", [])
+        self.version = 0
+        self._indexes = {}
+
+    # ----- indexes -----
+
+    def _index(self, name):
+        """
+        Returns an index by name, building it if the model changed since it was last built.
+        """
+        cached = self._indexes.get(name)
+        if cached is None:
+            cached = self._indexes[name] = getattr(self, f"_build_{name}")()
+        return cached
+
+    def _build_processors_by_id(self):
+        return {p["ID"]: p for p in self.model["processors"]}
+
+    def _build_wires_by_id(self):
+        return {w["ID"]: w for w in self.model["wires"]}
+
+    def _build_processors_by_parent(self):
+        index = {}
+        for proc in self.model["processors"]:
+            index.setdefault(proc.get("Parent"), []).append(proc)
+        return index
+
+    def _build_wires_by_space(self):
+        index = {}
+        for wire in self.model["wires"]:
+            index.setdefault(wire.get("Parent"), []).append(wire)
+        return index
+
+    def _build_wires_by_source(self):
+        index = {}
+        for wire in self.model["wires"]:
+            index.setdefault(wire["Source"][0], []).append(wire)
+        return index
+
+    def _build_wires_by_destination(self):
+        index = {}
+        for wire in self.model["wires"]:
+            index.setdefault(wire["Destination"][0], []).append(wire)
+        return index
+
+    def _build_endpoints(self):
+        """
+        Ports and terminals by space and by open/closed status:
+        {"ports": {(space, is_open): [(processor_id, index)]}, "terminals": {...}}.
+        """
+        fed = {tuple(w["Destination"]) for w in self.model["wires"]}
+        used = {tuple(w["Source"]) for w in self.model["wires"]}
+        index = {"ports": {}, "terminals": {}}
+        for proc in self.model["processors"]:
+            for kind, spaces, connected in (("ports", proc.get("Ports", []), fed),
+                                            ("terminals", proc.get("Terminals", []), used)):
+                for i, space in enumerate(spaces):
+                    key = (proc["ID"], i)
+                    index[kind].setdefault((space, key not in connected), []).append(key)
+        return index
+
+    def touch(self):
+        """
+        Marks the model as changed, dropping every cached index.
+        """
+        self.version += 1
+        self._indexes.clear()
+
+    def _appended(self, entries):
+        """
+        Records an appended record: the cached indexes listed in `entries` (name -> (key, record))
+        are extended in place, so adding records one by one stays linear. The open/closed
+        status of endpoints may change, so that index is dropped.
+        """
+        self.version += 1
+        self._indexes.pop("endpoints", None)
+        for name, (key, record) in entries.items():
+            index = self._indexes.get(name)
+            if index is None:
+                continue
+            if name.endswith("_by_id"):
+                index[key] = record
+            else:
+                index.setdefault(key, []).append(record)
+
+    # ----- mutation -----
+
+    def add_processor(self, proc):
+        """
+        Appends a processor.
+
+        Raises:
+            ValueError: If a processor with the same ID exists.
+        """
+        if proc["ID"] in self._index("processors_by_id"):
+            raise ValueError(f"Processor '{proc['ID']}' already exists.")
+        self.model["processors"].append(proc)
+        self._appended({"processors_by_id": (proc["ID"], proc), "processors_by_parent": (proc.get("Parent"), proc)})
+
+    def add_wire(self, wire):
+        """
+        Appends a wire.
+
+        Raises:
+            ValueError: If a wire with the same ID exists.
+        """
+        if wire["ID"] in self._index("wires_by_id"):
+            raise ValueError(f"Wire '{wire['ID']}' already exists.")
+        self.model["wires"].append(wire)
+        self._appended({"wires_by_id": (wire["ID"], wire), "wires_by_space": (wire.get("Parent"), wire),
+                        "wires_by_source": (wire["Source"][0], wire),
+                        "wires_by_destination": (wire["Destination"][0], wire)})
+
+    def remove_wire(self, wire_id):
+        """
+        Removes a wire and returns it.
+
+        Raises:
+            ValueError: If there is no such wire.
+        """
+        wire = self._index("wires_by_id").get(wire_id)
+        if wire is None:
+            raise ValueError(f"No wire '{wire_id}'.")
+        self.model["wires"] = [w for w in self.model["wires"] if w is not wire]
+        self.touch()
+        return wire
+
+    def remove_processor(self, proc_id):
+        """
+        Removes a processor together with the wires attached to it.
+
+        Returns:
+            tuple: (removed processor, list of removed wires)
+
+        Raises:
+            ValueError: If there is no such processor.
+        """
+        proc = self._index("processors_by_id").get(proc_id)
+        if proc is None:
+            raise ValueError(f"No processor '{proc_id}'.")
+        attached = [w for w in self.model["wires"] if w["Source"][0] == proc_id or w["Destination"][0] == proc_id]
+        attached_ids = {id(w) for w in attached}
+        self.model["processors"] = [p for p in self.model["processors"] if p is not proc]
+        self.model["wires"] = [w for w in self.model["wires"] if id(w) not in attached_ids]
+        self.touch()
+        return proc, attached
+
+    def update_processor(self, proc_id, **fields):
+        """
+        Sets fields of a processor (e.g. Parent="G", Ports=[...]). The ID cannot change.
+
+        Raises:
+            ValueError: If there is no such processor, or the ID would change.
+        """
+        proc = self._index("processors_by_id").get(proc_id)
+        if proc is None:
+            raise ValueError(f"No processor '{proc_id}'.")
+        if fields.get("ID", proc_id) != proc_id:
+            raise ValueError("Processor IDs cannot be changed.")
+        proc.update(fields)
+        self.touch()
+
+    def update_wire(self, wire_id, **fields):
+        """
+        Sets fields of a wire (e.g. Parent="U", Destination=[...]). The ID cannot change.
+
+        Raises:
+            ValueError: If there is no such wire, or the ID would change.
+        """
+        wire = self._index("wires_by_id").get(wire_id)
+        if wire is None:
+            raise ValueError(f"No wire '{wire_id}'.")
+        if fields.get("ID", wire_id) != wire_id:
+            raise ValueError("Wire IDs cannot be changed.")
+        wire.update(fields)
+        self.touch()
+
+    # ----- queries -----
+
+    def processor(self, proc_id):
+        """
+        Returns the processor with this ID, or None.
+        """
+        return self._index("processors_by_id").get(proc_id)
+
+    def wire(self, wire_id):
+        """
+        Returns the wire with this ID, or None.
+        """
+        return self._index("wires_by_id").get(wire_id)
+
+    def processors(self, parent=None, where=None):
+        """
+        Yields processors.
+
+        Args:
+            parent: Parent block ID(s) to accept.
+            where (callable): Extra predicate on the processor record.
+        """
+        if parent is None:
+            candidates = [self.model["processors"]]
+        else:
+            index = self._index("processors_by_parent")
+            candidates = [index.get(value, []) for value in _values(parent)]
+        return self._stream(candidates, [where] if where else [])
+
+    def wires(self, space=None, source=None, destination=None, where=None):
+        """
+        Yields wires.
+
+        Args:
+            space: Space ID(s) (the wire's Parent) to accept.
+            source: Source processor ID(s) to accept.
+            destination: Destination processor ID(s) to accept.
+            where (callable): Extra predicate on the wire record.
+        """
+        criteria = [
+            ("wires_by_space", space, lambda w, accepted: w.get("Parent") in accepted),
+            ("wires_by_source", source, lambda w, accepted: w["Source"][0] in accepted),
+            ("wires_by_destination", destination, lambda w, accepted: w["Destination"][0] in accepted),
+        ]
+        return self._select(self.model["wires"], criteria, where)
+
+    def ports(self, space=None, open=None, processor=None):
+        """
+        Yields (processor_id, port_index) of ports.
+
+        Args:
+            space: Space ID(s) to accept.
+            open (bool): True for ports no wire enters, False for wired ports, None for both.
+            processor: Processor ID(s) to accept.
+        """
+        return self._endpoints("ports", space, open, processor)
+
+    def terminals(self, space=None, open=None, processor=None):
+        """
+        Yields (processor_id, terminal_index) of terminals.
+
+        Args:
+            space: Space ID(s) to accept.
+            open (bool): True for terminals no wire leaves, False for used terminals, None for both.
+            processor: Processor ID(s) to accept.
+        """
+        return self._endpoints("terminals", space, open, processor)
+
+    def _endpoints(self, kind, space, is_open, processor):
+        index = self._index("endpoints")[kind]
+        accepted_spaces = None if space is None else set(_values(space))
+        statuses = (True, False) if is_open is None else (bool(is_open),)
+        candidates = [keys for (key_space, status), keys in index.items()
+                      if status in statuses and (accepted_spaces is None or key_space in accepted_spaces)]
+        predicates = []
+        if processor is not None:
+            accepted = set(_values(processor))
+            predicates.append(lambda key: key[0] in accepted)
+        return self._stream(candidates, predicates)
+
+    def _select(self, records, criteria, where):
+        """
+        Picks candidates from the most selective indexed criterion and filters them by the rest.
+        """
+        best = None
+        predicates = []
+        for name, value, predicate in criteria:
+            if value is None:
+                continue
+            accepted = set(_values(value))
+            index = self._index(name)
+            lists = [index.get(v, []) for v in accepted]
+            size = sum(len(items) for items in lists)
+            if best is None or size < best[0]:
+                if best is not None:
+                    predicates.append(best[2])
+                best = (size, lists, _bind(predicate, accepted))
+            else:
+                predicates.append(_bind(predicate, accepted))
+        if where is not None:
+            predicates.append(where)
+        return self._stream([records] if best is None else best[1], predicates)
+
+    def _stream(self, candidate_lists, predicates):
+        """
+        Yields the candidates passing every predicate.
+
+        Raises:
+            RuntimeError: If the model changes during the iteration.
+        """
+        version = self.version
+        for candidates in candidate_lists:
+            for item in candidates:
+                if self.version != version:
+                    raise RuntimeError("Model changed during iteration.")
+                if all(predicate(item) for predicate in predicates):
+                    yield item
+
+
+def _values(value):
+    """
+    Turns a criterion into the collection of accepted values.
+    """
+    return value if isinstance(value, (list, tuple, set, frozenset)) else [value]
+
+
+def _bind(predicate, accepted):
+    """
+    Fixes the accepted values of a two-argument predicate.
+    """
+    return lambda record: predicate(record, accepted)
+
+
+# ----------------- TESTS -----------------
+
+import json
+import time
+
+
+def _learning_game():
+    """
+    Loads the dynamic game with learning from the models directory.
+    """
+    with open("models/dynamic_game_with_learning.json", "r") as file:
+        return IndexedModel(json.load(file))
+
+
+def test_queries():
+    """
+    The questions from the issue, answered from the indexes.
+    """
+    model = _learning_game()
+    assert sorted(w["ID"] for w in model.wires(space="U")) == [
+        "w_alice_action", "w_alice_action_feedback", "w_bob_action", "w_bob_action_feedback"]
+    assert [p["ID"] for p in model.processors(parent="Learner")] == ["alice_learner", "bob_learner"]
+    assert [w["ID"] for w in model.wires(source="alice_decision")] == [
+        "w_alice_action", "w_alice_expected_payoff", "w_alice_action_feedback"]
+    # The game is closed: every port is fed and every terminal is used.
+    assert list(model.ports(space="Y", open=True)) == []
+    assert list(model.terminals(open=True)) == []
+    assert len(list(model.ports(open=False))) == 16
+
+
+def test_composed_filters():
+    """
+    Criteria combine with each other, with several accepted values and with `where`.
+    """
+    model = _learning_game()
+    wires = model.wires(space=["U", "Y"], source="alice_decision", destination="alice_learner")
+    assert sorted(w["ID"] for w in wires) == ["w_alice_action_feedback", "w_alice_expected_payoff"]
+    wires = model.wires(space="X", where=lambda w: w["Source"][0] == w["Destination"][0])
+    assert [w["ID"] for w in wires] == ["alice_feedback_wire", "bob_feedback_wire"]
+    assert list(model.ports(space="Y", processor="bob_learner")) == [("bob_learner", 1), ("bob_learner", 2)]
+    assert list(model.processors(parent=["F", "A"], where=lambda p: p["ID"].startswith("bob"))) == \
+        [model.processor("bob_dynamics")]
+
+
+def test_mutation_invalidates_indexes():
+    """
+    Indexes follow changes made through the mutation methods and touch().
+    """
+    model = _learning_game()
+    assert list(model.ports(space="Y", open=True)) == []
+    model.remove_wire("w_bob_payoff")
+    assert list(model.ports(space="Y", open=True)) == [("bob_learner", 2)]
+    assert ("bob_sensor", 0) in set(model.terminals(space="Y", open=True))
+
+    assert model.processor("carol_learner") is None
+    model.add_processor({"ID": "carol_learner", "Parent": "Learner", "Ports": ["U", "Y", "Y"], "Terminals": ["Theta"]})
+    assert [p["ID"] for p in model.processors(parent="Learner")][-1] == "carol_learner"
+    model.add_wire({"ID": "w_carol", "Parent": "Y", "Source": ["bob_sensor", 0], "Destination": ["carol_learner", 1]})
+    assert [w["ID"] for w in model.wires(destination="carol_learner")] == ["w_carol"]
+
+    model.update_wire("w_carol", Parent="U")
+    assert "w_carol" in {w["ID"] for w in model.wires(space="U")}
+    removed, attached = model.remove_processor("carol_learner")
+    assert [w["ID"] for w in attached] == ["w_carol"] and model.wire("w_carol") is None
+
+    model.model["processors"][0]["Parent"] = "G"
+    model.touch()
+    assert model.processor("alice_dynamics") in list(model.processors(parent="G"))
+
+    try:
+        model.add_wire({"ID": "w_alice_theta", "Parent": "Theta", "Source": ["x", 0], "Destination": ["y", 0]})
+    except ValueError as error:
+        assert "already exists" in str(error)
+    else:
+        assert False, "Duplicate wire IDs should be rejected"
+
+
+def test_iteration_is_lazy_and_guarded():
+    """
+    Results stream, and changing the model while iterating is an error.
+    """
+    model = _learning_game()
+    results = model.wires(space="X")
+    first = next(results)
+    assert first["ID"] == "alice_feedback_wire"
+    model.remove_wire("bob_feedback_wire")
+    try:
+        next(results)
+    except RuntimeError as error:
+        assert "changed" in str(error)
+    else:
+        assert False, "Mutation during iteration should be detected"
+
+
+def test_indexed_queries_are_fast():
+    """
+    On 20000 processors, repeated queries for one source beat a linear scan.
+    """
+    processors = [{"ID": f"p{i}", "Parent": "S", "Ports": ["X"], "Terminals": ["Y"]} for i in range(20000)]
+    wires = [{"ID": f"w{i}", "Parent": "Y", "Source": [f"p{i}", 0], "Destination": [f"p{(i + 1) % 20000}", 0]}
+             for i in range(20000)]
+    model = IndexedModel({"processors": processors, "wires": wires})
+    start = time.perf_counter()
+    for i in range(0, 20000, 100):
+        assert [w["ID"] for w in model.wires(source=f"p{i}", space="Y")] == [f"w{i}"]
+    indexed = time.perf_counter() - start
+    start = time.perf_counter()
+    for i in range(0, 20000, 100):
+        assert [w["ID"] for w in wires if w["Source"][0] == f"p{i}" and w["Parent"] == "Y"] == [f"w{i}"]
+    scanned = time.perf_counter() - start
+    assert indexed < scanned, f"Indexed {indexed:.3f}s vs scan {scanned:.3f}s"
+
+    # Appending keeps the ID indexes up to date instead of rebuilding them for every record.
+    start = time.perf_counter()
+    grown = IndexedModel({})
+    for proc, wire in zip(processors, wires):
+        grown.add_processor(proc)
+        grown.add_wire(wire)
+    assert time.perf_counter() - start < 1.0
+    assert len(list(grown.wires(destination="p0"))) == 1
+
+
+if __name__ == "__main__":
+    test_queries()
+    test_composed_filters()
+    test_mutation_invalidates_indexes()
+    test_iteration_is_lazy_and_guarded()
+    test_indexed_queries_are_fast()
+    print("✅ All query tests passed!")
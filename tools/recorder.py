@@ -0,0 +1,384 @@
+# Recording wire values over long runs.
+# WireRecorder keeps the value of selected wires at every (or every n-th) step in fixed-width
+# columns, chunk by chunk. A chunk is one memory-mapped file holding one contiguous column
+# per wire (chunk_steps rows of the wire's shape and dtype, aligned as in buffers.py), so
+# memory use does not grow with the length of the run. Finished chunks can be compressed
+# (one .npz per chunk, one member per wire). A "recording.json" file describes the wires
+# and the chunks, and is rewritten after every chunk, so a recording can be read while the
+# run goes on.
+#
+# Wires are scalar float64 unless the component library declares a Shape/Dtype for their
+# space (see buffers.space_layouts) or `layouts` says otherwise. Missing values (None, e.g.
+# a feedback wire on the first step) are recorded as NaN, or 0 for integer and bool dtypes.
+#
+# RecordingReader returns the values of a wire over a window of steps. A window inside one
+# uncompressed chunk is a read-only view of the memory-mapped file; longer windows are
+# assembled from the chunks they cover only. iter_chunks yields one view per chunk instead.
+
+import json
+import os
+
+import numpy as np
+
+from tools.buffers import ALIGNMENT, space_layouts
+
+METADATA = "recording.json"
+
+
+def _aligned(nbytes):
+    """
+    Rounds a byte count up to the next multiple of ALIGNMENT.
+    """
+    return -(-nbytes // ALIGNMENT) * ALIGNMENT
+
+
+class WireRecorder:
+    """
+    Records wire values step by step into chunked, memory-mapped column files.
+
+    Args:
+        directory (str): Where the recording goes (created if needed; must not hold one already).
+        model (dict): The model whose wires are recorded.
+        wires (list): IDs of the wires to record (default: every wire, in model order).
+        every (int): Record one step out of `every` (steps 0, every, 2 * every, ...).
+        chunk_steps (int): Recorded steps per chunk file.
+        compress (bool): Compress every chunk once it is finished.
+        library (dict): Component library whose space shapes and dtypes apply to the wires.
+        layouts (dict): wire ID -> {"Shape": tuple, "Dtype": dtype}, overriding the library.
+
+    Raises:
+        ValueError: If a wire is unknown, every or chunk_steps is not positive, or the
+                    directory already holds a recording.
+    """
+
+    def __init__(self, directory, model, wires=None, every=1, chunk_steps=4096, compress=False,
+                 library=None, layouts=None):
+        if every < 1 or chunk_steps < 1:
+            raise ValueError("every and chunk_steps must be positive.")
+        all_wires = [w["ID"] for w in model.get("wires", [])]
+        wires = list(all_wires if wires is None else wires)
+        parents = {w["ID"]: w.get("Parent") for w in model.get("wires", [])}
+        unknown = [wire_id for wire_id in wires if wire_id not in parents]
+        if unknown:
+            raise ValueError(f"Unknown wires: {unknown}")
+        os.makedirs(directory, exist_ok=True)
+        if os.path.exists(os.path.join(directory, METADATA)):
+            raise ValueError(f"'{directory}' already holds a recording.")
+
+        spaces = space_layouts(library or {})
+        layouts = layouts or {}
+        self.directory = directory
+        self.every = every
+        self.chunk_steps = chunk_steps
+        self.compress = compress
+        self.wires = []
+        offset = 0
+        for wire_id in wires:
+            declared = layouts.get(wire_id) or spaces.get(parents[wire_id]) or {}
+            shape = tuple(declared.get("Shape") or ())
+            dtype = np.dtype(declared.get("Dtype") or np.float64)
+            width = int(np.prod(shape, dtype=np.int64)) * dtype.itemsize
+            self.wires.append({"ID": wire_id, "Shape": list(shape), "Dtype": dtype.str, "Offset": offset})
+            offset += _aligned(chunk_steps * width)
+        self.chunk_bytes = offset
+        self.chunks = []
+        self.step = 0
+        self.samples = 0
+        self._position = {wire_id: i for i, wire_id in enumerate(all_wires)}
+        self._fill = [np.nan if np.dtype(w["Dtype"]).kind in "fc" else 0 for w in self.wires]
+        self._file = None
+        self._columns = None
+        self._row = 0
+        self._write_metadata()
+
+    def _open_chunk(self):
+        """
+        Creates the file of the next chunk and maps every wire's column in it.
+        """
+        name = f"chunk_{len(self.chunks):06d}.bin"
+        self._file = np.memmap(os.path.join(self.directory, name), dtype=np.uint8, mode="w+",
+                               shape=(max(1, self.chunk_bytes),))
+        self._columns = [np.ndarray((self.chunk_steps, *w["Shape"]), dtype=np.dtype(w["Dtype"]), buffer=self._file,
+                                    offset=w["Offset"]) for w in self.wires]
+        self.chunks.append({"File": name, "Samples": 0, "Compressed": False})
+        self._row = 0
+
+    def _finish_chunk(self):
+        """
+        Flushes the current chunk, compressing it if asked.
+        """
+        chunk = self.chunks[-1]
+        chunk["Samples"] = self._row
+        self._file.flush()
+        if self.compress:
+            name = chunk["File"][:-len(".bin")] + ".npz"
+            np.savez_compressed(os.path.join(self.directory, name),
+                                **{f"w{i}": column[:self._row] for i, column in enumerate(self._columns)})
+            os.remove(os.path.join(self.directory, chunk["File"]))
+            chunk.update(File=name, Compressed=True)
+        self._file = self._columns = None
+        self._write_metadata()
+
+    def _write_metadata(self):
+        """
+        Rewrites the description of the recording.
+        """
+        metadata = {"Wires": self.wires, "Every": self.every, "ChunkSteps": self.chunk_steps,
+                    "ChunkBytes": self.chunk_bytes, "Samples": self.samples, "Chunks": self.chunks}
+        path = os.path.join(self.directory, METADATA)
+        with open(path + ".tmp", "w") as file:
+            json.dump(metadata, file, indent=1)
+        os.replace(path + ".tmp", path)
+
+    def record(self, values):
+        """
+        Records one step.
+
+        Args:
+            values: The wire values of the step, as a dict (wire ID -> value, as returned by
+                    step_model) or a sequence in model wire order (as a compiled step returns).
+        """
+        step = self.step
+        self.step += 1
+        if step % self.every:
+            return
+        if self._columns is None:
+            self._open_chunk()
+        row = self._row
+        by_id = isinstance(values, dict)
+        for column, wire, fill in zip(self._columns, self.wires, self._fill):
+            value = values.get(wire["ID"]) if by_id else values[self._position[wire["ID"]]]
+            column[row] = fill if value is None else value
+        self._row += 1
+        self.samples += 1
+        self.chunks[-1]["Samples"] = self._row
+        if self._row == self.chunk_steps:
+            self._finish_chunk()
+
+    def close(self):
+        """
+        Finishes the last chunk and the description of the recording.
+        """
+        if self._columns is not None:
+            self._finish_chunk()
+        else:
+            self._write_metadata()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class RecordingReader:
+    """
+    Reads a recording made by WireRecorder.
+
+    Attributes:
+        wires (list): Recorded wire IDs.
+        every (int): Steps between recorded samples.
+        samples (int): Number of recorded samples.
+    """
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, METADATA), "r") as file:
+            metadata = json.load(file)
+        self.directory = directory
+        self.every = metadata["Every"]
+        self.samples = metadata["Samples"]
+        self._chunk_steps = metadata["ChunkSteps"]
+        self._chunks = metadata["Chunks"]
+        self._wires = {w["ID"]: (i, w) for i, w in enumerate(metadata["Wires"])}
+        self.wires = list(self._wires)
+        self._maps = {}
+
+    def steps(self, start=0, stop=None):
+        """
+        Returns the step numbers of the samples in the window [start, stop) of steps.
+        """
+        first, last = self._sample_range(start, stop)
+        return np.arange(first, last) * self.every
+
+    def _sample_range(self, start, stop):
+        """
+        Converts a window of steps into a range of sample numbers.
+        """
+        end = self.samples if stop is None else min(self.samples, -(-stop // self.every))
+        return min(-(-max(start, 0) // self.every), end), end
+
+    def _column(self, wire_id, chunk_number):
+        """
+        Returns a wire's column in one chunk: a view of the mapped file, or the decompressed
+        member of the .npz file.
+
+        Raises:
+            KeyError: If the wire was not recorded.
+        """
+        index, wire = self._wires[wire_id]
+        chunk = self._chunks[chunk_number]
+        path = os.path.join(self.directory, chunk["File"])
+        if chunk["Compressed"]:
+            with np.load(path) as archive:
+                return archive[f"w{index}"]
+        mapped = self._maps.get(chunk_number)
+        if mapped is None:
+            mapped = self._maps[chunk_number] = np.memmap(path, dtype=np.uint8, mode="r")
+        return np.ndarray((chunk["Samples"], *wire["Shape"]), dtype=np.dtype(wire["Dtype"]), buffer=mapped,
+                          offset=wire["Offset"])
+
+    def iter_chunks(self, wire_id, start=0, stop=None):
+        """
+        Yields the values of a wire over the window [start, stop) of steps, one chunk at a time.
+
+        Yields:
+            tuple: (step of the first value, array of values), a view for uncompressed chunks.
+        """
+        first, end = self._sample_range(start, stop)
+        while first < end:
+            chunk_number, row = divmod(first, self._chunk_steps)
+            count = min(end - first, self._chunk_steps - row)
+            yield first * self.every, self._column(wire_id, chunk_number)[row:row + count]
+            first += count
+
+    def read(self, wire_id, start=0, stop=None):
+        """
+        Returns the values of a wire over the window [start, stop) of steps.
+
+        Returns:
+            np.ndarray: One row per recorded step in the window (see steps()). A window
+                        within one uncompressed chunk is a read-only view of the file.
+
+        Raises:
+            KeyError: If the wire was not recorded.
+        """
+        index, wire = self._wires[wire_id]
+        parts = [values for _, values in self.iter_chunks(wire_id, start, stop)]
+        if len(parts) == 1:
+            return parts[0]
+        if not parts:
+            return np.empty((0, *wire["Shape"]), dtype=np.dtype(wire["Dtype"]))
+        return np.concatenate(parts)
+
+
+# ----------------- TESTS -----------------
+
+import tempfile
+import tracemalloc
+
+from tools.compiler import compile_model, input_slots, state_slots
+from tools.execution import CONTROL_BEHAVIORS, step_model
+
+
+def _load(name):
+    with open(os.path.join("models", name), "r") as file:
+        return json.load(file)
+
+
+GAME_BEHAVIORS = {
+    "F": lambda x, u: (0.5 * (x or 0.0) + (u or 0.0),),
+    "A": lambda x1, x2: (((x1 or 0.0) + (x2 or 0.0)) / 2,),
+    "S": lambda x: ((x or 0.0) + 0.1,),
+    "Learner": lambda u, expected, observed: ((expected or 0.0) + 0.5 * ((observed or 0.0) - (expected or 0.0)),),
+    "Decision": lambda theta: (-0.1 * (theta or 0.0), theta or 0.0),
+}
+
+
+def test_records_every_wire_and_reads_windows():
+    """
+    Step_model values come back exactly, across chunk boundaries, with views inside chunks.
+    """
+    model = _load("dynamic_game_with_learning.json")
+    history = []
+    state = {}
+    with tempfile.TemporaryDirectory() as directory:
+        with WireRecorder(directory, model, chunk_steps=64) as recorder:
+            for _ in range(300):
+                values, state = step_model(model, GAME_BEHAVIORS, state=state)
+                history.append(values)
+                recorder.record(values)
+            assert recorder.samples == 300 and len(recorder.chunks) == 5
+
+        reader = RecordingReader(directory)
+        assert reader.wires == [w["ID"] for w in model["wires"]]
+        for wire_id in reader.wires:
+            expected = np.array([np.nan if h[wire_id] is None else h[wire_id] for h in history])
+            assert np.array_equal(reader.read(wire_id), expected, equal_nan=True)
+
+        wire_id = reader.wires[0]
+        window = reader.read(wire_id, 70, 120)
+        assert not window.flags.owndata and not window.flags.writeable and len(window) == 50
+        assert [start for start, _ in reader.iter_chunks(wire_id, 60, 200)] == [60, 64, 128, 192]
+        assert np.array_equal(reader.steps(298, 400), [298, 299])
+
+
+def test_subset_downsampling_and_compression():
+    """
+    Only the chosen wires are kept, one step in five, in compressed chunks.
+    """
+    model = _load("control_loop_model.json")
+    compiled = compile_model(model, CONTROL_BEHAVIORS)
+    layout = compiled["layout"]
+    slots, args = state_slots(layout), input_slots(layout)
+    with tempfile.TemporaryDirectory() as directory:
+        recorder = WireRecorder(directory, model, wires=["wrefY1", "wrefU1"], every=5, chunk_steps=10, compress=True)
+        history = []
+        for _ in range(233):
+            values = compiled["step"](slots, args)
+            history.append(values)
+            recorder.record(values)
+        recorder.close()
+        assert sorted(os.listdir(directory)) == [f"chunk_{k:06d}.npz" for k in range(5)] + [METADATA]
+
+        reader = RecordingReader(directory)
+        assert reader.wires == ["wrefY1", "wrefU1"] and reader.samples == 47
+        position = layout["wires"].index("wrefU1")
+        assert np.array_equal(reader.read("wrefU1"), [history[s][position] for s in range(0, 233, 5)])
+        assert np.array_equal(reader.steps(12, 31), [15, 20, 25, 30])
+        assert np.array_equal(reader.read("wrefU1", 12, 31), [history[s][position] for s in (15, 20, 25, 30)])
+        try:
+            reader.read("wrefX1")
+        except KeyError:
+            pass
+        else:
+            assert False, "wrefX1 was not recorded"
+
+
+def test_shaped_wires_and_bounded_memory():
+    """
+    Library shapes give fixed-width columns, and memory does not grow with the run.
+    """
+    model = _load("control_loop_model.json")
+    library = {"spaces": [{"ID": "X", "Name": "state", "Shape": [2], "Dtype": "float64"}]}
+    with tempfile.TemporaryDirectory() as directory:
+        recorder = WireRecorder(directory, model, wires=["wrefX1", "wrefU1"], chunk_steps=1000, library=library,
+                                layouts={"wrefU1": {"Shape": (), "Dtype": "int32"}})
+        x = np.array([1.0, -1.0])
+        values = {"wrefX1": x, "wrefU1": 3}
+        tracemalloc.start()
+        for step in range(20000):
+            x[0] = step
+            recorder.record(values)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        recorder.close()
+        assert peak < 200_000, f"Peak {peak} bytes"
+
+        reader = RecordingReader(directory)
+        states = reader.read("wrefX1", 19990)
+        assert states.shape == (10, 2) and states.dtype == np.float64
+        assert np.array_equal(states[:, 0], np.arange(19990, 20000)) and (states[:, 1] == -1).all()
+        assert reader.read("wrefU1").dtype == np.int32 and reader.read("wrefU1").sum() == 60000
+        try:
+            WireRecorder(directory, model)
+        except ValueError:
+            pass
+        else:
+            assert False, "Expected a ValueError"
+
+
+if __name__ == "__main__":
+    test_records_every_wire_and_reads_windows()
+    test_subset_downsampling_and_compression()
+    test_shaped_wires_and_bounded_memory()
+    print("✅ All recorder tests passed!")
@@ -0,0 +1,461 @@
+# A SQLite store for models and the component library.
+# Models are split into processor, port, terminal and wire rows, with indexes on Parent,
+# space and endpoints, so searches across many models run in SQL instead of loading every
+# JSON file. Each record also keeps its full JSON, so export gives back the current JSON
+# schema, including any optional fields.
+#
+# Validation results are stored next to the models, keyed by the content hash of the model
+# (and of the block, for block checks). They are only recomputed after that content changes.
+
+import hashlib
+import json
+import os
+import sqlite3
+
+from tools.indexing import build_model_index, subset_satisfies_block
+from tools.validations import get_ports_and_terminals
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS models (
+    name TEXT PRIMARY KEY,
+    hash TEXT NOT NULL,
+    extra TEXT NOT NULL                -- top-level keys other than processors and wires
+);
+CREATE TABLE IF NOT EXISTS processors (
+    model TEXT NOT NULL REFERENCES models(name) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    id TEXT NOT NULL,
+    parent TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (model, id)
+);
+CREATE INDEX IF NOT EXISTS processors_by_parent ON processors(parent);
+CREATE TABLE IF NOT EXISTS ports (
+    model TEXT NOT NULL REFERENCES models(name) ON DELETE CASCADE,
+    processor TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    space TEXT,
+    is_open INTEGER NOT NULL,
+    PRIMARY KEY (model, processor, idx)
+);
+CREATE INDEX IF NOT EXISTS ports_by_space ON ports(space, is_open);
+CREATE TABLE IF NOT EXISTS terminals (
+    model TEXT NOT NULL REFERENCES models(name) ON DELETE CASCADE,
+    processor TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    space TEXT,
+    is_open INTEGER NOT NULL,
+    PRIMARY KEY (model, processor, idx)
+);
+CREATE INDEX IF NOT EXISTS terminals_by_space ON terminals(space, is_open);
+CREATE TABLE IF NOT EXISTS wires (
+    model TEXT NOT NULL REFERENCES models(name) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    id TEXT NOT NULL,
+    space TEXT,
+    source TEXT NOT NULL,
+    source_idx INTEGER NOT NULL,
+    destination TEXT NOT NULL,
+    destination_idx INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (model, id)
+);
+CREATE INDEX IF NOT EXISTS wires_by_space ON wires(space);
+CREATE INDEX IF NOT EXISTS wires_by_source ON wires(source, source_idx);
+CREATE INDEX IF NOT EXISTS wires_by_destination ON wires(destination, destination_idx);
+CREATE TABLE IF NOT EXISTS spaces (
+    position INTEGER NOT NULL,
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS blocks (
+    position INTEGER NOT NULL,
+    id TEXT PRIMARY KEY,
+    hash TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS validations (
+    model TEXT NOT NULL REFERENCES models(name) ON DELETE CASCADE,
+    check_name TEXT NOT NULL,
+    subject TEXT NOT NULL,             -- block ID for block checks, '' otherwise
+    model_hash TEXT NOT NULL,
+    subject_hash TEXT NOT NULL,
+    result TEXT NOT NULL,
+    PRIMARY KEY (model, check_name, subject)
+);
+"""
+
+
+def _hash(record):
+    """
+    Hashes a JSON record independently of key order.
+    """
+    return hashlib.sha256(json.dumps(record, sort_keys=True).encode()).hexdigest()
+
+
+def _is_closed_loop(model, block):
+    """
+    Same answer as is_closed_loop, without its printing.
+    """
+    return not get_ports_and_terminals(model, output_style="basic")["open_ports"]
+
+
+def _satisfies_block(output_style):
+    """
+    Block check of the whole model, as validate_model_satisfies_block ("effective") or
+    model_satisfies_block ("basic") would answer it, without their printing.
+    """
+    def check(model, block):
+        index = build_model_index(model)
+        return subset_satisfies_block(index, index["processors"], block, output_style=output_style)
+    return check
+
+
+# Checks whose results are stored: name -> (function(model, block) -> JSON value, needs a block).
+CHECKS = {
+    "closed_loop": (_is_closed_loop, False),
+    "satisfies_block": (_satisfies_block("effective"), True),
+    "satisfies_block_basic": (_satisfies_block("basic"), True),
+}
+
+
+def open_repository(path=":memory:"):
+    """
+    Opens (or creates) a repository database.
+
+    Returns:
+        sqlite3.Connection: The connection, with the schema in place.
+    """
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def import_model(conn, name, model):
+    """
+    Stores a model, replacing any model with the same name. Stored validation results stay
+    valid if the content did not change.
+    """
+    import_models(conn, {name: model})
+
+
+def import_models(conn, models):
+    """
+    Stores several models in one transaction.
+
+    Args:
+        conn (sqlite3.Connection): The repository.
+        models (dict): model name -> model.
+    """
+    with conn:
+        for name, model in models.items():
+            digest = _hash(model)
+            row = conn.execute("SELECT hash FROM models WHERE name = ?", (name,)).fetchone()
+            if row is not None and row[0] == digest:
+                continue
+            conn.execute("DELETE FROM models WHERE name = ?", (name,))
+            extra = {key: value for key, value in model.items() if key not in ("processors", "wires")}
+            conn.execute("INSERT INTO models VALUES (?, ?, ?)", (name, digest, json.dumps(extra)))
+
+            wires = model.get("wires", [])
+            fed = {tuple(w["Destination"]) for w in wires}
+            used = {tuple(w["Source"]) for w in wires}
+            processors, ports, terminals = [], [], []
+            for position, proc in enumerate(model.get("processors", [])):
+                processors.append((name, position, proc["ID"], proc.get("Parent"), json.dumps(proc)))
+                for i, space in enumerate(proc.get("Ports", [])):
+                    ports.append((name, proc["ID"], i, space, int((proc["ID"], i) not in fed)))
+                for i, space in enumerate(proc.get("Terminals", [])):
+                    terminals.append((name, proc["ID"], i, space, int((proc["ID"], i) not in used)))
+            conn.executemany("INSERT INTO processors VALUES (?, ?, ?, ?, ?)", processors)
+            conn.executemany("INSERT INTO ports VALUES (?, ?, ?, ?, ?)", ports)
+            conn.executemany("INSERT INTO terminals VALUES (?, ?, ?, ?, ?)", terminals)
+            conn.executemany("INSERT INTO wires VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", [
+                (name, position, w["ID"], w.get("Parent"), w["Source"][0], w["Source"][1],
+                 w["Destination"][0], w["Destination"][1], json.dumps(w))
+                for position, w in enumerate(wires)
+            ])
+
+
+def import_library(conn, library):
+    """
+    Replaces the stored component library (spaces and blocks).
+    """
+    with conn:
+        conn.execute("DELETE FROM spaces")
+        conn.execute("DELETE FROM blocks")
+        conn.executemany("INSERT INTO spaces VALUES (?, ?, ?)",
+                         [(i, s["ID"], json.dumps(s)) for i, s in enumerate(library.get("spaces", []))])
+        conn.executemany("INSERT INTO blocks VALUES (?, ?, ?, ?)",
+                         [(i, b["ID"], _hash(b), json.dumps(b)) for i, b in enumerate(library.get("blocks", []))])
+
+
+def import_directory(conn, models_dir, library_path=None):
+    """
+    Imports every JSON model in a directory (named after its file) and, optionally, a library file.
+    """
+    models = {}
+    for filename in sorted(os.listdir(models_dir)):
+        if filename.endswith(".json"):
+            with open(os.path.join(models_dir, filename), "r") as file:
+                models[filename[:-len(".json")]] = json.load(file)
+    import_models(conn, models)
+    if library_path is not None:
+        with open(library_path, "r") as file:
+            import_library(conn, json.load(file))
+
+
+def model_names(conn):
+    """
+    Returns the names of the stored models, sorted.
+    """
+    return [row[0] for row in conn.execute("SELECT name FROM models ORDER BY name")]
+
+
+def export_model(conn, name):
+    """
+    Rebuilds a stored model in the JSON schema.
+
+    Raises:
+        ValueError: If there is no such model.
+    """
+    row = conn.execute("SELECT extra FROM models WHERE name = ?", (name,)).fetchone()
+    if row is None:
+        raise ValueError(f"No model named '{name}'.")
+    model = {
+        "processors": [json.loads(data) for (data,) in conn.execute(
+            "SELECT data FROM processors WHERE model = ? ORDER BY position", (name,))],
+        "wires": [json.loads(data) for (data,) in conn.execute(
+            "SELECT data FROM wires WHERE model = ? ORDER BY position", (name,))],
+    }
+    model.update(json.loads(row[0]))
+    return model
+
+
+def export_library(conn):
+    """
+    Rebuilds the stored component library in the JSON schema.
+    """
+    return {
+        "spaces": [json.loads(data) for (data,) in conn.execute("SELECT data FROM spaces ORDER BY position")],
+        "blocks": [json.loads(data) for (data,) in conn.execute("SELECT data FROM blocks ORDER BY position")],
+    }
+
+
+def export_directory(conn, models_dir, library_path=None):
+    """
+    Writes every stored model to models_dir/<name>.json and, optionally, the library.
+    """
+    os.makedirs(models_dir, exist_ok=True)
+    for name in model_names(conn):
+        with open(os.path.join(models_dir, f"{name}.json"), "w") as file:
+            json.dump(export_model(conn, name), file, indent=2)
+    if library_path is not None:
+        with open(library_path, "w") as file:
+            json.dump(export_library(conn), file, indent=2)
+
+
+def get_block(conn, block_id):
+    """
+    Returns a stored block, or None.
+    """
+    row = conn.execute("SELECT data FROM blocks WHERE id = ?", (block_id,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def validation_result(conn, name, check, block_id=None):
+    """
+    Returns the result of a check on a stored model, computing and storing it only if the
+    model (or block) changed since it was last computed.
+
+    Args:
+        conn (sqlite3.Connection): The repository.
+        name (str): Model name.
+        check (str): A key of CHECKS ("closed_loop", "satisfies_block", "satisfies_block_basic").
+        block_id (str): The block, for block checks.
+
+    Raises:
+        ValueError: If the check, model or block is unknown.
+    """
+    if check not in CHECKS:
+        raise ValueError(f"Unknown check '{check}'. Use one of {sorted(CHECKS)}.")
+    function, needs_block = CHECKS[check]
+    row = conn.execute("SELECT hash FROM models WHERE name = ?", (name,)).fetchone()
+    if row is None:
+        raise ValueError(f"No model named '{name}'.")
+    model_hash = row[0]
+    block, subject, subject_hash = None, "", ""
+    if needs_block:
+        row = conn.execute("SELECT hash, data FROM blocks WHERE id = ?", (block_id,)).fetchone()
+        if row is None:
+            raise ValueError(f"No block '{block_id}' in the library.")
+        subject, subject_hash, block = block_id, row[0], json.loads(row[1])
+
+    cached = conn.execute("SELECT model_hash, subject_hash, result FROM validations "
+                          "WHERE model = ? AND check_name = ? AND subject = ?", (name, check, subject)).fetchone()
+    if cached is not None and cached[0] == model_hash and cached[1] == subject_hash:
+        return json.loads(cached[2])
+    result = function(export_model(conn, name), block)
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO validations VALUES (?, ?, ?, ?, ?, ?)",
+                     (name, check, subject, model_hash, subject_hash, json.dumps(result)))
+    return result
+
+
+def models_satisfying_block(conn, block_id, output_style="effective"):
+    """
+    Returns the names of the models satisfying a block, using stored results where possible.
+    """
+    check = "satisfies_block" if output_style == "effective" else "satisfies_block_basic"
+    return [name for name in model_names(conn) if validation_result(conn, name, check, block_id)]
+
+
+def models_with_open_port(conn, space):
+    """
+    Returns the names of the models with an open port of a space.
+    """
+    return [row[0] for row in conn.execute(
+        "SELECT DISTINCT model FROM ports WHERE space = ? AND is_open = 1 ORDER BY model", (space,))]
+
+
+def models_with_processor(conn, parent):
+    """
+    Returns the names of the models with a processor of a block.
+    """
+    return [row[0] for row in conn.execute(
+        "SELECT DISTINCT model FROM processors WHERE parent = ? ORDER BY model", (parent,))]
+
+
+def find_wires(conn, space=None, source=None, destination=None, model=None):
+    """
+    Yields (model name, wire) for the stored wires matching every given criterion.
+
+    Args:
+        space (str): The wire's Parent.
+        source (str): Source processor ID.
+        destination (str): Destination processor ID.
+        model (str): Model name.
+    """
+    conditions, values = [], []
+    for column, value in (("space", space), ("source", source), ("destination", destination), ("model", model)):
+        if value is not None:
+            conditions.append(f"{column} = ?")
+            values.append(value)
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    for name, data in conn.execute(f"SELECT model, data FROM wires{where} ORDER BY model, position", values):
+        yield name, json.loads(data)
+
+
+# ----------------- TESTS -----------------
+
+import tempfile
+
+
+def _repository():
+    """
+    A repository with the example models and library.
+    """
+    conn = open_repository()
+    import_directory(conn, "models", "component_library.json")
+    return conn
+
+
+def test_round_trip():
+    """
+    Models and library come back exactly as imported, through the database and through files.
+    """
+    conn = _repository()
+    with open("models/dynamic_game_with_learning.json", "r") as file:
+        assert export_model(conn, "dynamic_game_with_learning") == json.load(file)
+    with open("component_library.json", "r") as file:
+        assert export_library(conn) == json.load(file)
+    with tempfile.TemporaryDirectory() as directory:
+        models_dir = os.path.join(directory, "models")
+        export_directory(conn, models_dir, os.path.join(directory, "library.json"))
+        copy = open_repository(os.path.join(directory, "copy.db"))
+        import_directory(copy, models_dir, os.path.join(directory, "library.json"))
+        assert model_names(copy) == model_names(conn)
+        assert all(export_model(copy, name) == export_model(conn, name) for name in model_names(conn))
+        copy.close()
+
+
+def test_queries():
+    """
+    Questions across models are answered from the indexed tables.
+    """
+    conn = _repository()
+    assert models_with_processor(conn, "Learner") == [
+        "adaptive_strategy", "dynamic_game_with_learning", "iterated_game_with_learning"]
+    assert "simple_model" in models_with_open_port(conn, "U")
+    assert "control_loop_model" not in models_with_open_port(conn, "U")
+    wires = list(find_wires(conn, source="alice_decision", model="dynamic_game_with_learning"))
+    assert [w["ID"] for _, w in wires] == ["w_alice_action", "w_alice_expected_payoff", "w_alice_action_feedback"]
+    assert {name for name, _ in find_wires(conn, space="Theta")} <= set(models_with_processor(conn, "Learner"))
+    plan = " ".join(str(row) for row in conn.execute(
+        "EXPLAIN QUERY PLAN SELECT model FROM ports WHERE space = 'Theta' AND is_open = 1"))
+    assert "ports_by_space" in plan
+
+
+def test_satisfies_block_matches_validations():
+    """
+    Stored block checks agree with validate_model_satisfies_block, for every block.
+    """
+    import contextlib
+    import io
+    from tools.validations import validate_model_satisfies_block
+    conn = _repository()
+    satisfied = 0
+    for block in export_library(conn)["blocks"]:
+        expected = []
+        for name in model_names(conn):
+            with contextlib.redirect_stdout(io.StringIO()):
+                if validate_model_satisfies_block(export_model(conn, name), block):
+                    expected.append(name)
+        assert models_satisfying_block(conn, block["ID"]) == expected
+        satisfied += len(expected)
+    assert satisfied > 0
+
+
+def test_validation_results_are_stored():
+    """
+    Checks run once per model content and block content.
+    """
+    conn = _repository()
+    calls = []
+    function, needs_block = CHECKS["satisfies_block"]
+    CHECKS["satisfies_block"] = (lambda model, block: calls.append(1) or function(model, block), needs_block)
+    try:
+        first = models_satisfying_block(conn, "Game")
+        assert len(calls) == len(model_names(conn))
+        assert models_satisfying_block(conn, "Game") == first
+        assert len(calls) == len(model_names(conn))
+
+        # Re-importing the same content keeps the results; a changed model is checked again.
+        import_directory(conn, "models")
+        model = export_model(conn, "simple_model")
+        model["processors"][0]["Name"] = "Renamed"
+        import_model(conn, "simple_model", model)
+        models_satisfying_block(conn, "Game")
+        assert len(calls) == len(model_names(conn)) + 1
+
+        # Changing the block invalidates its results only.
+        library = export_library(conn)
+        for block in library["blocks"]:
+            if block["ID"] == "Game":
+                block["Description"] = "Changed"
+        import_library(conn, library)
+        models_satisfying_block(conn, "Game")
+        assert len(calls) == 2 * len(model_names(conn)) + 1
+    finally:
+        CHECKS["satisfies_block"] = (function, needs_block)
+    assert validation_result(conn, "control_loop_model", "closed_loop") is True
+    assert validation_result(conn, "simple_model", "closed_loop") is False
+
+
+if __name__ == "__main__":
+    test_round_trip()
+    test_queries()
+    test_satisfies_block_matches_validations()
+    test_validation_results_are_stored()
+    print("✅ All repository tests passed!")
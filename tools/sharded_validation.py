@@ -0,0 +1,289 @@
+# Sharded validation of a single large model.
+# is_closed_loop, are_wires_typed_correctly and no_duplicate_wires_into_ports walk every
+# wire once in one process. Here the wires are split into chunks that are checked in
+# parallel (map), and the partial results are merged (reduce):
+#
+#   map:    a chunk of wires -> the global port ids it plugs into (with the wire indices),
+#           wires into endpoints that are not ports, and the type mismatches it contains.
+#   reduce: port coverage and occupancy are np.bincount of the port ids, mismatches are
+#           merged in wire order, and duplicates are the ports occupied more than once.
+#
+# The processor table (ID -> first global port id, Ports, Terminals) and the model are put
+# in a module global of every worker by the pool initializer. Forked workers get them
+# through copy-on-write memory; where fork is not available they are pickled once per
+# worker. Only (start, stop) wire ranges and the partial results travel with each task.
+#
+# The answers are the same as the validators' (which stop at the first failure in model
+# order), without printing. The reports also list every open port, mismatch and duplicate.
+
+import multiprocessing
+import os
+
+import numpy as np
+
+_SHARED = {}  # "model", "table": set by _share in every worker, read by _map_chunk
+
+
+def processor_table(model):
+    """
+    Numbers the ports of a model.
+
+    Returns:
+        tuple: (table, port_count) where table maps each processor ID to
+               (first global port id, Ports, Terminals). As in the validators, a repeated
+               processor ID keeps its last definition.
+    """
+    processors = {p["ID"]: p for p in model["processors"]}
+    table = {}
+    offset = 0
+    for pid, proc in processors.items():
+        table[pid] = (offset, proc["Ports"], proc["Terminals"])
+        offset += len(proc["Ports"])
+    return table, offset
+
+
+def _share(model, table):
+    """
+    Pool initializer: makes the model and processor table available to _map_chunk.
+    """
+    _SHARED["model"], _SHARED["table"] = model, table
+
+
+def _map_chunk(bounds):
+    """
+    Checks the wires in [start, stop) against the shared processor table.
+
+    Returns:
+        tuple: (wire indices, global port ids) of the wires into existing ports,
+               [(wire index, (dest_proc, dest_idx))] of the other wires,
+               [(wire index, wire ID, message)] of the type mismatches.
+    """
+    start, stop = bounds
+    wires = _SHARED["model"]["wires"]
+    table = _SHARED["table"]
+    indices, port_ids, stray, mismatches = [], [], [], []
+    for i in range(start, stop):
+        wire = wires[i]
+        parent = wire["Parent"]
+        src_proc, src_idx = wire["Source"]
+        dest_proc, dest_idx = wire["Destination"]
+
+        source = table.get(src_proc)
+        if source is not None and src_idx < len(source[2]) and source[2][src_idx] != parent:
+            mismatches.append((i, wire["ID"], f"Source Terminal {source[2][src_idx]} != Wire Parent {parent}"))
+            mismatched = True
+        else:
+            mismatched = False
+
+        destination = table.get(dest_proc)
+        if destination is None:
+            stray.append((i, (dest_proc, dest_idx)))
+            continue
+        ports = destination[1]
+        if not mismatched and dest_idx < len(ports) and ports[dest_idx] != parent:
+            mismatches.append((i, wire["ID"], f"Destination Port {ports[dest_idx]} != Wire Parent {parent}"))
+        if 0 <= dest_idx < len(ports):
+            indices.append(i)
+            port_ids.append(destination[0] + dest_idx)
+        else:
+            stray.append((i, (dest_proc, dest_idx)))
+    return np.array(indices, dtype=np.int64), np.array(port_ids, dtype=np.int64), stray, mismatches
+
+
+def _chunks(count, chunk_size):
+    """
+    Splits range(count) into (start, stop) ranges.
+    """
+    return [(start, min(start + chunk_size, count)) for start in range(0, count, chunk_size)]
+
+
+def _reduce(model, table, port_count, partials):
+    """
+    Merges the partial results of every chunk, in wire order.
+    """
+    coverage = np.zeros(port_count, dtype=np.int64)
+    all_indices, all_ports, stray, mismatches = [], [], [], []
+    for indices, port_ids, chunk_stray, chunk_mismatches in partials:
+        coverage += np.bincount(port_ids, minlength=port_count)
+        all_indices.append(indices)
+        all_ports.append(port_ids)
+        stray.extend(chunk_stray)
+        mismatches.extend(chunk_mismatches)
+
+    port_keys = [(pid, idx) for pid, (offset, ports, _) in table.items() for idx in range(len(ports))]
+    open_ports = [(pid, idx, table[pid][1][idx]) for port, (pid, idx) in enumerate(port_keys) if coverage[port] == 0]
+
+    # Occupancy: wire indices per port, for the ports plugged more than once.
+    wires = model["wires"]
+    occupants = {}
+    crowded = np.flatnonzero(coverage > 1)
+    if len(crowded):
+        indices = np.concatenate(all_indices)
+        ports = np.concatenate(all_ports)
+        mask = np.isin(ports, crowded)
+        for i, port in zip(indices[mask].tolist(), ports[mask].tolist()):
+            occupants.setdefault(port_keys[port], []).append(i)
+    stray_occupants = {}
+    for i, key in stray:
+        stray_occupants.setdefault(key, []).append(i)
+    occupants.update((key, found) for key, found in stray_occupants.items() if len(found) > 1)
+    # The validator stops at the second wire into a port, so the earliest second wire comes first.
+    duplicates = sorted(occupants.items(), key=lambda item: item[1][1])
+
+    return {
+        "closed_loop": not open_ports,
+        "open_ports": open_ports,
+        "wires_typed": not mismatches,
+        "mismatches": [(wire_id, message) for _, wire_id, message in mismatches],
+        "no_duplicates": not duplicates,
+        "duplicates": [(key, [wires[i]["ID"] for i in found]) for key, found in duplicates],
+        "port_occupancy": coverage,
+    }
+
+
+def validate_sharded(model, workers=None, chunk_size=None):
+    """
+    Runs the closed loop, wire typing and duplicate wire checks over chunks of wires in parallel.
+
+    Args:
+        model (dict): The model.
+        workers (int): Worker processes (default: CPU count). 1 runs the chunks in this process.
+        chunk_size (int): Wires per chunk (default: about four chunks per worker).
+
+    Returns:
+        dict: {"closed_loop": bool like is_closed_loop,
+               "open_ports": [(processor ID, port index, space)] in model order,
+               "wires_typed": bool like are_wires_typed_correctly,
+               "mismatches": [(wire ID, message)] in wire order,
+               "no_duplicates": bool like no_duplicate_wires_into_ports,
+               "duplicates": [((processor ID, port index), [wire IDs])], first failure first,
+               "port_occupancy": np.ndarray of the number of wires into each port, in model order}
+
+    Raises:
+        ValueError: If workers or chunk_size is not positive.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers < 1 or (chunk_size is not None and chunk_size < 1):
+        raise ValueError("workers and chunk_size must be positive.")
+    table, port_count = processor_table(model)
+    count = len(model["wires"])
+    chunk_size = chunk_size or max(1, -(-count // (4 * workers)))
+    chunks = _chunks(count, chunk_size)
+
+    _share(model, table)
+    try:
+        if workers == 1 or len(chunks) <= 1:
+            partials = [_map_chunk(bounds) for bounds in chunks]
+        else:
+            context = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() \
+                else multiprocessing.get_context()
+            with context.Pool(min(workers, len(chunks)), initializer=_share, initargs=(model, table)) as pool:
+                partials = pool.map(_map_chunk, chunks, chunksize=1)
+    finally:
+        _SHARED.clear()
+    return _reduce(model, table, port_count, partials)
+
+
+# ----------------- TESTS -----------------
+
+import contextlib
+import io
+import json
+
+from tools.validations import is_closed_loop, are_wires_typed_correctly, no_duplicate_wires_into_ports
+
+
+def _validators(model):
+    """
+    The answers of the single-process validators.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        return (is_closed_loop(model), are_wires_typed_correctly(model), no_duplicate_wires_into_ports(model))
+
+
+def _large_model(n):
+    """
+    A ring of n sensors with two ports each, plus some broken wires.
+    """
+    processors = [{"ID": f"s{i}", "Parent": "S", "Name": "", "Ports": ["X", "Y"], "Terminals": ["X", "Y"]} for i in range(n)]
+    wires = []
+    for i in range(n):
+        wires.append({"ID": f"a{i}", "Parent": "X", "Name": "", "Source": [f"s{i}", 0], "Destination": [f"s{(i + 1) % n}", 0]})
+        wires.append({"ID": f"b{i}", "Parent": "Y", "Name": "", "Source": [f"s{i}", 1], "Destination": [f"s{(i + 2) % n}", 1]})
+    return {"processors": processors, "wires": wires}
+
+
+def test_matches_validators_on_examples():
+    """
+    Every example model gets the validators' answers, with one worker or several.
+    """
+    for filename in sorted(os.listdir("models")):
+        if not filename.endswith(".json"):
+            continue
+        with open(os.path.join("models", filename), "r") as file:
+            model = json.load(file)
+        expected = _validators(model)
+        for workers, chunk_size in ((1, None), (3, 2)):
+            report = validate_sharded(model, workers=workers, chunk_size=chunk_size)
+            assert (report["closed_loop"], report["wires_typed"], report["no_duplicates"]) == expected, filename
+
+
+def test_large_model_reports():
+    """
+    Open ports, mismatches and duplicates are all found, in order, across chunks.
+    """
+    n = 20000
+    model = _large_model(n)
+    report = validate_sharded(model, workers=4, chunk_size=3000)
+    assert report["closed_loop"] and report["wires_typed"] and report["no_duplicates"]
+    assert (report["port_occupancy"] == 1).all()
+    assert _validators(model) == (True, True, True)
+
+    # The first port goes open; its wire now doubles another port and has the wrong type.
+    model["wires"][2 * n - 1]["Destination"] = [f"s{n - 1}", 0]
+    model["wires"][2 * n - 3]["Parent"] = "X"
+    model["wires"].append({"ID": "ghost1", "Parent": "X", "Name": "", "Source": ["s0", 0], "Destination": ["ghost", 0]})
+    model["wires"].append({"ID": "ghost2", "Parent": "X", "Name": "", "Source": ["s0", 0], "Destination": ["ghost", 0]})
+    report = validate_sharded(model, workers=4, chunk_size=3000)
+    assert _validators(model) == (report["closed_loop"], report["wires_typed"], report["no_duplicates"]) == (False, False, False)
+    assert report["open_ports"] == [("s1", 1, "Y")]
+    assert [wire_id for wire_id, _ in report["mismatches"]] == [f"b{n - 2}", f"b{n - 1}"]
+    assert report["duplicates"] == [((f"s{n - 1}", 0), [f"a{n - 2}", f"b{n - 1}"]), (("ghost", 0), ["ghost1", "ghost2"])]
+    assert report["port_occupancy"].sum() == 2 * n
+
+
+def test_without_fork():
+    """
+    Where fork is not available, the workers get the model through the pool initializer.
+    """
+    model = _large_model(200)
+    model["wires"][4]["Parent"] = "Y"
+    expected = validate_sharded(model, workers=1)
+    available = multiprocessing.get_all_start_methods
+    multiprocessing.get_all_start_methods = lambda: ["spawn"]
+    try:
+        report = validate_sharded(model, workers=2, chunk_size=50)
+    finally:
+        multiprocessing.get_all_start_methods = available
+    assert report["mismatches"] == expected["mismatches"] and not report["wires_typed"]
+    assert (report["port_occupancy"] == expected["port_occupancy"]).all()
+
+
+def test_rejects_bad_arguments():
+    """
+    Non-positive chunk sizes are rejected.
+    """
+    try:
+        validate_sharded(_large_model(3), chunk_size=0)
+    except ValueError:
+        pass
+    else:
+        assert False, "Expected a ValueError"
+
+
+if __name__ == "__main__":
+    test_matches_validators_on_examples()
+    test_large_model_reports()
+    test_without_fork()
+    test_rejects_bad_arguments()
+    print("✅ All sharded validation tests passed!")
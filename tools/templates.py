@@ -0,0 +1,274 @@
+# Parametric model templates.
+# A template describes processors and wires as patterns repeated over index ranges:
+#
+#   {"Parameters": {"N": 2},
+#    "Processors": [{"For": {"i": "range(N)"}, "ID": "agent{i}_dynamics", "Parent": "F",
+#                    "Ports": ["X", "U"], "Terminals": ["X"]},
+#                   {"ID": "state_aggregator", "Parent": "A", "Ports": "=['X'] * N", "Terminals": ["X"]}],
+#    "Wires": [{"For": {"i": "range(N)"}, "ID": "w{i}", "Parent": "X",
+#               "Source": ["agent{i}_dynamics", 0], "Destination": ["state_aggregator", "=i"]}]}
+#
+# "For" maps loop variables to range expressions (later ranges may use earlier variables)
+# and the optional "If" expression filters the combinations. In every other field, a string
+# starting with "=" is replaced by the value of the expression after it, and "{expr}" (with
+# an optional format spec, as in "{i:03d}") is replaced inside other strings. Expressions
+# are restricted to arithmetic, comparisons and a few builtins on the parameters and loop
+# variables.
+#
+# The expander is a generator of records, so a model is written to a file or added to an
+# IndexedModel one record at a time, without building the lists of processors and wires.
+# See models/templates/ for an example.
+
+import ast
+import json
+import string
+
+ALLOWED_FUNCTIONS = {"range": range, "min": min, "max": max, "abs": abs, "len": len, "str": str, "int": int}
+_ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.BoolOp, ast.Compare, ast.IfExp, ast.Call, ast.Name, ast.Load,
+    ast.Constant, ast.List, ast.Tuple, ast.Subscript, ast.Slice,
+    ast.Add, ast.Sub, ast.Mult, ast.FloorDiv, ast.Mod, ast.Pow, ast.Div, ast.USub, ast.UAdd, ast.Not,
+    ast.And, ast.Or, ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.In, ast.NotIn,
+)
+_COMPILED = {}  # expression -> code object
+_FORMATTER = string.Formatter()
+_GLOBALS = {"__builtins__": {}, **ALLOWED_FUNCTIONS}
+
+
+def _compile(expression):
+    """
+    Checks that an expression only uses the allowed syntax and compiles it once.
+
+    Raises:
+        ValueError: If the expression is invalid or uses anything else.
+    """
+    code = _COMPILED.get(expression)
+    if code is None:
+        try:
+            tree = ast.parse(expression.strip(), mode="eval")
+        except SyntaxError as error:
+            raise ValueError(f"Invalid expression '{expression}': {error.msg}")
+        for node in ast.walk(tree):
+            if not isinstance(node, _ALLOWED_NODES):
+                raise ValueError(f"'{type(node).__name__}' is not allowed in template expressions ('{expression}').")
+            if isinstance(node, ast.Call) and not (isinstance(node.func, ast.Name) and node.func.id in ALLOWED_FUNCTIONS):
+                raise ValueError(f"Only {sorted(ALLOWED_FUNCTIONS)} can be called in template expressions ('{expression}').")
+            if isinstance(node, ast.Name) and node.id.startswith("_"):
+                raise ValueError(f"Names starting with '_' are not allowed ('{expression}').")
+        code = _COMPILED[expression] = compile(tree, "<template>", "eval")
+    return code
+
+
+def evaluate(expression, variables):
+    """
+    Evaluates a template expression.
+
+    Args:
+        expression (str): The expression, e.g. "range(i + 1, N)".
+        variables (dict): Parameters and loop variables.
+
+    Raises:
+        ValueError: If the expression is not allowed or refers to an unknown name.
+    """
+    try:
+        return eval(_compile(expression), _GLOBALS, variables)
+    except NameError as error:
+        raise ValueError(f"Unknown name in '{expression}': {error}")
+
+
+def _filler(value):
+    """
+    Compiles a template field into a function of the variables that fills it in:
+    "=expr" strings, "{expr}" placeholders, and lists or dicts of those.
+    """
+    if isinstance(value, str):
+        if value.startswith("="):
+            code = _compile(value[1:])
+            return lambda variables: eval(code, _GLOBALS, variables)
+        if "{" not in value:
+            return lambda variables: value
+        pieces = [(literal, None if field is None else _compile(field), spec or "")
+                  for literal, field, spec, _ in _FORMATTER.parse(value)]
+        return lambda variables: "".join(
+            literal if code is None else literal + format(eval(code, _GLOBALS, variables), spec)
+            for literal, code, spec in pieces)
+    if isinstance(value, list):
+        fillers = [_filler(item) for item in value]
+        return lambda variables: [fill(variables) for fill in fillers]
+    if isinstance(value, dict):
+        fillers = [(key, _filler(item)) for key, item in value.items()]
+        return lambda variables: {key: fill(variables) for key, fill in fillers}
+    return lambda variables: value
+
+
+def _bindings(loops, condition, variables):
+    """
+    Yields the variable bindings of nested loops, in order, that satisfy the condition.
+    """
+    names = list(loops)
+
+    def nest(depth, bound):
+        if depth == len(names):
+            if condition is None or evaluate(condition, bound):
+                yield bound
+            return
+        for value in evaluate(loops[names[depth]], bound):
+            yield from nest(depth + 1, {**bound, names[depth]: value})
+
+    return nest(0, variables)
+
+
+def expand_template(template, parameters=None):
+    """
+    Expands a template into its records, one at a time.
+
+    Args:
+        template (dict): The template (see the module comment).
+        parameters (dict): Values overriding the template's "Parameters".
+
+    Yields:
+        tuple: ("processor", record) for every processor, then ("wire", record) for every wire.
+
+    Raises:
+        ValueError: If the template has unknown sections or invalid expressions.
+    """
+    unknown = set(template) - {"Parameters", "Processors", "Wires"}
+    if unknown:
+        raise ValueError(f"Unknown template sections: {sorted(unknown)}")
+    variables = dict(template.get("Parameters", {}))
+    variables.update(parameters or {})
+    for section, kind in (("Processors", "processor"), ("Wires", "wire")):
+        for pattern in template.get(section, []):
+            fill = _filler({key: value for key, value in pattern.items() if key not in ("For", "If")})
+            for bound in _bindings(pattern.get("For", {}), pattern.get("If"), variables):
+                try:
+                    yield kind, fill(bound)
+                except NameError as error:
+                    raise ValueError(f"Unknown name in a {kind} pattern: {error}")
+
+
+def write_model(template, path, parameters=None):
+    """
+    Expands a template straight into a JSON model file.
+
+    Returns:
+        dict: {"processors": count, "wires": count}
+    """
+    counts = {"processor": 0, "wire": 0}
+    with open(path, "w") as file:
+        file.write('{\n  "processors": [')
+        section = "processor"
+        for kind, record in expand_template(template, parameters):
+            if kind != section:
+                file.write('\n  ],\n  "wires": [')
+                section = kind
+            file.write(("," if counts[kind] else "") + "\n    " + json.dumps(record))
+            counts[kind] += 1
+        if section == "processor":
+            file.write('\n  ],\n  "wires": [')
+        file.write("\n  ]\n}\n")
+    return {"processors": counts["processor"], "wires": counts["wire"]}
+
+
+def expand_into(template, indexed_model, parameters=None):
+    """
+    Expands a template into an IndexedModel (see queries.py), one record at a time.
+
+    Returns:
+        IndexedModel: The same indexed model.
+    """
+    for kind, record in expand_template(template, parameters):
+        if kind == "processor":
+            indexed_model.add_processor(record)
+        else:
+            indexed_model.add_wire(record)
+    return indexed_model
+
+
+# ----------------- TESTS -----------------
+
+import contextlib
+import io
+import os
+import tempfile
+import tracemalloc
+
+from tools.queries import IndexedModel
+from tools.validations import is_closed_loop, are_wires_typed_correctly
+
+
+def _n_player_template():
+    """
+    Loads the N-player game with learning template.
+    """
+    with open("models/templates/n_player_game_with_learning.json", "r") as file:
+        return json.load(file)
+
+
+def test_two_players_match_hand_written_model():
+    """
+    With N = 2 the template has the shape of dynamic_game_with_learning.json.
+    """
+    with open("models/dynamic_game_with_learning.json", "r") as file:
+        expected = json.load(file)
+    model = expand_into(_n_player_template(), IndexedModel({})).model
+    assert len(model["processors"]) == len(expected["processors"]) and len(model["wires"]) == len(expected["wires"])
+    signature = lambda m: sorted((p["Parent"], tuple(p["Ports"]), tuple(p["Terminals"])) for p in m["processors"])
+    assert signature(model) == signature(expected)
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert is_closed_loop(model) and are_wires_typed_correctly(model)
+
+
+def test_expressions():
+    """
+    Nested ranges, conditions, formats and the "=" form.
+    """
+    template = {
+        "Parameters": {"N": 3},
+        "Processors": [{"For": {"i": "range(N)"}, "ID": "p{i:02d}", "Parent": "S", "Ports": "=['X'] * (i + 1)",
+                        "Terminals": ["Y"]}],
+        "Wires": [{"For": {"i": "range(N)", "j": "range(i + 1, N)"}, "If": "(i + j) % 2 == 1",
+                   "ID": "w{i}_{j}", "Parent": "Y", "Source": ["p{i:02d}", 0], "Destination": ["p{j:02d}", "=i"]}],
+    }
+    records = list(expand_template(template))
+    assert [r["Ports"] for kind, r in records if kind == "processor"] == [["X"], ["X", "X"], ["X", "X", "X"]]
+    assert [(r["ID"], r["Destination"]) for kind, r in records if kind == "wire"] == [
+        ("w0_1", ["p01", 0]), ("w1_2", ["p02", 1])]
+    assert len([r for kind, r in expand_template(template, {"N": 5}) if kind == "processor"]) == 5
+
+    for bad in ("__import__('os')", "N.bit_length()", "open('x')", "[x for x in range(3)]"):
+        try:
+            evaluate(bad, {"N": 1})
+        except ValueError:
+            pass
+        else:
+            assert False, f"'{bad}' should be rejected"
+
+
+def test_streaming_to_file_uses_bounded_memory():
+    """
+    Expanding 2000 agents to a file keeps memory far below the size of the model, and the
+    file is a valid model equal to the indexed expansion.
+    """
+    template = _n_player_template()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "agents.json")
+        tracemalloc.start()
+        counts = write_model(template, path, {"N": 2000})
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        size = os.path.getsize(path)
+        assert counts == {"processors": 4 * 2000 + 1, "wires": 8 * 2000}
+        assert peak < size / 10, f"Peak {peak} bytes for a {size}-byte model"
+
+        small = os.path.join(directory, "small.json")
+        write_model(template, small, {"N": 3})
+        with open(small, "r") as file:
+            assert json.load(file) == expand_into(template, IndexedModel({}), {"N": 3}).model
+
+
+if __name__ == "__main__":
+    test_two_players_match_hand_written_model()
+    test_expressions()
+    test_streaming_to_file_uses_bounded_memory()
+    print("✅ All template tests passed!")
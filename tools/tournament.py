@@ -0,0 +1,487 @@
+# Round robin tournaments of strategies in two-player games.
+# A two-player model (game_model.json, iterated_game_with_learning.json) has one Game
+# processor, and each player is the group of processors that feeds one of its ports
+# (a G policy, or a Decision and a Learner). A strategy fills the roles of a player: it is a
+# factory called with a numpy Generator that returns {role: behavior}, e.g.
+#
+#   {"always_defect": lambda rng: {"G": lambda y: (1,)},
+#    "random": lambda rng: {"G": lambda y: (int(rng.integers(2)),)}}
+#
+# Factories are called again for every game, so learners start fresh. Every pairing gets
+# its own seed from np.random.SeedSequence(seed, spawn_key=(i, j)), so the results do not
+# depend on how the games are spread over the workers.
+#
+# Games run in a process pool (forked, so the strategies and the model are shared by the
+# workers without pickling). Strategies are usually lambdas, which cannot be sent to
+# workers that are not forked, so where fork is not available the games are played in
+# this process. Results are appended to a CSV file as chunks of pairings
+# finish, and the file is the checkpoint: running the same tournament again only plays the
+# pairings that are not in it yet. The seed, rounds and payoff table are kept next to it
+# (in <path>.params.json), and every completed row's seed must match its pairing, so a run
+# with other settings is rejected instead of being appended to the same file.
+
+import csv
+import json
+import multiprocessing
+import os
+
+import numpy as np
+
+from tools.compiler import compile_model
+
+PRISONERS_DILEMMA = [[(3, 3), (0, 5)],
+                     [(5, 0), (1, 1)]]   # action 0 cooperates, action 1 defects
+COLUMNS = ["row", "column", "seed", "rounds", "row_payoff", "column_payoff"]
+
+_SHARED = {}  # set before the pool forks (or in this process), read by _play_chunk
+
+
+def payoff_game(payoffs):
+    """
+    Makes the behavior of a Game processor from a payoff table.
+
+    Args:
+        payoffs: payoffs[a][b] = (payoff of player 0, payoff of player 1) for actions a and b.
+
+    Returns:
+        callable: (action 0, action 1) -> (payoff 0, payoff 1), or (None, None) while an
+                  action is missing (before the players have moved).
+    """
+    def game(a, b):
+        if a is None or b is None:
+            return None, None
+        return payoffs[a][b]
+    return game
+
+
+def player_processors(model, game_block="Game"):
+    """
+    Splits the processors of a two-player model into the game and the two players.
+
+    Returns:
+        tuple: (game processor ID, [processor IDs of player 0], [processor IDs of player 1])
+
+    Raises:
+        ValueError: If there is not exactly one game processor with two ports, or the
+                    players are not separate groups of processors.
+    """
+    games = [p for p in model["processors"] if p["Parent"] == game_block]
+    if len(games) != 1 or len(games[0]["Ports"]) != 2:
+        raise ValueError(f"Expected one '{game_block}' processor with two ports.")
+    game_id = games[0]["ID"]
+
+    # Group the other processors by the wires between them.
+    group = {p["ID"]: p["ID"] for p in model["processors"] if p["ID"] != game_id}
+
+    def find(pid):
+        while group[pid] != pid:
+            group[pid] = group[group[pid]]
+            pid = group[pid]
+        return pid
+
+    for wire in model["wires"]:
+        src, dst = wire["Source"][0], wire["Destination"][0]
+        if src in group and dst in group:
+            group[find(src)] = find(dst)
+
+    players = []
+    for port in range(2):
+        feeding = [w["Source"][0] for w in model["wires"] if w["Destination"] == [game_id, port] and w["Source"][0] in group]
+        if not feeding:
+            raise ValueError(f"Port {port} of '{game_id}' is not fed by a player.")
+        root = find(feeding[0])
+        players.append([p["ID"] for p in model["processors"] if p["ID"] in group and find(p["ID"]) == root])
+    if set(players[0]) & set(players[1]):
+        raise ValueError("The two players share processors.")
+    return game_id, players[0], players[1]
+
+
+def pairing_seed(seed, i, j):
+    """
+    Returns the seed of the game between strategies i and j.
+    """
+    return int(np.random.SeedSequence(seed, spawn_key=(i, j)).generate_state(1)[0])
+
+
+def play_game(model, roles, behaviors_0, behaviors_1, game, rounds):
+    """
+    Plays one iterated game.
+
+    Args:
+        model (dict): The two-player model.
+        roles (tuple): (game processor ID, player 0 processor IDs, player 1 processor IDs).
+        behaviors_0, behaviors_1 (dict): role (Parent block) -> behavior for each player.
+        game (callable): The behavior of the game processor.
+        rounds (int): Number of rounds in which both players move.
+
+    Returns:
+        tuple: (total payoff of player 0, total payoff of player 1)
+
+    Raises:
+        ValueError: If a strategy is missing a role, or the game never pays out.
+    """
+    game_id, players_0, players_1 = roles
+    parents = {p["ID"]: p["Parent"] for p in model["processors"]}
+    behaviors = {game_id: game}
+    for players, roles_behaviors in ((players_0, behaviors_0), (players_1, behaviors_1)):
+        for pid in players:
+            if parents[pid] not in roles_behaviors:
+                raise ValueError(f"The strategy has no behavior for role '{parents[pid]}' (processor '{pid}').")
+            behaviors[pid] = roles_behaviors[parents[pid]]
+    compiled = compile_model(model, behaviors)
+    layout = compiled["layout"]
+    step = compiled["step"]
+    payoff_slots = []
+    for terminal in range(2):
+        wire_id = next(w["ID"] for w in model["wires"] if w["Source"] == [game_id, terminal])
+        payoff_slots.append(layout["wires"].index(wire_id))
+
+    state = [None] * len(layout["state"])
+    inputs = [None] * len(layout["inputs"])
+    totals = [0.0, 0.0]
+    played = 0
+    for _ in range(rounds + len(parents)):   # the first steps may run before every player has moved
+        values = step(state, inputs)
+        payoff_0, payoff_1 = values[payoff_slots[0]], values[payoff_slots[1]]
+        if payoff_0 is not None:
+            totals[0] += payoff_0
+            totals[1] += payoff_1
+            played += 1
+            if played == rounds:
+                return totals[0], totals[1]
+    raise ValueError(f"The game paid out in only {played} of {rounds + len(parents)} steps.")
+
+
+def _play_chunk(pairings):
+    """
+    Plays a chunk of pairings with the shared tournament setup.
+
+    Returns:
+        list: One CSV row per pairing.
+    """
+    shared = _SHARED
+    names, strategies = shared["names"], shared["strategies"]
+    rows = []
+    for i, j in pairings:
+        seed = pairing_seed(shared["seed"], i, j)
+        rng = np.random.default_rng(seed)
+        behaviors_0 = strategies[names[i]](rng)
+        behaviors_1 = strategies[names[j]](rng)
+        payoff_0, payoff_1 = play_game(shared["model"], shared["roles"], behaviors_0, behaviors_1,
+                                       shared["game"], shared["rounds"])
+        rows.append([names[i], names[j], seed, shared["rounds"], repr(float(payoff_0)), repr(float(payoff_1))])
+    return rows
+
+
+def _check_params(path, params):
+    """
+    Compares the tournament settings with those stored next to a results file.
+
+    Returns:
+        str: The path of the settings file.
+
+    Raises:
+        ValueError: If the stored settings differ.
+    """
+    params_path = path + ".params.json"
+    if os.path.exists(params_path):
+        with open(params_path, "r") as file:
+            stored = json.load(file)
+        for key, value in params.items():
+            if stored.get(key) != value:
+                raise ValueError(f"'{path}' was written with {key} {stored.get(key)}, not {value}.")
+    return params_path
+
+
+def _completed_pairings(path, rounds, names, seed):
+    """
+    Reads the pairings already in a results file, dropping a last line cut short by an
+    interruption.
+
+    Raises:
+        ValueError: If the file has a different header, was written with a different number of
+                    rounds, or a row's seed is not the one its pairing gets from this seed and
+                    strategy order.
+    """
+    if not os.path.exists(path):
+        return set()
+    with open(path, "r+b") as file:
+        end = file.seek(0, os.SEEK_END)
+        if end and (file.seek(end - 1), file.read(1))[1] != b"\n":
+            # Back up to the last complete line.
+            position = end
+            while position > 0:
+                start = max(0, position - 4096)
+                file.seek(start)
+                newline = file.read(position - start).rfind(b"\n")
+                if newline >= 0:
+                    position = start + newline + 1
+                    break
+                position = start
+            file.truncate(position)
+    completed = set()
+    with open(path, "r", newline="") as file:
+        reader = csv.reader(file)
+        header = next(reader, None)
+        if header is not None and header != COLUMNS:
+            raise ValueError(f"'{path}' is not a tournament results file.")
+        index = {name: i for i, name in enumerate(names)}
+        for row in reader:
+            if int(row[3]) != rounds:
+                raise ValueError(f"'{path}' was written for {row[3]} rounds per game, not {rounds}.")
+            if row[0] in index and row[1] in index and int(row[2]) != pairing_seed(seed, index[row[0]], index[row[1]]):
+                raise ValueError(f"'{path}' has {row[0]} against {row[1]} with seed {row[2]}, which does not "
+                                 f"come from tournament seed {seed} and this strategy order.")
+            completed.add((row[0], row[1]))
+    return completed
+
+
+def run_tournament(model, strategies, path, rounds=100, payoffs=PRISONERS_DILEMMA, seed=0, workers=None,
+                   chunk_size=None, self_play=False, game_block="Game"):
+    """
+    Plays every pairing of strategies in a two-player model, appending results to a CSV file.
+
+    Args:
+        model (dict): The two-player model (e.g. game_model.json).
+        strategies (dict): strategy name -> factory(rng) returning {role: behavior}.
+        path (str): The results file. Pairings already in it are not played again.
+        rounds (int): Rounds per game.
+        payoffs: Payoff table of the game (see payoff_game).
+        seed (int): Tournament seed; each pairing's seed is derived from it.
+        workers (int): Worker processes (default: CPU count). 1 plays in this process, as does
+                       any number where fork is not available.
+        chunk_size (int): Pairings per task; results are written after each chunk.
+        self_play (bool): Also play every strategy against itself.
+        game_block (str): Parent of the game processor.
+
+    Returns:
+        dict: {"played": pairings played now, "skipped": pairings already in the file,
+               "pairings": total number of pairings}
+
+    Raises:
+        ValueError: If the model is not a two-player game, the file was written with other
+                    settings, or a strategy is missing a role.
+    """
+    names = list(strategies)
+    roles = player_processors(model, game_block)
+    params = {"seed": seed, "rounds": rounds, "payoffs": [[[float(v) for v in cell] for cell in row] for row in payoffs]}
+    params_path = _check_params(path, params)
+    completed = _completed_pairings(path, rounds, names, seed)
+    pairings = [(i, j) for i in range(len(names)) for j in range(i if self_play else i + 1, len(names))]
+    pending = [(i, j) for i, j in pairings if (names[i], names[j]) not in completed]
+    workers = workers or os.cpu_count() or 1
+    chunk_size = chunk_size or max(1, min(1000, -(-len(pending) // (4 * workers))))
+    chunks = [pending[k:k + chunk_size] for k in range(0, len(pending), chunk_size)]
+
+    _SHARED.update(model=model, roles=roles, names=names, strategies=strategies, game=payoff_game(payoffs),
+                   rounds=rounds, seed=seed)
+    new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+    if not os.path.exists(params_path):
+        with open(params_path, "w") as file:
+            json.dump(params, file)
+    try:
+        with open(path, "a", newline="") as file:
+            writer = csv.writer(file)
+            if new_file:
+                writer.writerow(COLUMNS)
+            if workers == 1 or len(chunks) <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+                results = map(_play_chunk, chunks)
+                pool = None
+            else:
+                pool = multiprocessing.get_context("fork").Pool(min(workers, len(chunks)))
+                results = pool.imap_unordered(_play_chunk, chunks)
+            try:
+                for rows in results:
+                    writer.writerows(rows)
+                    file.flush()
+            finally:
+                if pool is not None:
+                    pool.terminate()
+                    pool.join()
+    finally:
+        _SHARED.clear()
+    return {"played": len(pending), "skipped": len(pairings) - len(pending), "pairings": len(pairings)}
+
+
+def read_results(path, names=None):
+    """
+    Reads a results file into payoff matrices.
+
+    Args:
+        path (str): The results file.
+        names (list): Strategy names giving the matrix order (default: order of appearance).
+
+    Returns:
+        dict: {"names": strategy names,
+               "payoffs": matrix where [i, j] is the mean payoff per round of i against j (NaN if not played),
+               "games": matrix of the number of games behind each entry}
+    """
+    with open(path, "r", newline="") as file:
+        rows = list(csv.DictReader(file))
+    if names is None:
+        names = list(dict.fromkeys(name for row in rows for name in (row["row"], row["column"])))
+    index = {name: i for i, name in enumerate(names)}
+    totals = np.zeros((len(names), len(names)))
+    games = np.zeros((len(names), len(names)), dtype=np.int64)
+    for row in rows:
+        i, j, rounds = index[row["row"]], index[row["column"]], int(row["rounds"])
+        totals[i, j] += float(row["row_payoff"]) / rounds
+        games[i, j] += 1
+        if i != j:
+            totals[j, i] += float(row["column_payoff"]) / rounds
+            games[j, i] += 1
+    with np.errstate(invalid="ignore"):
+        payoffs = np.where(games > 0, totals / np.maximum(games, 1), np.nan)
+    return {"names": names, "payoffs": payoffs, "games": games}
+
+
+# ----------------- TESTS -----------------
+
+import json
+import tempfile
+import time
+
+
+def _load(name):
+    with open(os.path.join("models", name), "r") as file:
+        return json.load(file)
+
+
+def _tit_for_tat(y):
+    # In the prisoner's dilemma, the own payoff tells what the opponent did.
+    return (0 if y is None or y in (3, 5) else 1,)
+
+
+STRATEGIES = {
+    "always_cooperate": lambda rng: {"G": lambda y: (0,)},
+    "always_defect": lambda rng: {"G": lambda y: (1,)},
+    "tit_for_tat": lambda rng: {"G": _tit_for_tat},
+    "random": lambda rng: {"G": lambda y: (int(rng.integers(2)),)},
+}
+
+
+def test_round_robin_payoffs():
+    """
+    Known outcomes of the deterministic strategies, with two workers.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "results.csv")
+        summary = run_tournament(_load("game_model.json"), STRATEGIES, path, rounds=20, workers=2, chunk_size=1)
+        assert summary == {"played": 6, "skipped": 0, "pairings": 6}
+        results = read_results(path, list(STRATEGIES))
+        p = dict(zip(results["names"], range(4)))
+        payoffs = results["payoffs"]
+        assert payoffs[p["always_defect"], p["always_cooperate"]] == 5.0
+        assert payoffs[p["always_cooperate"], p["always_defect"]] == 0.0
+        assert payoffs[p["tit_for_tat"], p["always_defect"]] == 19 / 20
+        assert payoffs[p["always_defect"], p["tit_for_tat"]] == (5 + 19) / 20
+        assert payoffs[p["tit_for_tat"], p["always_cooperate"]] == 3.0
+        assert np.isnan(payoffs[0, 0]) and results["games"].sum() == 12
+
+
+def test_seeds_and_resume():
+    """
+    Results do not depend on the workers, and an interrupted tournament resumes where it stopped.
+    """
+    strategies = {f"random{k}": STRATEGIES["random"] for k in range(6)}
+    model = _load("game_model.json")
+    with tempfile.TemporaryDirectory() as directory:
+        full = os.path.join(directory, "full.csv")
+        run_tournament(model, strategies, full, rounds=30, seed=7, workers=1)
+        resumed = os.path.join(directory, "resumed.csv")
+        run_tournament(model, strategies, resumed, rounds=30, seed=7, workers=3, chunk_size=2)
+        assert np.array_equal(read_results(full)["payoffs"], read_results(resumed, read_results(full)["names"])["payoffs"],
+                              equal_nan=True)
+
+        # Keep the header, 5 games and half a line, as if the run had been killed.
+        with open(full, "r") as file:
+            lines = file.readlines()
+        with open(resumed, "w") as file:
+            file.writelines(lines[:6])
+            file.write(lines[6][:10])
+        summary = run_tournament(model, strategies, resumed, rounds=30, seed=7, workers=2, chunk_size=3)
+        assert summary == {"played": 10, "skipped": 5, "pairings": 15}
+        with open(full, "r") as a, open(resumed, "r") as b:
+            assert sorted(a.readlines()) == sorted(b.readlines())
+
+        for settings in ({"rounds": 10}, {"rounds": 30, "seed": 8},
+                         {"rounds": 30, "seed": 7, "payoffs": [[(3, 3), (0, 4)], [(4, 0), (1, 1)]]}):
+            try:
+                run_tournament(model, strategies, resumed, workers=1, **settings)
+            except ValueError:
+                pass
+            else:
+                assert False, f"Resuming with {settings} did not raise a ValueError"
+
+        # Where fork is not available, the lambdas are played in this process.
+        available = multiprocessing.get_all_start_methods
+        multiprocessing.get_all_start_methods = lambda: ["spawn"]
+        try:
+            unforked = os.path.join(directory, "unforked.csv")
+            run_tournament(model, strategies, unforked, rounds=30, seed=7, workers=3, chunk_size=2)
+        finally:
+            multiprocessing.get_all_start_methods = available
+        with open(full, "r") as a, open(unforked, "r") as b:
+            assert sorted(a.readlines()) == sorted(b.readlines())
+
+        # Without the settings file, the seeds of the rows still catch a different seed.
+        os.remove(resumed + ".params.json")
+        try:
+            run_tournament(model, strategies, resumed, rounds=30, seed=8, workers=1)
+        except ValueError as error:
+            assert "seed" in str(error)
+        else:
+            assert False, "Expected a ValueError"
+        with open(full, "r") as a, open(resumed, "r") as b:
+            assert sorted(a.readlines()) == sorted(b.readlines())
+
+
+def test_learning_players():
+    """
+    Learner/Decision strategies play the iterated game with learning; missing roles are reported.
+    """
+    def learner(rng, rate):
+        def learn(u, expected, realized):
+            return ((expected or 0.0) + rate * ((realized or 0.0) - (expected or 0.0)),)
+        return learn
+
+    def decide(theta):
+        expected = 0.0 if theta is None else theta
+        return (1 if expected < 2 else 0, expected)
+
+    strategies = {f"rate{r}": (lambda rng, r=r: {"Learner": learner(rng, r), "Decision": decide})
+                  for r in (0.1, 0.5, 0.9)}
+    model = _load("iterated_game_with_learning.json")
+    assert player_processors(model) == ("game", ["alice_learner", "alice_decision"], ["bob_learner", "bob_decision"])
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "results.csv")
+        run_tournament(model, strategies, path, rounds=25, workers=1, self_play=True)
+        results = read_results(path)
+        assert results["games"].sum() == 3 * 3 and not np.isnan(results["payoffs"]).any()
+        try:
+            run_tournament(model, STRATEGIES, os.path.join(directory, "other.csv"), rounds=5, workers=1)
+        except ValueError as error:
+            assert "Learner" in str(error) or "Decision" in str(error)
+        else:
+            assert False, "Expected a ValueError"
+
+
+def test_throughput():
+    """
+    Reports how long a round robin takes per game, to size large tournaments.
+    """
+    strategies = {f"s{k}": STRATEGIES[name] for k, name in enumerate(list(STRATEGIES) * 10)}
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        summary = run_tournament(_load("game_model.json"), strategies, os.path.join(directory, "r.csv"), rounds=50)
+        per_game = (time.perf_counter() - start) / summary["played"]
+    assert summary["played"] == 40 * 39 // 2
+    assert per_game < 0.01, f"{per_game * 1000:.2f} ms per game"
+
+
+if __name__ == "__main__":
+    test_round_robin_payoffs()
+    test_seeds_and_resume()
+    test_learning_players()
+    test_throughput()
+    print("✅ All tournament tests passed!")
@@ -0,0 +1,383 @@
+# Watch mode for modelling sessions.
+# Polls the model files and the component library. A manifest records the size, mtime
+# and content hash of every file, and the latest check results of every model. On each
+# poll, only files whose size or mtime moved are hashed, and only files whose hash changed
+# are checked again. When the library changes, only the blocks whose content changed are
+# checked again, against every model. Spaces do not take part in any check.
+#
+# The validators print debugging output, so their output is captured with redirect_stdout
+# and kept with the results.
+#
+# Run with: python -m tools.watch watch [models_dir] [library_path]
+
+import contextlib
+import hashlib
+import io
+import json
+import os
+import sys
+import time
+
+from tools.validations import (is_closed_loop, get_ports_and_terminals, model_satisfies_block,
+                               validate_model_satisfies_block)
+
+
+def _quiet(function, *args, **kwargs):
+    """
+    Calls a validator, capturing what it prints.
+
+    Returns:
+        tuple: (result, captured output)
+    """
+    buffer = io.StringIO()
+    with contextlib.redirect_stdout(buffer):
+        result = function(*args, **kwargs)
+    return result, buffer.getvalue()
+
+
+def _jsonable(value):
+    """
+    Turns tuples into lists, as they come back from the JSON manifest.
+    """
+    return json.loads(json.dumps(value))
+
+
+def check_model(model):
+    """
+    Runs the checks that do not depend on the library.
+
+    Returns:
+        dict: {"closed_loop": bool, "ports_and_terminals": basic view, "effective": [inputs, outputs],
+               "output": captured validator output}
+    """
+    closed, output = _quiet(is_closed_loop, model)
+    return _jsonable({
+        "closed_loop": closed,
+        "ports_and_terminals": get_ports_and_terminals(model, output_style="basic"),
+        "effective": get_ports_and_terminals(model, output_style="effective"),
+        "output": output,
+    })
+
+
+def check_block(model, block):
+    """
+    Runs the block satisfaction checks of one model against one block.
+
+    Returns:
+        dict: {"basic": bool, "effective": bool, "output": captured validator output}
+    """
+    basic, basic_output = _quiet(model_satisfies_block, model, block)
+    effective, effective_output = _quiet(validate_model_satisfies_block, model, block)
+    return {"basic": basic, "effective": effective, "output": basic_output + effective_output}
+
+
+def _file_state(path, previous):
+    """
+    Returns the {"size", "mtime", "hash"} of a file, hashing it only if size or mtime moved.
+    """
+    stat = os.stat(path)
+    if previous and previous["size"] == stat.st_size and previous["mtime"] == stat.st_mtime_ns:
+        return previous
+    with open(path, "rb") as file:
+        digest = hashlib.sha256(file.read()).hexdigest()
+    return {"size": stat.st_size, "mtime": stat.st_mtime_ns, "hash": digest}
+
+
+def new_manifest():
+    """
+    Returns an empty manifest.
+    """
+    return {"files": {}, "blocks": {}, "results": {}}
+
+
+def watch_once(models_dir, library_path, manifest):
+    """
+    Brings the manifest up to date with the files, re-running only the affected checks.
+
+    Args:
+        models_dir (str): Directory of model JSON files.
+        library_path (str): The component library file.
+        manifest (dict): The manifest from the previous poll (see new_manifest), updated in place.
+
+    Returns:
+        dict: What was done: {"models": names of re-checked models,
+                              "blocks": IDs of blocks re-checked against every model,
+                              "removed": names of models whose file disappeared,
+                              "errors": {file path: message} for files that could not be read}
+    """
+    changes = {"models": [], "blocks": [], "removed": [], "errors": {}}
+    files = manifest["files"]
+
+    try:
+        library_state = _file_state(library_path, files.get(library_path))
+    except OSError as error:
+        # Missing or being replaced: keep the last library, report once and look again next poll.
+        if files.get(library_path, {}).get("hash", "") is not None:
+            changes["errors"][library_path] = str(error)
+        files[library_path] = {"size": None, "mtime": None, "hash": None}
+    else:
+        if library_state["hash"] != files.get(library_path, {}).get("hash"):
+            try:
+                with open(library_path, "r") as file:
+                    library = json.load(file)
+            except (OSError, ValueError) as error:
+                changes["errors"][library_path] = str(error)
+            else:
+                blocks = {block["ID"]: block for block in library.get("blocks", [])}
+                block_hashes = {block_id: hashlib.sha256(json.dumps(block, sort_keys=True).encode()).hexdigest()
+                                for block_id, block in blocks.items()}
+                changes["blocks"] = sorted(block_id for block_id, digest in block_hashes.items()
+                                           if manifest["blocks"].get(block_id) != digest)
+                for block_id in set(manifest["blocks"]) - set(block_hashes):
+                    for results in manifest["results"].values():
+                        results["blocks"].pop(block_id, None)
+                manifest["blocks"] = block_hashes
+                manifest["library"] = blocks
+        files[library_path] = library_state
+    blocks = manifest.get("library", {})
+
+    present = set()
+    for filename in sorted(os.listdir(models_dir)):
+        if not filename.endswith(".json"):
+            continue
+        path = os.path.join(models_dir, filename)
+        name = filename[:-len(".json")]
+        present.add(name)
+        try:
+            state = _file_state(path, files.get(path))
+        except OSError as error:   # removed or renamed since the directory was listed
+            changes["errors"][path] = str(error)
+            continue
+        previous = files.get(path, {})
+        changed = state["hash"] != previous.get("hash")
+        if not changed and "error" in previous:
+            # A broken file is reported once, until its content changes again.
+            files[path] = dict(state, error=previous["error"])
+            continue
+        if not changed and name in manifest["results"] and not changes["blocks"]:
+            files[path] = state
+            continue
+        try:
+            with open(path, "r") as file:
+                model = json.load(file)
+        except (OSError, ValueError) as error:
+            files[path] = dict(state, error=str(error))
+            changes["errors"][path] = str(error)
+            continue
+        files[path] = state
+        if changed or name not in manifest["results"]:
+            results = check_model(model)
+            results["blocks"] = {block_id: check_block(model, block) for block_id, block in blocks.items()}
+            manifest["results"][name] = results
+            changes["models"].append(name)
+        else:
+            for block_id in changes["blocks"]:
+                manifest["results"][name]["blocks"][block_id] = check_block(model, blocks[block_id])
+
+    for name in sorted(set(manifest["results"]) - present):
+        del manifest["results"][name]
+        files.pop(os.path.join(models_dir, f"{name}.json"), None)
+        changes["removed"].append(name)
+    return changes
+
+
+def summarize(manifest, changes):
+    """
+    Formats the outcome of a poll for the terminal.
+    """
+    lines = []
+    for name in changes["models"]:
+        results = manifest["results"][name]
+        satisfied = [block_id for block_id, result in results["blocks"].items() if result["effective"]]
+        lines.append(f"{name}: {'closed' if results['closed_loop'] else 'open'} loop; "
+                     f"satisfies {', '.join(satisfied) or 'no block'}")
+    if changes["blocks"]:
+        lines.append(f"Re-checked blocks {', '.join(changes['blocks'])} against every model.")
+    for name in changes["removed"]:
+        lines.append(f"{name}: removed")
+    for path, message in changes["errors"].items():
+        lines.append(f"{path}: {message}")
+    return "\n".join(lines)
+
+
+def watch(models_dir="models", library_path="component_library.json", interval=1.0, manifest_path=None,
+          polls=None, on_change=None):
+    """
+    Polls the files and re-runs the affected checks until interrupted.
+
+    Args:
+        models_dir (str): Directory of model JSON files.
+        library_path (str): The component library file.
+        interval (float): Seconds between polls.
+        manifest_path (str): Where to keep the manifest between sessions. None keeps it in memory.
+        polls (int): Stop after this many polls. None polls until KeyboardInterrupt.
+        on_change (callable): Called with (manifest, changes) after a poll that changed something.
+                              Defaults to printing a summary.
+
+    Returns:
+        dict: The manifest.
+    """
+    manifest = new_manifest()
+    if manifest_path is not None and os.path.exists(manifest_path):
+        with open(manifest_path, "r") as file:
+            manifest = json.load(file)
+    if on_change is None:
+        on_change = lambda manifest, changes: print(summarize(manifest, changes))
+    count = 0
+    try:
+        while polls is None or count < polls:
+            changes = watch_once(models_dir, library_path, manifest)
+            if any(changes.values()):
+                on_change(manifest, changes)
+                if manifest_path is not None:
+                    with open(manifest_path, "w") as file:
+                        json.dump(manifest, file)
+            count += 1
+            if polls is None or count < polls:
+                time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    return manifest
+
+
+# ----------------- TESTS -----------------
+
+import shutil
+import tempfile
+
+
+def _workspace(directory):
+    """
+    Copies the example models and library into a scratch directory.
+    """
+    models_dir = os.path.join(directory, "models")
+    shutil.copytree("models", models_dir)
+    library_path = os.path.join(directory, "component_library.json")
+    shutil.copy("component_library.json", library_path)
+    return models_dir, library_path
+
+
+def _edit(path, change):
+    """
+    Applies a change to a JSON file and moves its mtime forward.
+    """
+    with open(path, "r") as file:
+        data = json.load(file)
+    change(data)
+    with open(path, "w") as file:
+        json.dump(data, file)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_only_changed_models_are_checked():
+    """
+    The first poll checks everything, the next ones only what changed.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        models_dir, library_path = _workspace(directory)
+        manifest = new_manifest()
+        changes = watch_once(models_dir, library_path, manifest)
+        assert len(changes["models"]) == len([f for f in os.listdir(models_dir) if f.endswith(".json")]) and len(changes["blocks"]) == 7
+        assert manifest["results"]["control_loop_model"]["closed_loop"] is True
+        assert "Open Port Found" in manifest["results"]["simple_model"]["output"]
+
+        assert not any(watch_once(models_dir, library_path, manifest).values())
+
+        # A touched but unchanged file is hashed again, not checked again.
+        os.utime(os.path.join(models_dir, "game_model.json"))
+        assert not any(watch_once(models_dir, library_path, manifest).values())
+
+        _edit(os.path.join(models_dir, "simple_model.json"), lambda m: m["wires"].clear())
+        changes = watch_once(models_dir, library_path, manifest)
+        assert changes["models"] == ["simple_model"] and not changes["blocks"]
+
+        os.remove(os.path.join(models_dir, "game_model.json"))
+        assert watch_once(models_dir, library_path, manifest)["removed"] == ["game_model"]
+        assert "game_model" not in manifest["results"]
+
+
+def test_library_changes_recheck_changed_blocks():
+    """
+    Editing one block re-checks that block only; removing one drops its results.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        models_dir, library_path = _workspace(directory)
+        manifest = new_manifest()
+        watch_once(models_dir, library_path, manifest)
+
+        def widen_sensor(library):
+            for block in library["blocks"]:
+                if block["ID"] == "S":
+                    block["Domain"] = ["X", "X"]
+        _edit(library_path, widen_sensor)
+        changes = watch_once(models_dir, library_path, manifest)
+        assert changes == {"models": [], "blocks": ["S"], "removed": [], "errors": {}}
+        assert all("'X': 2" in results["blocks"]["S"]["output"] for results in manifest["results"].values())
+        assert all("S" in results["blocks"] for results in manifest["results"].values())
+
+        _edit(library_path, lambda library: library["blocks"].pop())
+        watch_once(models_dir, library_path, manifest)
+        assert all("A" not in results["blocks"] for results in manifest["results"].values())
+
+
+def test_errors_and_persistence():
+    """
+    A broken file is reported once and keeps its last results; the manifest survives between sessions.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        models_dir, library_path = _workspace(directory)
+        manifest_path = os.path.join(directory, "manifest.json")
+        seen = []
+        watch(models_dir, library_path, interval=0, manifest_path=manifest_path, polls=2,
+              on_change=lambda manifest, changes: seen.append(changes))
+        assert len(seen) == 1
+
+        path = os.path.join(models_dir, "simple_model.json")
+        with open(path, "w") as file:
+            file.write("{ not json")
+        seen.clear()
+        manifest = watch(models_dir, library_path, interval=0, manifest_path=manifest_path, polls=1,
+                         on_change=lambda manifest, changes: seen.append(changes))
+        assert list(seen[0]["errors"]) == [path] and not seen[0]["models"]
+        assert "simple_model" in manifest["results"]
+        assert not any(watch_once(models_dir, library_path, manifest).values())
+
+        with open("models/simple_model.json", "r") as original, open(path, "w") as file:
+            file.write(original.read())
+        assert watch_once(models_dir, library_path, manifest)["models"] == ["simple_model"]
+
+        # A file that is already broken on the first poll is reported once as well.
+        broken_path = os.path.join(models_dir, "broken_model.json")
+        with open(broken_path, "w") as file:
+            file.write("{ not json")
+        fresh = new_manifest()
+        assert list(watch_once(models_dir, library_path, fresh)["errors"]) == [broken_path]
+        assert not watch_once(models_dir, library_path, fresh)["errors"]
+        os.utime(broken_path, ns=(0, 0))   # touched, same content
+        assert not watch_once(models_dir, library_path, fresh)["errors"]
+        with open(broken_path, "w") as file:
+            file.write("{ still not json")
+        assert list(watch_once(models_dir, library_path, fresh)["errors"]) == [broken_path]
+        os.remove(broken_path)
+
+        # A library that is missing for a while (e.g. mid-rename) is reported once, and the
+        # last blocks are kept until it is back.
+        os.rename(library_path, library_path + ".tmp")
+        seen.clear()
+        manifest = watch(models_dir, library_path, interval=0, manifest_path=manifest_path, polls=2,
+                         on_change=lambda manifest, changes: seen.append(changes))
+        assert len(seen) == 1 and list(seen[0]["errors"]) == [library_path]
+        assert all("S" in results["blocks"] for results in manifest["results"].values())
+        os.rename(library_path + ".tmp", library_path)
+        assert not any(watch_once(models_dir, library_path, manifest).values())
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["watch"]:
+        watch(*sys.argv[2:4])
+    else:
+        test_only_changed_models_are_checked()
+        test_library_changes_recheck_changed_blocks()
+        test_errors_and_persistence()
+        print("✅ All watch tests passed!")